@@ -1,273 +1,47 @@
 import os
 import json
-import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
 import re
+import threading
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from typing import Annotated, TypedDict, List, Literal
 from operator import add
-from sklearn.cluster import KMeans
 
 from langchain_core.documents import Document
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from langchain_openai import ChatOpenAI
 from langchain.chains.query_constructor.schema import AttributeInfo
-from langchain.chains.query_constructor.base import (
-    StructuredQueryOutputParser,
-    get_query_constructor_prompt
-)
+from langchain.chains.query_constructor.base import get_query_constructor_prompt
 from langchain.chains.query_constructor.ir import Comparator, Operator
-from langchain.retrievers.self_query.base import SelfQueryRetriever
-from langchain_community.query_constructors.qdrant import QdrantTranslator
-from langchain_qdrant import QdrantVectorStore
 from langgraph.graph import StateGraph, START, END
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.store.memory import InMemoryStore
 from langgraph.store.base import BaseStore
 from langchain_core.runnables import RunnableConfig
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+from langchain_core.messages import HumanMessage, AIMessage, AIMessageChunk, SystemMessage
+
+from trade_embeddings import make_embeddings, embedding_dimensions
+from report_index import open_qdrant_client, sync_report_collection
+from query_rules import SuperlativeClassifierMixin
+from name_index import NameIndex
+from query_router import QueryRouter, mentions_personal_info
+from memory_worker import BackgroundWorker, READ_WAIT_TIMEOUT
+from answer_cache import SemanticAnswerCache, data_version
+from trade_data import read_source
+from report_query import (
+    ReportTable, StructuredReportRetriever, ReportQueryParser, SUPERLATIVE_SCHEMA_PROMPT, with_superlative
+)
 
 # =============================================================================
 # 1. ANALYSIS & MATCHING LOGIC (Recommendation Route)
 # =============================================================================
-
-class CompanyMatcher:
-    def __init__(self, excel_path: str):
-        self.df = pd.read_excel(excel_path)
-        self.summary_df = self._prepare_summary_data()
-
-    def _prepare_summary_data(self):
-        # Ensure correct types
-        if 'trade date' in self.df.columns:
-            self.df['trade date'] = pd.to_datetime(self.df['trade date'])
-            self.df['month'] = self.df['trade date'].dt.to_period('M').astype(str)
-        elif 'Trade date' in self.df.columns:
-            self.df['trade date'] = pd.to_datetime(self.df['Trade date'])
-            self.df['month'] = self.df['trade date'].dt.to_period('M').astype(str)
-
-        # Group by Buyer
-        summary_df = self.df.groupby('Buyer').agg(
-            total_in_USD=('amount', 'sum'),
-            total_in_Volume=('qty', 'sum'),
-            Location=('Buyer country', 'first')
-        ).reset_index()
-
-        # Binary Indicators
-        def check_label(buyer, label_type):
-            buyer_labels = self.df[self.df['Buyer'] == buyer]['label'].str.lower().unique()
-            return 1 if label_type in buyer_labels else 0
-
-        summary_df['is_fabric'] = summary_df['Buyer'].apply(lambda x: check_label(x, 'fabric'))
-        summary_df['is_filament'] = summary_df['Buyer'].apply(lambda x: check_label(x, 'filament'))
-        summary_df['is_fiber'] = summary_df['Buyer'].apply(lambda x: check_label(x, 'fiber'))
-        summary_df['is_clothing'] = summary_df['Buyer'].apply(lambda x: check_label(x, 'clothing'))
-
-        # Strongest Biz
-        def get_strongest_biz(buyer):
-            buyer_df = self.df[self.df['Buyer'] == buyer]
-            relevant_labels = ['fabric', 'filament', 'fiber', 'clothing']
-            biz_stats = buyer_df[buyer_df['label'].str.lower().isin(relevant_labels)].groupby('label')['amount'].sum()
-            if biz_stats.empty: return 'None'
-            return biz_stats.idxmax()
-
-        summary_df['strongest_in_USD'] = summary_df['Buyer'].apply(get_strongest_biz)
-
-        # Scale Logic (Big vs Small) via KMeans
-        X = summary_df[['total_in_Volume']].values
-        if len(X) >= 2:
-            kmeans = KMeans(n_clusters=2, random_state=42)
-            summary_df['Cluster'] = kmeans.fit_predict(X)
-            cluster_means = summary_df.groupby('Cluster')['total_in_Volume'].mean()
-            big_cluster_label = cluster_means.idxmax()
-            summary_df['Scale'] = summary_df['Cluster'].apply(lambda x: 'Big' if x == big_cluster_label else 'Small')
-        else:
-             summary_df['Scale'] = 'Small' # Default if not enough data
-
-        return summary_df
-
-    def find_matches(self, user_data: dict):
-        """
-        Find top 3 matching companies using 6-component scoring system.
-        Includes LLM-based location correction as per analyze_trade_data.ipynb.
-        """
-        summary_df = self.summary_df.copy()
-        
-        # === 1. ROBUST LOCATION MATCHING (LLM CORRECTION) ===
-        # This follows lines 610-618 of analyze_trade_data.ipynb
-        try:
-            llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0)
-            correction_prompt = f"Correct the spelling of this location to a standard country name: '{user_data['Location']}'. Return ONLY the name."
-            corrected_location = llm.invoke(correction_prompt).content.strip()
-            print(f"📍 Location interpreted as: {corrected_location} (Original: {user_data['Location']})")
-            user_data['Location'] = corrected_location
-        except Exception as e:
-            print(f"⚠️  Warning: Could not verify location spelling ({e}). Using original.")
-        
-        scores = []
-        for _, row in summary_df.iterrows():
-            # 1. Location Score (1 point)
-            score_loc = 1.0 if str(user_data['Location']).lower() == str(row['Location']).lower() else 0.0
-            
-            # 2. Scale Score (1 point)
-            score_scale = 1.0 if user_data['Scale'] == row['Scale'] else 0.0
-            
-            # 3. Strongest Business Score (1 point)
-            score_strongest = 1.0 if str(user_data['strongest_in_USD']).lower() == str(row['strongest_in_USD']).lower() else 0.0
-            
-            # 4. Business Activities Score (Max 1 point)
-            matches = 0
-            matches += 1 if user_data['is_fabric'] == row['is_fabric'] else 0
-            matches += 1 if user_data['is_filament'] == row['is_filament'] else 0
-            matches += 1 if user_data['is_fiber'] == row['is_fiber'] else 0
-            matches += 1 if user_data['is_clothing'] == row['is_clothing'] else 0
-            score_activity = matches / 4.0
-
-            # 5. Total USD Score (1 point, approx +/- 10%)
-            lower_usd = user_data['total_in_USD'] * 0.9
-            upper_usd = user_data['total_in_USD'] * 1.1
-            score_usd = 1.0 if lower_usd <= row['total_in_USD'] <= upper_usd else 0.0
-            
-            #6. Total Volume Score (1 point, approx +/- 10%)
-            lower_vol = user_data['total_in_Volume'] * 0.9
-            upper_vol = user_data['total_in_Volume'] * 1.1
-            score_vol = 1.0 if lower_vol <= row['total_in_Volume'] <= upper_vol else 0.0
-            
-            # Total: Max 6.0 points
-            total_score = score_loc + score_scale + score_strongest + score_activity + score_usd + score_vol
-            
-            scores.append({
-                'Buyer': row['Buyer'],
-                'Total Score': total_score,
-                'Location': row['Location'],
-                'Scale': row['Scale'],
-                'Strongest': row['strongest_in_USD'],
-                'Breakdown': f"Loc: {score_loc}, Scale: {score_scale}, Strong: {score_strongest}, Act: {score_activity:.2f}, USD: {score_usd}, Vol: {score_vol}"
-            })
-            
-        return pd.DataFrame(scores).sort_values('Total Score', ascending=False).head(3)
-
-    # --- Plotting Functions for a Matched Company ---
-
-    def plot_performance(self, company):
-        company_df = self.df[self.df['Buyer'] == company]
-        if company_df.empty: return None
-
-        monthly_data = company_df.groupby('month')[['amount', 'qty']].sum().reset_index().sort_values('month')
-
-        fig, ax1 = plt.subplots(figsize=(10, 5))
-        
-        color = 'tab:blue'
-        ax1.set_xlabel('Month')
-        ax1.set_ylabel('Total Amount (USD)', color=color)
-        sns.lineplot(data=monthly_data, x='month', y='amount', marker='o', color=color, ax=ax1, label='Amount')
-        ax1.tick_params(axis='y', labelcolor=color)
-        ax1.grid(True)
-
-        ax2 = ax1.twinx()
-        color = 'tab:orange'
-        ax2.set_ylabel('Quantity (Units)', color=color)
-        sns.lineplot(data=monthly_data, x='month', y='qty', marker='s', color=color, ax=ax2, label='Quantity')
-        ax2.tick_params(axis='y', labelcolor=color)
-        ax2.grid(False)
-
-        plt.title(f'Performance: {company}')
-        fig.tight_layout()
-        return fig
-
-    def plot_pie_distribution(self, company, category='Product'):
-        """
-        Plot pie charts showing distribution by category (Product or label).
-        Args:
-            company: Company name to analyze
-            category: Grouping category - 'Product' or 'label' (interactive parameter)
-        """
-        company_df = self.df[self.df['Buyer'] == company]
-        if company_df.empty: return None
-
-        grouped = company_df.groupby(category)[['amount', 'qty']].sum().sort_values('amount', ascending=False)
-        
-        top_n = 5
-        if len(grouped) > top_n:
-            top = grouped.head(top_n)
-            others = grouped.iloc[top_n:].sum()
-            others.name = 'Others'
-            # Create a DataFrame for 'Others' to append correctly
-            others_df = pd.DataFrame([others], index=['Others'])
-            plot_data = pd.concat([top, others_df])
-        else:
-            plot_data = grouped
-
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(16, 8))
-        
-        # Pie Chart 1: Amount Distribution
-        ax1.pie(plot_data['amount'], labels=plot_data.index, autopct='%1.1f%%', startangle=140)
-        ax1.set_title(f'Share of Total Amount (USD) by {category}')
-        
-        # Pie Chart 2: Volume Distribution
-        ax2.pie(plot_data['qty'], labels=plot_data.index, autopct='%1.1f%%', startangle=140)
-        ax2.set_title(f'Share of Total Volume (Units) by {category}')
-        
-        plt.suptitle(f'Distribution Analysis for {company}', fontsize=16)
-        plt.tight_layout()
-        return fig
-
-    def plot_top_suppliers(self, company, type_filter='General'):
-        """
-        Plot top 3 suppliers by Amount and Volume, with optional type filtering.
-        Args:
-            company: Company name to analyze
-            type_filter: Filter by label type - 'General', 'Fabric', 'Filament', 'Fiber', or 'Clothing' (interactive parameter)
-        """
-        company_df = self.df[self.df['Buyer'] == company]
-        
-        # Filter by Type (Label)
-        if type_filter != 'General':
-            # Case-insensitive matching
-            company_df = company_df[company_df['label'].str.lower() == type_filter.lower()]
-        
-        if company_df.empty: 
-            print(f"No data found for {company} with type '{type_filter}'")
-            return None
-        
-        # Group by Supplier
-        supplier_stats = company_df.groupby('Supplier')[['amount', 'qty']].sum()
-        
-        # Get Top 3 by Amount
-        top_amount = supplier_stats.sort_values('amount', ascending=False).head(3)
-        
-        # Get Top 3 by Volume
-        top_volume = supplier_stats.sort_values('qty', ascending=False).head(3)
-        
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(16, 6))
-
-        # Bar Chart 1: Top 3 Suppliers by Amount
-        sns.barplot(x=top_amount['amount'], y=top_amount.index, hue=top_amount.index, palette='viridis', ax=ax1, legend=False)
-        ax1.set_title(f'Top 3 Suppliers by Amount (USD) - {type_filter}')
-        ax1.set_xlabel('Total Amount (USD)')
-        ax1.set_ylabel('Supplier')
-
-        # Bar Chart 2: Top 3 Suppliers by Volume
-        sns.barplot(x=top_volume['qty'], y=top_volume.index, hue=top_volume.index, palette='magma', ax=ax2, legend=False)
-        ax2.set_title(f'Top 3 Suppliers by Volume (Units) - {type_filter}')
-        ax2.set_xlabel('Total Quantity (Units)')
-        ax2.set_ylabel('Supplier')
-        
-        plt.suptitle(f'Supplier Analysis for {company}', fontsize=16)
-        plt.tight_layout()
-        return fig
+# Lives in company_matcher.py; re-exported here for existing imports.
+from company_matcher import CompanyMatcher, BUSINESS_LABELS, DEFAULT_SCALE_LABELS
 
 
 # =============================================================================
 # 2. SEARCH AGENT LOGIC (Search Route) - Enhanced Version
 # =============================================================================
-input_file = "report_by_label.json"
-print(f"📖 Loading data from: {input_file}")
-
-with open(input_file, 'r', encoding='utf-8') as f:
-    label_reports = json.load(f)
-
-print(f"✅ Loaded {len(label_reports)} label reports\n")
-
 
 # --- Step 1: Normalize metadata field names ---
 def normalize_metadata(meta: dict):
@@ -323,51 +97,6 @@ Transaction Volume: {total_txn} shipments
     return summary
 
 
-# --- Step 3: Prepare documents with summaries and metadata ---
-print("📝 Creating vector documents...")
-vector_docs = []
-
-for report in label_reports:
-    summary = create_summary(report)
-
-    metadata = {
-        "label": report["label"],
-        "total_transactions": report["total_transactions"],
-        "weight_sum": report["weight_sum"],
-        "weight_mean": report["weight_mean"],
-        "qty_sum": report["qty_sum"],
-        "qty_mean": report["qty_mean"],
-        "amount_sum": report["amount_sum"],
-        "amount_mean": report["amount_mean"],
-        "source": "trade_report_by_label"
-    }
-
-    vector_doc = Document(
-        page_content=summary,
-        metadata=normalize_metadata(metadata)
-    )
-    vector_docs.append(vector_doc)
-
-print(f"✅ Created {len(vector_docs)} vector documents\n")
-
-
-# --- Step 4: Initialize embeddings ---
-print("🔤 Initializing embeddings...")
-embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
-print("✅ Embeddings initialized\n")
-
-
-# --- Step 5: Create in-memory Qdrant vector store ---
-print("🗄️  Creating Qdrant vector store...")
-vectorstore = QdrantVectorStore.from_documents(
-    documents=vector_docs,
-    embedding=embeddings,
-    collection_name="trade_label_reports",
-    location=":memory:"
-)
-print(f"✅ Qdrant vector store created with {len(vector_docs)} documents\n")
-
-
 # --- Step 6: Define document description ---
 mo_ta_bao_cao = """Báo cáo thương mại theo nhãn sản phẩm có cấu trúc như sau:
 - LABEL (nhãn): Loại sản phẩm (fabric, clothing, filament, fiber, other)
@@ -432,115 +161,22 @@ metadata_fields = [
 ]
 
 
-# --- Step 8: Initialize LLM for query construction ---
-print("🤖 Initializing LLM...")
-llm_query = ChatOpenAI(model="gpt-3.5-turbo", temperature=0)
-print("✅ LLM initialized\n")
-
-
-# --- Step 9: Create query constructor prompt with examples ---
-print("📋 Creating query constructor prompt...")
-prompt_truy_van_thuong_mai = get_query_constructor_prompt(
-    mo_ta_bao_cao,
-    metadata_fields,
-    allowed_comparators=[
-        Comparator.EQ,
-        Comparator.LT,
-        Comparator.LTE,
-        Comparator.GT,
-        Comparator.GTE,
-        Comparator.LIKE,
-    ],
-    allowed_operators=[Operator.AND, Operator.OR],
-    examples=[
-        # --- Examples with label filtering ---
-        ("Show me fabric data", {"query": "fabric products", "filter": 'eq("label", "Fabric")'}),
-        ("Get clothing report", {"query": "clothing products", "filter": 'eq("label", "Clothing")'}),
-        ("What about fiber?", {"query": "fiber products", "filter": 'eq("label", "Fiber")'}),
-        ("Tell me about filament", {"query": "filament products", "filter": 'eq("label", "Filament")'}),
-
-        # --- Examples with numeric comparisons ---
-        ("Which category has more than 50 transactions?", {"query": "high transaction volume", "filter": 'gt("total_transactions", 50)'}),
-        ("Labels with total amount over 2 million", {"query": "high value trades", "filter": 'gt("total_amount", 2000000)'}),
-        ("Products with average weight less than 5000 kg", {"query": "lightweight products", "filter": 'lt("avg_weight", 5000)'}),
-        ("Categories with at least 20 transactions", {"query": "minimum transactions", "filter": 'gte("total_transactions", 20)'}),
-        ("Labels with average amount over 90000", {"query": "high average value", "filter": 'gt("avg_amount", 90000)'}),
-
-        # --- Examples with OR operator ---
-        ("Get clothing or fiber data", {"query": "clothing fiber products", "filter": 'or(eq("label", "clothing"), eq("label", "fiber"))'}),
-        ("Show fabric or filament reports", {"query": "fabric filament", "filter": 'or(eq("label", "fabric"), eq("label", "filament"))'}),
-        ("Categories with less than 30 or more than 80 transactions", {"query": "extreme transaction volumes", "filter": 'or(lt("total_transactions", 30), gt("total_transactions", 80))'}),
-
-        # --- Examples with AND operator ---
-        ("Fabric with more than 90 transactions", {"query": "high volume fabric", "filter": 'and(eq("label", "fabric"), gt("total_transactions", 90))'}),
-        ("Clothing with total amount over 4 million", {"query": "high value clothing", "filter": 'and(eq("label", "clothing"), gt("total_amount", 4000000))'}),
-        ("Labels with avg weight over 5000 and total transactions over 60", {"query": "heavy high volume", "filter": 'and(gt("avg_weight", 5000), gt("total_transactions", 60))'}),
-
-        # --- Examples with LIKE operator ---
-        ("Products containing 'fab' in name", {"query": "products with fab", "filter": 'like("label", "fab")'}),
-        ("Labels with 'cloth' in the name", {"query": "cloth related", "filter": 'like("label", "cloth")'}),
-
-        # --- Complex examples ---
-        ("High value fabric or clothing (over 4M)", {"query": "high value fabric clothing", "filter": 'and(or(eq("label", "fabric"), eq("label", "clothing")), gt("total_amount", 4000000))'}),
-        ("Lightweight categories with high transaction count", {"query": "lightweight high volume", "filter": 'and(lt("avg_weight", 6000), gt("total_transactions", 65))'}),
-
-        # --- General queries without filters ---
-        ("What are the most profitable products?", {"query": "most profitable products highest total amount", "filter": None}),
-        ("Summary of all trade data", {"query": "complete trade summary all categories", "filter": None}),
-        ("Compare different product categories", {"query": "comparison of product categories", "filter": None}),
-    ],
-)
-print("✅ Query constructor prompt created\n")
-
-
-# --- Step 10: Initialize parser ---
-print("🔧 Initializing structured query parser...")
-parser_thuong_mai = StructuredQueryOutputParser.from_components(
-    allowed_comparators=[
-        Comparator.EQ,
-        Comparator.LT,
-        Comparator.LTE,
-        Comparator.GT,
-        Comparator.GTE,
-        Comparator.LIKE,
-    ],
-    allowed_operators=[Operator.AND, Operator.OR],
-)
-print("✅ Parser initialized\n")
-
-
-# --- Step 11: Combine prompt, LLM, and parser ---
-print("⚙️  Creating query constructor chain...")
-llm_constructor_thuong_mai = prompt_truy_van_thuong_mai | llm_query | parser_thuong_mai
-print("✅ Query constructor chain created\n")
-
-
-# --- Step 12: Create SelfQueryRetriever ---
-print("🔍 Creating SelfQueryRetriever...")
-base_retriever = SelfQueryRetriever(
-    query_constructor=llm_constructor_thuong_mai,
-    vectorstore=vectorstore,
-    structured_query_translator=QdrantTranslator(metadata_key="metadata"),
-    verbose=True,
-    search_kwargs={"k": 5}
-)
-
-
-# --- Step 13: Create Smart Retriever Wrapper with LLM-based Superlative Detection ---
-class SmartTradeRetriever:
+# --- Step 13: Create Smart Retriever Wrapper with Superlative Detection ---
+class SmartTradeRetriever(SuperlativeClassifierMixin):
     """
-    Wrapper around SelfQueryRetriever that uses LLM to detect superlative queries
+    Wrapper around the report retriever that detects superlative queries
     (most, least, highest, lowest, top, bottom) and returns only the top result.
+    Rules answer confident cases (see query_rules); the LLM only the uncertain ones.
     """
 
     def __init__(self, base_retriever, llm=None):
         self.base_retriever = base_retriever
         self.llm = llm or ChatOpenAI(model="gpt-3.5-turbo", temperature=0)
 
-    def _is_superlative_query(self, query: str) -> dict:
+    def _classify_with_llm(self, query: str) -> dict:
         """
         Use LLM to detect if query is asking for superlative (most/least/highest/lowest/top/bottom).
-        Returns dict with 'is_superlative', 'direction', and 'metric'.
+        Returns dict with 'is_superlative', 'direction', and 'metric', or None if the call failed.
         """
 
         # Create a prompt to classify the query
@@ -604,16 +240,21 @@ Respond ONLY with valid JSON in this exact format:
         except Exception as e:
             # Fallback to non-superlative if LLM fails
             print(f"⚠️  LLM classification failed: {e}, defaulting to non-superlative")
-            return {'is_superlative': False}
+            return None
 
     def invoke(self, query: str):
         """
         Invoke retriever with smart handling of superlative queries.
         """
-        superlative_info = self._is_superlative_query(query)
-
-        # Get all results from base retriever
-        results = self.base_retriever.invoke(query)
+        # Get all results from base retriever (a superlative ranks every report, not just the k nearest)
+        if isinstance(self.base_retriever, StructuredReportRetriever):
+            # One constructor call gives the filter and the superlative intent
+            structured_query = self.base_retriever.construct(query)
+            superlative_info = self._is_superlative_query(query, llm_result=self.base_retriever.superlative(structured_query))
+            results = self.base_retriever.run(structured_query, exhaustive=superlative_info['is_superlative'])
+        else:
+            superlative_info = self._is_superlative_query(query)
+            results = self.base_retriever.invoke(query)
 
         if not results:
             return results
@@ -637,17 +278,6 @@ Respond ONLY with valid JSON in this exact format:
         return results
 
 
-# Create smart retriever with LLM-based classification
-retriever_thuong_mai = SmartTradeRetriever(base_retriever, llm=llm_query)
-
-input_file_supplier = "report_by_supplier.json"
-print(f"📖 Loading supplier data from: {input_file_supplier}")
-
-with open(input_file_supplier, 'r', encoding='utf-8') as f:
-    supplier_reports = json.load(f)
-
-print(f"✅ Loaded {len(supplier_reports)} supplier reports\n")
-
 # --- Step 1: Normalize metadata for supplier data ---
 def normalize_supplier_metadata(meta: dict):
     """Normalize supplier metadata keys"""
@@ -701,53 +331,8 @@ Transaction Volume: {total_txn} shipments
 
     return summary
 
-# --- Step 3: Prepare documents with summaries and metadata ---
-print("📝 Creating vector documents for suppliers...")
-supplier_vector_docs = []
-
-for report in supplier_reports:
-    summary = create_supplier_summary(report)
-
-    metadata = {
-        "supplier": report["Supplier"],
-        "location": report["location"],
-        "total_transactions": report["total_transactions"],
-        "weight_sum": report["weight_sum"],
-        "weight_mean": report["weight_mean"],
-        "qty_sum": report["qty_sum"],
-        "qty_mean": report["qty_mean"],
-        "amount_sum": report["amount_sum"],
-        "amount_mean": report["amount_mean"],
-        "source": "trade_report_by_supplier"
-    }
-
-    vector_doc = Document(
-        page_content=summary,
-        metadata=normalize_supplier_metadata(metadata)
-    )
-    supplier_vector_docs.append(vector_doc)
-
-print(f"✅ Created {len(supplier_vector_docs)} vector documents\n")
 
-# --- Step 4: Initialize embeddings (reuse if already initialized) ---
-if 'embeddings' not in globals():
-    print("🔤 Initializing embeddings...")
-    embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
-    print("✅ Embeddings initialized\n")
-else:
-    print("✅ Using existing embeddings\n")
-
-# --- Step 5: Create Qdrant vector store for suppliers ---
-print("🗄️  Creating Qdrant vector store for suppliers...")
-vectorstore_supplier = QdrantVectorStore.from_documents(
-    documents=supplier_vector_docs,
-    embedding=embeddings,
-    collection_name="trade_supplier_reports",
-    location=":memory:"
-)
-print(f"✅ Qdrant vector store created with {len(supplier_vector_docs)} supplier documents\n")
-
-# --- Step 6: Define document description ---
+# --- Step 6: Define document description (suppliers) ---
 mo_ta_bao_cao_supplier = """Báo cáo thương mại theo nhà cung cấp có cấu trúc như sau:
 - SUPPLIER (nhà cung cấp): Tên nhà cung cấp
 - LOCATION (vị trí): Vị trí nhà cung cấp
@@ -815,102 +400,24 @@ supplier_metadata_fields = [
     ),
 ]
 
-# --- Step 8: Initialize LLM (reuse if exists) ---
-if 'llm_query' not in globals():
-    print("🤖 Initializing LLM...")
-    llm_query = ChatOpenAI(model="gpt-3.5-turbo", temperature=0)
-    print("✅ LLM initialized\n")
-else:
-    print("✅ Using existing LLM\n")
-
-# --- Step 9: Create query constructor prompt with supplier examples ---
-print("📋 Creating query constructor prompt for suppliers...")
-prompt_supplier = get_query_constructor_prompt(
-    mo_ta_bao_cao_supplier,
-    supplier_metadata_fields,
-    allowed_comparators=[
-        Comparator.EQ,
-        Comparator.LT,
-        Comparator.LTE,
-        Comparator.GT,
-        Comparator.GTE,
-        Comparator.LIKE,
-    ],
-    allowed_operators=[Operator.AND, Operator.OR],
-    examples=[
-        ("Show me data for Asia Pacific Textiles", {"query": "Asia Pacific Textiles supplier data", "filter": 'eq("supplier", "Asia Pacific Textiles")'}),
-         (
-        "Show suppliers from Vietnam or China",
-        {"query": "Vietnam China suppliers", "filter": 'or(eq("country", "Vietnam"), eq("country", "China"))'}
-    ),
-        (
-        "High value suppliers in Singapore",
-        {"query": "high value Singapore", "filter": 'and(eq("country", "Singapore"), gt("total_amount", 1000000))'}
-    ),
-        (
-        "Find US suppliers with more than 50 transactions",
-        {"query": "US high volume", "filter": 'and(eq("country", "US"), gt("total_transactions", 50))'}
-    ),
-
-        ("Get Northern Thread Industries report", {"query": "Northern Thread Industries", "filter": 'eq("supplier", "Northern Thread Industries")'}),
-        ("Tell me about Vietnam Textile Co Ltd", {"query": "Vietnam Textile", "filter": 'like("supplier", "Vietnam Textile")'}),
-        ("Suppliers with 'Fabric' in name", {"query": "fabric suppliers", "filter": 'like("supplier", "Fabric")'}),
-        ("Show me all Vietnam suppliers", {"query": "Vietnam suppliers", "filter": 'like("supplier", "Vietnam")'}),
-        ("Which suppliers have more than 20 transactions?", {"query": "high volume suppliers", "filter": 'gt("total_transactions", 20)'}),
-        ("Suppliers with total amount over 2 million", {"query": "high value suppliers", "filter": 'gt("total_amount", 2000000)'}),
-        ("Suppliers with average amount over 90000", {"query": "high average value suppliers", "filter": 'gt("avg_amount", 90000)'}),
-        ("Find suppliers with less than 15 transactions", {"query": "low volume suppliers", "filter": 'lt("total_transactions", 15)'}),
-        ("Suppliers with more than 20 transactions and total amount over 2M", {"query": "high volume high value", "filter": 'and(gt("total_transactions", 20), gt("total_amount", 2000000))'}),
-        ("Vietnam suppliers with more than 15 transactions", {"query": "high volume vietnam", "filter": 'and(like("supplier", "Vietnam"), gt("total_transactions", 15))'}),
-        ("Show Asia Pacific Textiles or Southern Fabric Co", {"query": "multiple suppliers", "filter": 'or(eq("supplier", "Asia Pacific Textiles"), eq("supplier", "Southern Fabric Co"))'}),
-        ("Suppliers with less than 15 or more than 25 transactions", {"query": "extreme volumes", "filter": 'or(lt("total_transactions", 15), gt("total_transactions", 25))'}),
-        ("Who are the top suppliers?", {"query": "top suppliers highest revenue", "filter": None}),
-        ("Compare all suppliers", {"query": "supplier comparison all data", "filter": None}),
-        ("What suppliers do we work with?", {"query": "all suppliers list", "filter": None}),
-    ],
-)
-print("✅ Query constructor prompt created\n")
-
-# --- Step 10: Initialize parser ---
-print("🔧 Initializing structured query parser for suppliers...")
-parser_supplier = StructuredQueryOutputParser.from_components(
-    allowed_comparators=[
-        Comparator.EQ,
-        Comparator.LT,
-        Comparator.LTE,
-        Comparator.GT,
-        Comparator.GTE,
-        Comparator.LIKE,
-    ],
-    allowed_operators=[Operator.AND, Operator.OR],
-)
-print("✅ Parser initialized\n")
-
-# --- Step 11: Combine prompt, LLM, and parser ---
-print("⚙️  Creating query constructor chain for suppliers...")
-llm_constructor_supplier = prompt_supplier | llm_query | parser_supplier
-print("✅ Query constructor chain created\n")
-
-# --- Step 12: Create SelfQueryRetriever for suppliers ---
-print("🔍 Creating SelfQueryRetriever for suppliers...")
-base_retriever_supplier = SelfQueryRetriever(
-    query_constructor=llm_constructor_supplier,
-    vectorstore=vectorstore_supplier,
-    structured_query_translator=QdrantTranslator(metadata_key="metadata"),
-    verbose=True,
-    search_kwargs={"k": 5}
-)
 
 # --- Step 13: Create Smart Supplier Retriever ---
-class SmartSupplierRetriever:
-    """Smart retriever for supplier data with superlative detection"""
+class SmartSupplierRetriever(SuperlativeClassifierMixin):
+    """Smart retriever for supplier data with superlative detection (rules first, LLM fallback)"""
 
-    def __init__(self, base_retriever, llm=None):
+    def __init__(self, base_retriever, llm=None, name_index: NameIndex = None):
+        """
+        Args:
+            base_retriever: StructuredReportRetriever over the supplier reports
+            llm: LLM for uncertain superlative queries
+            name_index: Supplier names -> report Documents; suppliers named in a question are returned first
+        """
         self.base_retriever = base_retriever
         self.llm = llm or ChatOpenAI(model="gpt-3.5-turbo", temperature=0)
+        self.name_index = name_index
 
-    def _is_superlative_query(self, query: str) -> dict:
-        """Detect if query asks for superlative (top/best/worst/most/least)"""
+    def _classify_with_llm(self, query: str) -> dict:
+        """Detect if query asks for superlative (top/best/worst/most/least); None if the call failed"""
 
         classification_prompt = f"""Analyze this supplier query and determine if it's asking for a superlative.
 
@@ -965,12 +472,32 @@ Respond ONLY with valid JSON:
             }
         except Exception as e:
             print(f"⚠️  Classification failed: {e}, defaulting to non-superlative")
-            return {'is_superlative': False}
+            return None
 
     def invoke(self, query: str):
-        """Invoke retriever with smart superlative handling"""
-        superlative_info = self._is_superlative_query(query)
-        results = self.base_retriever.invoke(query)
+        """Invoke retriever with smart superlative handling; suppliers named in the query come first"""
+        named = []
+        if self.name_index is not None:
+            matches = self.name_index.find_in_text(query, kind='supplier')
+            if matches:
+                print(f"📇 Name index: {', '.join(f'{m.name} ({m.score:.2f})' for m in matches)}")
+            named = [m.payload for m in matches]
+        # The rest of the query ("... vs the top supplier by USD") still goes through filters and superlatives
+        results = self._retrieve(query)
+        if not named:
+            return results
+        named_suppliers = {doc.metadata.get('supplier') for doc in named}
+        return named + [doc for doc in results if doc.metadata.get('supplier') not in named_suppliers]
+
+    def _retrieve(self, query: str):
+        """Structured / vector retrieval with the superlative narrowed to the top document"""
+        if isinstance(self.base_retriever, StructuredReportRetriever):
+            structured_query = self.base_retriever.construct(query)
+            superlative_info = self._is_superlative_query(query, llm_result=self.base_retriever.superlative(structured_query))
+            results = self.base_retriever.run(structured_query, exhaustive=superlative_info['is_superlative'])
+        else:
+            superlative_info = self._is_superlative_query(query)
+            results = self.base_retriever.invoke(query)
 
         if not results:
             return results
@@ -987,18 +514,428 @@ Respond ONLY with valid JSON:
 
         return results
 
-# Create smart supplier retriever
-retriever_supplier = SmartSupplierRetriever(base_retriever_supplier, llm=llm_query)
+
+LABEL_REPORT_FILE = "report_by_label.json"
+SUPPLIER_REPORT_FILE = "report_by_supplier.json"
+# Buyer and seller names with their country (extract_companies.py), added to the name index
+COMPANY_LOCATIONS_FILE = "unique_company_locations.xlsx"
+
+# Output dimension per index (None = the model's full size); backend and model see trade_embeddings
+REPORT_EMBEDDING_DIMENSIONS = int(os.environ["TRADE_REPORT_EMBEDDING_DIMENSIONS"]) if os.environ.get("TRADE_REPORT_EMBEDDING_DIMENSIONS") else None
+MEMORY_EMBEDDING_DIMENSIONS = int(os.environ["TRADE_MEMORY_EMBEDDING_DIMENSIONS"]) if os.environ.get("TRADE_MEMORY_EMBEDDING_DIMENSIONS") else None
+
+
+class SearchStack:
+    """Data, vector stores, LLM chains and retrievers of the search route (see get_search_stack)."""
+
+    def __init__(self, **components):
+        self.__dict__.update(components)
+
+
+def _build_search_stack() -> SearchStack:
+    """Load the report files, embed them and wire up the retrievers (slow: file I/O and OpenAI calls)."""
+    input_file = LABEL_REPORT_FILE
+    print(f"📖 Loading data from: {input_file}")
+
+    with open(input_file, 'r', encoding='utf-8') as f:
+        label_reports = json.load(f)
+
+    print(f"✅ Loaded {len(label_reports)} label reports\n")
+
+    # --- Step 3: Prepare documents with summaries and metadata ---
+    print("📝 Creating vector documents...")
+    vector_docs = []
+
+    for report in label_reports:
+        summary = create_summary(report)
+
+        metadata = {
+            "label": report["label"],
+            "total_transactions": report["total_transactions"],
+            "weight_sum": report["weight_sum"],
+            "weight_mean": report["weight_mean"],
+            "qty_sum": report["qty_sum"],
+            "qty_mean": report["qty_mean"],
+            "amount_sum": report["amount_sum"],
+            "amount_mean": report["amount_mean"],
+            "source": "trade_report_by_label"
+        }
+
+        vector_doc = Document(
+            page_content=summary,
+            metadata=normalize_metadata(metadata)
+        )
+        vector_docs.append(vector_doc)
+
+    print(f"✅ Created {len(vector_docs)} vector documents\n")
+
+    # --- Step 4: Initialize embeddings (disk-cached, so unchanged reports are not re-embedded) ---
+    print("🔤 Initializing embeddings...")
+    embeddings = make_embeddings(dimensions=REPORT_EMBEDDING_DIMENSIONS)
+    print("✅ Embeddings initialized\n")
+
+    # --- Step 5: Open the persistent Qdrant collection, synced to the current reports ---
+    print("🗄️  Syncing Qdrant vector store...")
+    qdrant_client = open_qdrant_client()
+    vectorstore = sync_report_collection(
+        qdrant_client,
+        "trade_label_reports",
+        vector_docs,
+        keys=[doc.metadata["label"] for doc in vector_docs],
+        embeddings=embeddings,
+        indexed_fields={field.name: field.type for field in metadata_fields},
+    )
+    print(f"✅ Qdrant vector store ready with {len(vector_docs)} documents\n")
+
+    # --- Step 8: Initialize LLM for query construction ---
+    print("🤖 Initializing LLM...")
+    llm_query = ChatOpenAI(model="gpt-3.5-turbo", temperature=0)
+    print("✅ LLM initialized\n")
+
+    # --- Step 9: Create query constructor prompt with examples ---
+    print("📋 Creating query constructor prompt...")
+    prompt_truy_van_thuong_mai = get_query_constructor_prompt(
+        mo_ta_bao_cao,
+        metadata_fields,
+        allowed_comparators=[
+            Comparator.EQ,
+            Comparator.LT,
+            Comparator.LTE,
+            Comparator.GT,
+            Comparator.GTE,
+            Comparator.LIKE,
+        ],
+        allowed_operators=[Operator.AND, Operator.OR],
+        schema_prompt=SUPERLATIVE_SCHEMA_PROMPT,
+        examples=with_superlative([
+            # --- Examples with label filtering ---
+            ("Show me fabric data", {"query": "fabric products", "filter": 'eq("label", "Fabric")'}),
+            ("Get clothing report", {"query": "clothing products", "filter": 'eq("label", "Clothing")'}),
+            ("What about fiber?", {"query": "fiber products", "filter": 'eq("label", "Fiber")'}),
+            ("Tell me about filament", {"query": "filament products", "filter": 'eq("label", "Filament")'}),
+
+            # --- Examples with numeric comparisons ---
+            ("Which category has more than 50 transactions?", {"query": "high transaction volume", "filter": 'gt("total_transactions", 50)'}),
+            ("Labels with total amount over 2 million", {"query": "high value trades", "filter": 'gt("total_amount", 2000000)'}),
+            ("Products with average weight less than 5000 kg", {"query": "lightweight products", "filter": 'lt("avg_weight", 5000)'}),
+            ("Categories with at least 20 transactions", {"query": "minimum transactions", "filter": 'gte("total_transactions", 20)'}),
+            ("Labels with average amount over 90000", {"query": "high average value", "filter": 'gt("avg_amount", 90000)'}),
+
+            # --- Examples with OR operator ---
+            ("Get clothing or fiber data", {"query": "clothing fiber products", "filter": 'or(eq("label", "clothing"), eq("label", "fiber"))'}),
+            ("Show fabric or filament reports", {"query": "fabric filament", "filter": 'or(eq("label", "fabric"), eq("label", "filament"))'}),
+            ("Categories with less than 30 or more than 80 transactions", {"query": "extreme transaction volumes", "filter": 'or(lt("total_transactions", 30), gt("total_transactions", 80))'}),
+
+            # --- Examples with AND operator ---
+            ("Fabric with more than 90 transactions", {"query": "high volume fabric", "filter": 'and(eq("label", "fabric"), gt("total_transactions", 90))'}),
+            ("Clothing with total amount over 4 million", {"query": "high value clothing", "filter": 'and(eq("label", "clothing"), gt("total_amount", 4000000))'}),
+            ("Labels with avg weight over 5000 and total transactions over 60", {"query": "heavy high volume", "filter": 'and(gt("avg_weight", 5000), gt("total_transactions", 60))'}),
+
+            # --- Examples with LIKE operator ---
+            ("Products containing 'fab' in name", {"query": "products with fab", "filter": 'like("label", "fab")'}),
+            ("Labels with 'cloth' in the name", {"query": "cloth related", "filter": 'like("label", "cloth")'}),
+
+            # --- Complex examples ---
+            ("High value fabric or clothing (over 4M)", {"query": "high value fabric clothing", "filter": 'and(or(eq("label", "fabric"), eq("label", "clothing")), gt("total_amount", 4000000))'}),
+            ("Lightweight categories with high transaction count", {"query": "lightweight high volume", "filter": 'and(lt("avg_weight", 6000), gt("total_transactions", 65))'}),
+
+            # --- General queries without filters ---
+            ("What are the most profitable products?", {"query": "most profitable products highest total amount", "filter": None, "superlative": "total_amount", "direction": "desc"}),
+            ("Summary of all trade data", {"query": "complete trade summary all categories", "filter": None}),
+            ("Compare different product categories", {"query": "comparison of product categories", "filter": None}),
+
+            # --- Superlative examples (single top / bottom result) ---
+            ("Which category has the fewest transactions?", {"query": "category transactions", "filter": None, "superlative": "total_transactions", "direction": "asc"}),
+            ("Heaviest product category", {"query": "heavy product category", "filter": None, "superlative": "total_weight", "direction": "desc"}),
+            ("Clothing or fiber, which earns more per transaction?", {"query": "clothing fiber average value", "filter": 'or(eq("label", "clothing"), eq("label", "fiber"))', "superlative": "avg_amount", "direction": "desc"}),
+        ]),
+    )
+    print("✅ Query constructor prompt created\n")
+
+    # --- Step 10: Initialize parser ---
+    print("🔧 Initializing structured query parser...")
+    parser_thuong_mai = ReportQueryParser.from_components(
+        allowed_comparators=[
+            Comparator.EQ,
+            Comparator.LT,
+            Comparator.LTE,
+            Comparator.GT,
+            Comparator.GTE,
+            Comparator.LIKE,
+        ],
+        allowed_operators=[Operator.AND, Operator.OR],
+    )
+    print("✅ Parser initialized\n")
+
+    # --- Step 11: Combine prompt, LLM, and parser ---
+    print("⚙️  Creating query constructor chain...")
+    llm_constructor_thuong_mai = prompt_truy_van_thuong_mai | llm_query | parser_thuong_mai
+    print("✅ Query constructor chain created\n")
+
+    # --- Step 12: Create structured retriever (filters run exactly on the report table) ---
+    print("🔍 Creating structured report retriever...")
+    base_retriever = StructuredReportRetriever(
+        query_constructor=llm_constructor_thuong_mai,
+        table=ReportTable(vector_docs),
+        vectorstore=vectorstore,
+        k=5,
+        verbose=True,
+    )
+
+    # Create smart retriever with LLM-based classification
+    retriever_thuong_mai = SmartTradeRetriever(base_retriever, llm=llm_query)
+
+    input_file_supplier = SUPPLIER_REPORT_FILE
+    print(f"📖 Loading supplier data from: {input_file_supplier}")
+
+    with open(input_file_supplier, 'r', encoding='utf-8') as f:
+        supplier_reports = json.load(f)
+
+    print(f"✅ Loaded {len(supplier_reports)} supplier reports\n")
+
+    # --- Step 3: Prepare documents with summaries and metadata ---
+    print("📝 Creating vector documents for suppliers...")
+    supplier_vector_docs = []
+
+    for report in supplier_reports:
+        summary = create_supplier_summary(report)
+
+        metadata = {
+            "supplier": report["Supplier"],
+            "location": report["location"],
+            "total_transactions": report["total_transactions"],
+            "weight_sum": report["weight_sum"],
+            "weight_mean": report["weight_mean"],
+            "qty_sum": report["qty_sum"],
+            "qty_mean": report["qty_mean"],
+            "amount_sum": report["amount_sum"],
+            "amount_mean": report["amount_mean"],
+            "source": "trade_report_by_supplier"
+        }
+
+        vector_doc = Document(
+            page_content=summary,
+            metadata=normalize_supplier_metadata(metadata)
+        )
+        supplier_vector_docs.append(vector_doc)
+
+    print(f"✅ Created {len(supplier_vector_docs)} vector documents\n")
+
+    # --- Step 5: Open the persistent Qdrant collection for suppliers ---
+    print("🗄️  Syncing Qdrant vector store for suppliers...")
+    vectorstore_supplier = sync_report_collection(
+        qdrant_client,
+        "trade_supplier_reports",
+        supplier_vector_docs,
+        keys=[doc.metadata["supplier"] for doc in supplier_vector_docs],
+        embeddings=embeddings,
+        indexed_fields={field.name: field.type for field in supplier_metadata_fields},
+    )
+    print(f"✅ Qdrant vector store ready with {len(supplier_vector_docs)} supplier documents\n")
+
+    # --- Step 9: Create query constructor prompt with supplier examples ---
+    print("📋 Creating query constructor prompt for suppliers...")
+    prompt_supplier = get_query_constructor_prompt(
+        mo_ta_bao_cao_supplier,
+        supplier_metadata_fields,
+        allowed_comparators=[
+            Comparator.EQ,
+            Comparator.LT,
+            Comparator.LTE,
+            Comparator.GT,
+            Comparator.GTE,
+            Comparator.LIKE,
+        ],
+        allowed_operators=[Operator.AND, Operator.OR],
+        schema_prompt=SUPERLATIVE_SCHEMA_PROMPT,
+        examples=with_superlative([
+            ("Show me data for Asia Pacific Textiles", {"query": "Asia Pacific Textiles supplier data", "filter": 'eq("supplier", "Asia Pacific Textiles")'}),
+             (
+            "Show suppliers from Vietnam or China",
+            {"query": "Vietnam China suppliers", "filter": 'or(eq("country", "Vietnam"), eq("country", "China"))'}
+        ),
+            (
+            "High value suppliers in Singapore",
+            {"query": "high value Singapore", "filter": 'and(eq("country", "Singapore"), gt("total_amount", 1000000))'}
+        ),
+            (
+            "Find US suppliers with more than 50 transactions",
+            {"query": "US high volume", "filter": 'and(eq("country", "US"), gt("total_transactions", 50))'}
+        ),
+
+            ("Get Northern Thread Industries report", {"query": "Northern Thread Industries", "filter": 'eq("supplier", "Northern Thread Industries")'}),
+            ("Tell me about Vietnam Textile Co Ltd", {"query": "Vietnam Textile", "filter": 'like("supplier", "Vietnam Textile")'}),
+            ("Suppliers with 'Fabric' in name", {"query": "fabric suppliers", "filter": 'like("supplier", "Fabric")'}),
+            ("Show me all Vietnam suppliers", {"query": "Vietnam suppliers", "filter": 'like("supplier", "Vietnam")'}),
+            ("Which suppliers have more than 20 transactions?", {"query": "high volume suppliers", "filter": 'gt("total_transactions", 20)'}),
+            ("Suppliers with total amount over 2 million", {"query": "high value suppliers", "filter": 'gt("total_amount", 2000000)'}),
+            ("Suppliers with average amount over 90000", {"query": "high average value suppliers", "filter": 'gt("avg_amount", 90000)'}),
+            ("Find suppliers with less than 15 transactions", {"query": "low volume suppliers", "filter": 'lt("total_transactions", 15)'}),
+            ("Suppliers with more than 20 transactions and total amount over 2M", {"query": "high volume high value", "filter": 'and(gt("total_transactions", 20), gt("total_amount", 2000000))'}),
+            ("Vietnam suppliers with more than 15 transactions", {"query": "high volume vietnam", "filter": 'and(like("supplier", "Vietnam"), gt("total_transactions", 15))'}),
+            ("Show Asia Pacific Textiles or Southern Fabric Co", {"query": "multiple suppliers", "filter": 'or(eq("supplier", "Asia Pacific Textiles"), eq("supplier", "Southern Fabric Co"))'}),
+            ("Suppliers with less than 15 or more than 25 transactions", {"query": "extreme volumes", "filter": 'or(lt("total_transactions", 15), gt("total_transactions", 25))'}),
+            ("Who are the top suppliers?", {"query": "top suppliers highest revenue", "filter": None}),
+            ("Compare all suppliers", {"query": "supplier comparison all data", "filter": None}),
+            ("What suppliers do we work with?", {"query": "all suppliers list", "filter": None}),
+            ("Which supplier has the most revenue?", {"query": "supplier revenue", "filter": None, "superlative": "total_amount", "direction": "desc"}),
+            ("Vietnam supplier with the fewest transactions", {"query": "Vietnam supplier", "filter": 'eq("location", "Vietnam")', "superlative": "total_transactions", "direction": "asc"}),
+        ]),
+    )
+    print("✅ Query constructor prompt created\n")
+
+    # --- Step 10: Initialize parser ---
+    print("🔧 Initializing structured query parser for suppliers...")
+    parser_supplier = ReportQueryParser.from_components(
+        allowed_comparators=[
+            Comparator.EQ,
+            Comparator.LT,
+            Comparator.LTE,
+            Comparator.GT,
+            Comparator.GTE,
+            Comparator.LIKE,
+        ],
+        allowed_operators=[Operator.AND, Operator.OR],
+    )
+    print("✅ Parser initialized\n")
+
+    # --- Step 11: Combine prompt, LLM, and parser ---
+    print("⚙️  Creating query constructor chain for suppliers...")
+    llm_constructor_supplier = prompt_supplier | llm_query | parser_supplier
+    print("✅ Query constructor chain created\n")
+
+    # --- Step 12: Create structured retriever for suppliers ---
+    print("🔍 Creating structured report retriever for suppliers...")
+    base_retriever_supplier = StructuredReportRetriever(
+        query_constructor=llm_constructor_supplier,
+        table=ReportTable(supplier_vector_docs),
+        vectorstore=vectorstore_supplier,
+        k=5,
+        verbose=True,
+    )
+
+    # --- Step 13: Company name index (supplier reports + known buyers / sellers) ---
+    name_index = NameIndex()
+    for doc in supplier_vector_docs:
+        name_index.add(doc.metadata["supplier"], "supplier", doc)
+    if os.path.exists(COMPANY_LOCATIONS_FILE):
+        companies = read_source(COMPANY_LOCATIONS_FILE, columns=["Name", "Location"])
+        for name, location in zip(companies["Name"], companies["Location"]):
+            if isinstance(name, str):
+                name_index.add(name, "company", {"name": name, "location": location})
+    print(f"📇 Name index ready with {len(name_index)} company names\n")
+
+    # Create smart supplier retriever
+    retriever_supplier = SmartSupplierRetriever(base_retriever_supplier, llm=llm_query, name_index=name_index)
+
+    return SearchStack(**{name: value for name, value in locals().items() if name in SEARCH_STACK_COMPONENTS})
+
+
+# Names that used to be module globals of agent_logic; still reachable as agent_logic.<name>
+SEARCH_STACK_COMPONENTS = (
+    'label_reports', 'vector_docs', 'embeddings', 'qdrant_client', 'vectorstore', 'llm_query',
+    'prompt_truy_van_thuong_mai', 'parser_thuong_mai', 'llm_constructor_thuong_mai',
+    'base_retriever', 'retriever_thuong_mai',
+    'supplier_reports', 'supplier_vector_docs', 'vectorstore_supplier',
+    'prompt_supplier', 'parser_supplier', 'llm_constructor_supplier',
+    'base_retriever_supplier', 'retriever_supplier', 'name_index',
+)
+
+_search_stack = None
+_search_stack_error = None
+_search_stack_build_seconds = None
+_search_stack_version = None
+_search_stack_lock = threading.Lock()
+
+
+def get_search_stack() -> SearchStack:
+    """
+    The search stack, built on first call and shared afterwards.
+    Thread-safe: concurrent first callers wait for a single build. A failed build
+    raises and is retried on the next call.
+    """
+    global _search_stack, _search_stack_error, _search_stack_build_seconds, _search_stack_version
+    if _search_stack is not None:
+        return _search_stack
+    with _search_stack_lock:
+        if _search_stack is None:
+            started = time.perf_counter()
+            # Taken before reading, so a report edited during the build counts as a newer version
+            version = report_data_version()
+            try:
+                _search_stack = _build_search_stack()
+                _search_stack_version = version
+                _search_stack_error = None
+            except Exception as e:
+                _search_stack_error = e
+                raise
+            _search_stack_build_seconds = time.perf_counter() - started
+            print(f"✅ Search stack ready in {_search_stack_build_seconds:.1f}s\n")
+    return _search_stack
+
+
+def warm_search_stack() -> threading.Thread:
+    """Start building the search stack in a background thread (e.g. at app startup)."""
+    def build():
+        try:
+            get_search_stack()
+        except Exception as e:
+            print(f"⚠️  Search stack build failed: {e}")
+    thread = threading.Thread(target=build, name="search-stack-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def report_data_version() -> tuple:
+    """Current version (path, mtime, size) of the label and supplier report files."""
+    return data_version((LABEL_REPORT_FILE, SUPPLIER_REPORT_FILE))
+
+
+def search_stack_version():
+    """Version of the report files the search stack was built from (None until it is built)."""
+    return _search_stack_version
+
+
+def search_stack_status() -> dict:
+    """
+    Readiness probe for the search route.
+    Returns {'ready': bool, 'building': bool, 'error': str or None, 'build_seconds': float or None,
+    'stale': bool}; stale means the report files changed after the stack was built (restart to reload).
+    """
+    return {
+        'ready': _search_stack is not None,
+        'building': _search_stack is None and _search_stack_lock.locked(),
+        'error': None if _search_stack_error is None else str(_search_stack_error),
+        'build_seconds': _search_stack_build_seconds,
+        'stale': _search_stack_version is not None and _search_stack_version != report_data_version(),
+    }
+
+
+def __getattr__(name):
+    # Backward compatibility: agent_logic.retriever_thuong_mai etc. build the stack on first access
+    if name in SEARCH_STACK_COMPONENTS:
+        return getattr(get_search_stack(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 class EnhancedImprovedState(TypedDict):
     messages: Annotated[list, add]
     user_input: str
     rewritten_query: str  # NEW: Stores the context-aware rewritten query
-    query_type: str  # "label", "supplier", or "general"
+    query_type: str  # "label", "supplier", "both" (speculative mode) or "general"
     relevant_memories: list[dict]
     product_context: str
     response: str
-    memories_to_save: list[dict]
+
+
+# Graph nodes whose LLM tokens are the answer (streamed by stream_chat)
+RESPONSE_NODES = ("generate_data_response", "generate_general_response")
+
+
+class RewriteAndRoute(TypedDict):
+    """Self-contained version of the user's query and the data it needs."""
+    rewritten_query: Annotated[str, ..., "The query with pronouns and references replaced by the entities they refer to"]
+    query_type: Annotated[str, ..., "One of the categories: label, supplier, general (or both when allowed)"]
 
 
 # =============================================================================
@@ -1011,37 +948,187 @@ class TradeSearchAgent:
     - Label queries → Label retriever
     - Supplier queries → Supplier retriever
     - General chat → Memory retrieval
+
+    Speculative mode starts both retrievers while the router LLM call runs, keeps the
+    chosen branch (both for mixed questions) and drops the other, so retrieval is no
+    longer waiting on routing.
+
+    Routing is decided locally by QueryRouter (label words, company names, greetings)
+    when it is confident; only ambiguous queries call the router LLM (temperature 0).
+
+    The answer is returned as soon as it is generated; memory extraction and saving
+    run afterwards on a background worker (skipped for plain data queries).
+
+    Data answers are cached by the meaning of the rewritten query (SemanticAnswerCache);
+    a repeated question skips retrieval and generation until the search stack data changes.
     """
 
-    def __init__(self, label_retriever, supplier_retriever):
+    def __init__(self, label_retriever, supplier_retriever, speculative: bool = False, embeddings=None,
+                 router: QueryRouter = None, answer_cache: SemanticAnswerCache = None):
+        """
+        Args:
+            label_retriever: Retriever over the label (product category) reports
+            supplier_retriever: Retriever over the supplier reports
+            speculative: Retrieve from both indexes concurrently with routing
+            embeddings: Embeddings of the memory index (default: make_embeddings, not disk-cached)
+            router: Local query router (default: built from the retrievers' labels and name index)
+            answer_cache: Cache of data answers (default: keyed by the memory embeddings, stamped
+                          with the report version the search stack was built from)
+        """
         self.llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0.7)
-        self.embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
+        self.router_llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0)
+        self.router = router or QueryRouter.from_retrievers(label_retriever, supplier_retriever)
+        self.embeddings = embeddings or make_embeddings(dimensions=MEMORY_EMBEDDING_DIMENSIONS, cache=False)
 
         # Store BOTH retrievers
         self.label_retriever = label_retriever
         self.supplier_retriever = supplier_retriever
+        self.speculative = speculative
+        self.retrieval_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="retrieval") if speculative else None
 
         # Shared memory store
         self.store = InMemoryStore(
             index={
                 "embed": self.embeddings,
-                "dims": 1536,
+                "dims": embedding_dimensions(self.embeddings),
                 "fields": ["text"]
             }
         )
 
+        if answer_cache is None:
+            # Answers come from the search stack, which keeps serving the data it was built from
+            answer_cache = SemanticAnswerCache(self.embeddings, version=search_stack_version)
+        self.answer_cache = answer_cache
+
+        # Memory extraction runs after the answer, on a bounded background queue
+        self.memory_lock = threading.Lock()
+        self.memory_worker = BackgroundWorker(self._remember, name="memory")
+
         self.checkpointer = MemorySaver()
         self.graph = self._build_graph()
 
+    def _retrieve_context(self, kind: str, query: str) -> str:
+        """
+        Search one retriever and format the results as data context.
+        Args:
+            kind: "label" (product categories) or "supplier" (companies)
+            query: Rewritten query
+        """
+        retriever = self.label_retriever if kind == "label" else self.supplier_retriever
+        print(f"\n[{kind.upper()} RETRIEVER] Searching for: {query}")
+
+        try:
+            results = retriever.invoke(query)
+
+            if not results:
+                return "No relevant label/category data found." if kind == "label" else "No relevant supplier data found."
+
+            context_parts = []
+            for i, doc in enumerate(results, 1):
+                context_parts.append(f"Result {i}:\n{doc.page_content}")
+
+            print(f"   → Found {len(results)} {kind} results")
+            return "\n\n".join(context_parts)
+
+        except Exception as e:
+            print(f"   → Error: {e}")
+            return f"Error retrieving {kind} data: {str(e)}"
+
+    def _analyze_for_memories(self, user_input: str, response: str) -> list:
+        """Extract new personal facts about the user from one exchange (LLM call)."""
+        analysis_prompt = f"""Analyze this conversation for NEW PERSONAL information about the user.
+Extract COMPLETE statements that can stand alone as facts.
+
+USER: {user_input}
+AI: {response}
+
+RULES:
+- Store COMPLETE facts like "User's name is Sarah" NOT just "Sarah"
+- Store COMPLETE facts like "User works as a data analyst" NOT just "data analyst"
+- Store personal preferences, job, name, location, hobbies, etc.
+- Ignore product/trade data queries unless stating a personal preference
+- Each memory should be a complete sentence that makes sense on its own
+
+FORMAT (one per line):
+MEMORY: [complete fact statement] | CATEGORY: [category]
+
+If no new personal information, respond with:
+NO_NEW_MEMORIES
+
+Examples:
+USER: "I'm John and I work as a teacher"
+MEMORY: User's name is John | CATEGORY: name
+MEMORY: User works as a teacher | CATEGORY: job
+
+USER: "Show me fabric data"
+NO_NEW_MEMORIES"""
+
+        result = self.llm.invoke([HumanMessage(content=analysis_prompt)])
+        content = result.content.strip()
+
+        print(f"\n[Memory Analysis Debug] LLM output:")
+        print(f"   {content}")
+
+        memories_to_save = []
+        if "NO_NEW_MEMORIES" not in content:
+            lines = content.split("\n")
+            for line in lines:
+                if line.startswith("MEMORY:"):
+                    parts = line.split("| CATEGORY:")
+                    if len(parts) == 2:
+                        memory_text = parts[0].replace("MEMORY:", "").strip()
+                        category = parts[1].strip().lower()
+                        memories_to_save.append({
+                            "text": memory_text,
+                            "category": category
+                        })
+                        print(f"   → Extracted: '{memory_text}' (category: {category})")
+
+        if memories_to_save:
+            print(f"\n[Memory Analysis] Found {len(memories_to_save)} new memories to save")
+        else:
+            print(f"\n[Memory Analysis] No new memories to save")
+        return memories_to_save
+
+    def _save_memories(self, user_id: str, memories: list):
+        """Embed and store extracted memories in the user's namespace."""
+        namespace = (user_id, "memories")
+
+        print(f"\n[Memory Storage Debug] Saving {len(memories)} memories:")
+        for mem in memories:
+            mem_id = str(uuid.uuid4())
+            with self.memory_lock:
+                self.store.put(namespace, mem_id, mem)
+            print(f"   ✓ Saved (ID: {mem_id[:8]}...): '{mem['text']}' [category: {mem['category']}]")
+
+    def _remember(self, user_id: str, user_input: str, response: str):
+        """Memory worker job: analyze one exchange and save what it found."""
+        memories = self._analyze_for_memories(user_input, response)
+        if memories:
+            self._save_memories(user_id, memories)
+
+    def _queue_memory_analysis(self, user_id: str, user_input: str, response: str, query_type: str):
+        """
+        Hand an exchange to the memory worker, after the answer is ready.
+        Data queries are skipped unless they say something about the user.
+        """
+        if query_type in ("label", "supplier", "both") and not mentions_personal_info(user_input):
+            print(f"\n[Memory Analysis] Skipped ({query_type} data query)")
+            return
+        self.memory_worker.submit(user_id, user_id, user_input, response)
+
     def _build_graph(self):
 
         # =================================================================
-        # NEW NODE: Rewrite Query (FIRST STEP - BEFORE ROUTING)
+        # NODE: Rewrite + Route Query (FIRST STEP)
         # =================================================================
-        def rewrite_query(state: EnhancedImprovedState) -> dict:
+        def rewrite_and_route(state: EnhancedImprovedState) -> dict:
             """
-            Rewrite ambiguous queries using conversation history.
-            Handles pronouns and references like "these", "that", "them", "it"
+            Rewrite ambiguous queries using conversation history and classify them in the same
+            LLM call (structured output), so a follow-up question costs one round trip.
+            Handles pronouns and references like "these", "that", "them", "it".
+            Clear queries are only routed; in speculative mode only queries the rules are not
+            confident about are left unrouted, for route_and_retrieve to start both retrievers.
             """
             user_input = state["user_input"]
             messages = state.get("messages", [])
@@ -1075,7 +1162,11 @@ class TradeSearchAgent:
                 # No rewriting needed
                 print(f"\n[QUERY REWRITING] No rewriting needed")
                 print(f"   Original query: {user_input}")
-                return {"rewritten_query": user_input}
+                if self.speculative and not self.router.classify(user_input, allow_both=True)[1]:
+                    return {"rewritten_query": user_input, "query_type": ""}
+                return {"rewritten_query": user_input, **route_query_type({"rewritten_query": user_input})}
+
+            query_types, allowed_answers, categories = routing_categories()
 
             # Use LLM to rewrite query
             rewrite_prompt = f"""You are a query rewriting assistant. Rewrite ambiguous user queries to be self-contained and clear by incorporating context from the conversation history.
@@ -1121,19 +1212,28 @@ CURRENT: How many suppliers are there in total?
 REWRITTEN: How many suppliers are there in total?
 (No rewriting needed - query is already clear)
 
-Now rewrite this query. Respond with ONLY the rewritten query, nothing else:"""
+Then classify the REWRITTEN query into ONE category ({allowed_answers}):
+{categories}
+Return the rewritten query and its category."""
 
-            response = self.llm.invoke([HumanMessage(content=rewrite_prompt)])
-            rewritten_query = response.content.strip()
+            result = self.router_llm.with_structured_output(RewriteAndRoute).invoke([HumanMessage(content=rewrite_prompt)])
+            rewritten_query = str(result.get("rewritten_query") or user_input).strip()
+            llm_type = str(result.get("query_type") or "").strip().lower()
 
             print(f"\n[QUERY REWRITING] Rewritten ambiguous query")
             print(f"   Original: {user_input}")
             print(f"   Rewritten: {rewritten_query}")
 
-            return {"rewritten_query": rewritten_query}
+            # The rules still decide confident cases; otherwise the type from the same call is used
+            query_type, source, reason = self.router.route(
+                rewritten_query, lambda query: llm_type if llm_type in query_types else "general",
+                allow_both=self.speculative,
+            )
+            print(f"\n[ROUTING] Query classified as: {query_type.upper()} ({source}: {reason})")
+            return {"rewritten_query": rewritten_query, "query_type": query_type}
 
         # =================================================================
-        # NODE: Route Query Type (AFTER REWRITING)
+        # Route Query Type (used by rewrite_and_route and route_and_retrieve)
         # =================================================================
         def route_query_type(state: EnhancedImprovedState) -> dict:
             """
@@ -1143,13 +1243,27 @@ Now rewrite this query. Respond with ONLY the rewritten query, nothing else:"""
             - GENERAL (personal questions, greetings)
 
             NOW USES REWRITTEN QUERY for better classification
+            Confident cases are decided by self.router without an LLM call.
             """
             # Use REWRITTEN query for classification
-            query = state["rewritten_query"]
-
-            prompt = f"""Analyze this query and classify it into ONE category:
+            query_type, source, reason = self.router.route(
+                state["rewritten_query"], route_with_llm, allow_both=self.speculative
+            )
+            print(f"\n[ROUTING] Query classified as: {query_type.upper()} ({source}: {reason})")
+            return {"query_type": query_type}
 
-CATEGORIES:
+        def routing_categories():
+            """Valid query types, their one-line list and the category descriptions for the routing prompts"""
+            # "both" only exists in speculative mode, where both contexts are retrieved anyway
+            query_types = ["label", "supplier", "general"] + (["both"] if self.speculative else [])
+            allowed_answers = "label, supplier, both, or general" if self.speculative else "label, supplier, or general"
+            mixed_category = """
+4. "both" - Questions that need PRODUCT CATEGORY data AND SUPPLIER data together:
+   - "Compare clothing revenue with the top supplier's revenue"
+   - "Fabric totals and which supplier has the most transactions"
+""" if self.speculative else ""
+
+            categories = f"""CATEGORIES:
 1. "label" - Questions about PRODUCT CATEGORIES or TYPES:
    - fabric, clothing, fiber, filament, apparel, textiles
    - product categories, product types
@@ -1164,7 +1278,16 @@ CATEGORIES:
 3. "general" - PERSONAL or NON-DATA questions:
    - Greetings, personal info, user questions
    - "my name", "what do I do", "hello", "who am I"
+{mixed_category}"""
+            return query_types, allowed_answers, categories
 
+        def route_with_llm(query: str) -> str:
+            """LLM router for the queries QueryRouter is not sure about"""
+            query_types, allowed_answers, categories = routing_categories()
+
+            prompt = f"""Analyze this query and classify it into ONE category:
+
+{categories}
 Query: "{query}"
 
 IMPORTANT EXAMPLES:
@@ -1178,44 +1301,89 @@ IMPORTANT EXAMPLES:
 - "What is my name?" → general
 - "Hi, I'm Sarah" → general
 
-Respond with ONLY ONE WORD: label, supplier, or general"""
+Respond with ONLY ONE WORD: {allowed_answers}"""
 
-            response = self.llm.invoke(prompt)
+            response = self.router_llm.invoke(prompt)
             query_type = response.content.strip().lower()
 
             # Validation
-            if query_type not in ["label", "supplier", "general"]:
+            if query_type not in query_types:
                 query_type = "general"
 
-            print(f"\n[ROUTING] Query classified as: {query_type.upper()}")
-            return {"query_type": query_type}
+            return query_type
 
         # =================================================================
-        # NODE: Retrieve LABEL Data (USES REWRITTEN QUERY)
+        # NODE: Route + Retrieve concurrently (SPECULATIVE MODE)
         # =================================================================
-        def retrieve_label_data(state: EnhancedImprovedState) -> dict:
-            """Retrieve data from LABEL retriever (product categories)"""
-            # Use REWRITTEN query for retrieval
+        def route_and_retrieve(state: EnhancedImprovedState) -> dict:
+            """
+            Start both retrievers, route in the meantime, then keep the chosen context(s).
+            Queries already routed (by the rules or the fused rewrite call) only start the retriever they need.
+            The unused branch is cancelled if it has not started yet, otherwise its result is dropped.
+            """
             query = state["rewritten_query"]
-            print(f"\n[LABEL RETRIEVER] Searching for: {query}")
-
+            # Confident rule routes and follow-up questions are already routed by rewrite_and_route
+            known = state.get("query_type") or ""
+            kinds = ("label", "supplier") if known in ("", "both") else (known,) if known in ("label", "supplier") else ()
+            futures = {
+                kind: self.retrieval_pool.submit(self._retrieve_context, kind, query)
+                for kind in kinds
+            }
             try:
-                results = self.label_retriever.invoke(query)
-
-                if not results:
-                    return {"product_context": "No relevant label/category data found."}
-
-                context_parts = []
-                for i, doc in enumerate(results, 1):
-                    context_parts.append(f"Result {i}:\n{doc.page_content}")
+                routed = {"query_type": known} if known else route_query_type(state)
+            except Exception:
+                for future in futures.values():
+                    future.cancel()
+                raise
+
+            query_type = routed["query_type"]
+            wanted = ["label", "supplier"] if query_type == "both" else [query_type] if query_type in futures else []
+            for kind, future in futures.items():
+                if kind not in wanted:
+                    future.cancel()
+            print(f"[SPECULATIVE] Using {', '.join(wanted) or 'no'} retrieval results")
+
+            if not wanted:
+                return routed
+            if len(wanted) == 1:
+                return {**routed, "product_context": futures[wanted[0]].result()}
+            return {
+                **routed,
+                "product_context": (
+                    f"PRODUCT CATEGORY DATA:\n{futures['label'].result()}\n\n"
+                    f"SUPPLIER DATA:\n{futures['supplier'].result()}"
+                ),
+            }
 
-                context = "\n\n".join(context_parts)
-                print(f"   → Found {len(results)} label results")
-                return {"product_context": context}
+        # =================================================================
+        # NODE: Answer from Cache (repeated data questions)
+        # =================================================================
+        def answer_from_cache(state: EnhancedImprovedState) -> dict:
+            """Reuse the answer of an earlier data question with the same meaning and unchanged report data"""
+            # Only data answers are cached; an unset route (speculative mode) may still be a data question
+            if state.get("query_type") == "general":
+                return {}
+            hit = self.answer_cache.lookup(state["rewritten_query"])
+            if hit is None:
+                return {}
+            response, query_type, similarity = hit
+            print(f"\n[ANSWER CACHE] Reusing {query_type} answer (similarity {similarity:.3f})")
+            return {
+                "response": response,
+                "query_type": query_type,
+                "messages": [
+                    HumanMessage(content=state["user_input"]),
+                    AIMessage(content=response)
+                ]
+            }
 
-            except Exception as e:
-                print(f"   → Error: {e}")
-                return {"product_context": f"Error retrieving label data: {str(e)}"}
+        # =================================================================
+        # NODE: Retrieve LABEL Data (USES REWRITTEN QUERY)
+        # =================================================================
+        def retrieve_label_data(state: EnhancedImprovedState) -> dict:
+            """Retrieve data from LABEL retriever (product categories)"""
+            # Use REWRITTEN query for retrieval
+            return {"product_context": self._retrieve_context("label", state["rewritten_query"])}
 
         # =================================================================
         # NODE: Retrieve SUPPLIER Data (USES REWRITTEN QUERY)
@@ -1223,26 +1391,7 @@ Respond with ONLY ONE WORD: label, supplier, or general"""
         def retrieve_supplier_data(state: EnhancedImprovedState) -> dict:
             """Retrieve data from SUPPLIER retriever (companies)"""
             # Use REWRITTEN query for retrieval
-            query = state["rewritten_query"]
-            print(f"\n[SUPPLIER RETRIEVER] Searching for: {query}")
-
-            try:
-                results = self.supplier_retriever.invoke(query)
-
-                if not results:
-                    return {"product_context": "No relevant supplier data found."}
-
-                context_parts = []
-                for i, doc in enumerate(results, 1):
-                    context_parts.append(f"Result {i}:\n{doc.page_content}")
-
-                context = "\n\n".join(context_parts)
-                print(f"   → Found {len(results)} supplier results")
-                return {"product_context": context}
-
-            except Exception as e:
-                print(f"   → Error: {e}")
-                return {"product_context": f"Error retrieving supplier data: {str(e)}"}
+            return {"product_context": self._retrieve_context("supplier", state["rewritten_query"])}
 
         # =================================================================
         # NODE: Generate Data Response (for both label and supplier)
@@ -1268,6 +1417,8 @@ Provide a clear, concise answer. If the data doesn't contain the answer, say so
 
             response = self.llm.invoke([HumanMessage(content=prompt)])
             print(f"\n[Data Response] Generated {query_type} answer")
+            if "Error retrieving" not in context:
+                self.answer_cache.store(rewritten_query, query_type, response.content)
 
             return {
                 "response": response.content,
@@ -1286,7 +1437,12 @@ Provide a clear, concise answer. If the data doesn't contain the answer, say so
             # Use REWRITTEN query for memory search
             query = state["rewritten_query"]
 
-            results = store.search(namespace, query=query, limit=5)
+            # Facts from the previous turn may still be in the memory queue; wait briefly, never for the LLM call
+            if not self.memory_worker.wait(user_id, timeout=READ_WAIT_TIMEOUT):
+                print(f"\n[Memory Retrieval] Previous memories still being saved after {READ_WAIT_TIMEOUT}s, "
+                      f"using the memories saved so far")
+            with self.memory_lock:
+                results = store.search(namespace, query=query, limit=5)
 
             memories = []
             print(f"\n[Memory Retrieval Debug] Raw search results:")
@@ -1332,84 +1488,6 @@ Be helpful, friendly, and personalize your response."""
                 ]
             }
 
-        # =================================================================
-        # NODE: Analyze for Memories
-        # =================================================================
-        def analyze_for_memories(state: EnhancedImprovedState) -> dict:
-            user_input = state["user_input"]
-            response = state.get("response", "")
-
-            analysis_prompt = f"""Analyze this conversation for NEW PERSONAL information about the user.
-Extract COMPLETE statements that can stand alone as facts.
-
-USER: {user_input}
-AI: {response}
-
-RULES:
-- Store COMPLETE facts like "User's name is Sarah" NOT just "Sarah"
-- Store COMPLETE facts like "User works as a data analyst" NOT just "data analyst"
-- Store personal preferences, job, name, location, hobbies, etc.
-- Ignore product/trade data queries unless stating a personal preference
-- Each memory should be a complete sentence that makes sense on its own
-
-FORMAT (one per line):
-MEMORY: [complete fact statement] | CATEGORY: [category]
-
-If no new personal information, respond with:
-NO_NEW_MEMORIES
-
-Examples:
-USER: "I'm John and I work as a teacher"
-MEMORY: User's name is John | CATEGORY: name
-MEMORY: User works as a teacher | CATEGORY: job
-
-USER: "Show me fabric data"
-NO_NEW_MEMORIES"""
-
-            result = self.llm.invoke([HumanMessage(content=analysis_prompt)])
-            content = result.content.strip()
-
-            print(f"\n[Memory Analysis Debug] LLM output:")
-            print(f"   {content}")
-
-            memories_to_save = []
-            if "NO_NEW_MEMORIES" not in content:
-                lines = content.split("\n")
-                for line in lines:
-                    if line.startswith("MEMORY:"):
-                        parts = line.split("| CATEGORY:")
-                        if len(parts) == 2:
-                            memory_text = parts[0].replace("MEMORY:", "").strip()
-                            category = parts[1].strip().lower()
-                            memories_to_save.append({
-                                "text": memory_text,
-                                "category": category
-                            })
-                            print(f"   → Extracted: '{memory_text}' (category: {category})")
-
-            if memories_to_save:
-                print(f"\n[Memory Analysis] Found {len(memories_to_save)} new memories to save")
-            else:
-                print(f"\n[Memory Analysis] No new memories to save")
-            return {"memories_to_save": memories_to_save}
-
-        # =================================================================
-        # NODE: Save Memories
-        # =================================================================
-        def save_memories(state: EnhancedImprovedState, config: RunnableConfig, *, store: BaseStore) -> dict:
-            memories = state.get("memories_to_save", [])
-            if not memories: return {}
-
-            user_id = config["configurable"].get("user_id", "default")
-            namespace = (user_id, "memories")
-
-            print(f"\n[Memory Storage Debug] Saving {len(memories)} memories:")
-            for mem in memories:
-                mem_id = str(uuid.uuid4())
-                store.put(namespace, mem_id, mem)
-                print(f"   ✓ Saved (ID: {mem_id[:8]}...): '{mem['text']}' [category: {mem['category']}]")
-            return {}
-
         # =================================================================
         # ROUTING LOGIC
         # =================================================================
@@ -1424,10 +1502,18 @@ NO_NEW_MEMORIES"""
             else:
                 return "retrieve_memories"
 
-        def should_save(state: EnhancedImprovedState) -> Literal["save_memories", "end"]:
-            if state.get("memories_to_save"):
-                return "save_memories"
-            return "end"
+        def route_after_cache(state: EnhancedImprovedState) -> str:
+            """Cached answer → end; otherwise continue to retrieval"""
+            if state.get("response"):
+                return "end"
+            return "route_and_retrieve" if self.speculative else route_by_type(state)
+
+        def route_speculative(state: EnhancedImprovedState) -> Literal["generate_data_response", "retrieve_memories"]:
+            """Data context is already retrieved; general chat goes to memory retrieval"""
+            if state.get("query_type", "general") in ("label", "supplier", "both"):
+                return "generate_data_response"
+            return "retrieve_memories"
+
 
         # =================================================================
         # BUILD ENHANCED GRAPH WITH QUERY REWRITING
@@ -1435,74 +1521,140 @@ NO_NEW_MEMORIES"""
         workflow = StateGraph(EnhancedImprovedState)
 
         # Add all nodes
-        workflow.add_node("rewrite_query", rewrite_query)  # NEW: Query rewriting node
-        workflow.add_node("route_query_type", route_query_type)
-        workflow.add_node("retrieve_label_data", retrieve_label_data)
-        workflow.add_node("retrieve_supplier_data", retrieve_supplier_data)
+        workflow.add_node("rewrite_and_route", rewrite_and_route)  # Query rewriting + routing node
+        workflow.add_node("answer_from_cache", answer_from_cache)
+        if self.speculative:
+            workflow.add_node("route_and_retrieve", route_and_retrieve)
+        else:
+            workflow.add_node("retrieve_label_data", retrieve_label_data)
+            workflow.add_node("retrieve_supplier_data", retrieve_supplier_data)
         workflow.add_node("generate_data_response", generate_data_response)
         workflow.add_node("retrieve_memories", retrieve_memories)
         workflow.add_node("generate_general_response", generate_general_response)
-        workflow.add_node("analyze_for_memories", analyze_for_memories)
-        workflow.add_node("save_memories", save_memories)
 
         # NEW WORKFLOW:
-        # START → Rewrite Query → Route Query Type → Retrieve → Generate → Analyze → Save
-        workflow.add_edge(START, "rewrite_query")  # NEW: Rewriting first
-        workflow.add_edge("rewrite_query", "route_query_type")  # Then routing
-
-        # Route to appropriate retriever
-        workflow.add_conditional_edges(
-            "route_query_type",
-            route_by_type,
-            {
-                "retrieve_label_data": "retrieve_label_data",
-                "retrieve_supplier_data": "retrieve_supplier_data",
-                "retrieve_memories": "retrieve_memories"
-            }
-        )
+        # START → Rewrite + Route Query → Answer Cache → Retrieve → Generate (memory analysis runs after, in the background)
+        workflow.add_edge(START, "rewrite_and_route")  # NEW: Rewriting and routing first
+        workflow.add_edge("rewrite_and_route", "answer_from_cache")  # Repeated questions end here
+
+        if self.speculative:
+            # Routing and both retrievals in one step → generate response (or memories)
+            workflow.add_conditional_edges(
+                "answer_from_cache",
+                route_after_cache,
+                {
+                    "end": END,
+                    "route_and_retrieve": "route_and_retrieve"
+                }
+            )
+            workflow.add_conditional_edges(
+                "route_and_retrieve",
+                route_speculative,
+                {
+                    "generate_data_response": "generate_data_response",
+                    "retrieve_memories": "retrieve_memories"
+                }
+            )
+        else:
+            # Route to appropriate retriever
+            workflow.add_conditional_edges(
+                "answer_from_cache",
+                route_after_cache,
+                {
+                    "end": END,
+                    "retrieve_label_data": "retrieve_label_data",
+                    "retrieve_supplier_data": "retrieve_supplier_data",
+                    "retrieve_memories": "retrieve_memories"
+                }
+            )
 
-        # Label path: retrieve → generate response
-        workflow.add_edge("retrieve_label_data", "generate_data_response")
+            # Label path: retrieve → generate response
+            workflow.add_edge("retrieve_label_data", "generate_data_response")
 
-        # Supplier path: retrieve → generate response
-        workflow.add_edge("retrieve_supplier_data", "generate_data_response")
+            # Supplier path: retrieve → generate response
+            workflow.add_edge("retrieve_supplier_data", "generate_data_response")
 
-        # Both data paths converge to memory analysis
-        workflow.add_edge("generate_data_response", "analyze_for_memories")
+        # Both data paths end with the answer (memory analysis runs in the background)
+        workflow.add_edge("generate_data_response", END)
 
-        # General path: retrieve memories → generate response → analyze
+        # General path: retrieve memories → generate response
         workflow.add_edge("retrieve_memories", "generate_general_response")
-        workflow.add_edge("generate_general_response", "analyze_for_memories")
-
-        # Memory saving decision
-        workflow.add_conditional_edges(
-            "analyze_for_memories",
-            should_save,
-            {
-                "save_memories": "save_memories",
-                "end": END
-            }
-        )
-
-        workflow.add_edge("save_memories", END)
+        workflow.add_edge("generate_general_response", END)
 
         return workflow.compile(checkpointer=self.checkpointer, store=self.store)
 
-    def run_chat(self, user_input: str, thread_id: str):
-        config = {"configurable": {"user_id": "user_ui", "thread_id": thread_id}}
-
-        initial_state = {
+    @staticmethod
+    def _initial_state(user_input: str) -> dict:
+        return {
             "user_input": user_input,
             "rewritten_query": "",
             "messages": [],
             "relevant_memories": [],
-            "memories_to_save": [],
             "product_context": "",
             "query_type": "",
             "response": ""
         }
 
-        result = self.graph.invoke(initial_state, config)
+    def run_chat(self, user_input: str, thread_id: str):
+        config = {"configurable": {"user_id": "user_ui", "thread_id": thread_id}}
+
+        result = self.graph.invoke(self._initial_state(user_input), config)
+        self._queue_memory_analysis("user_ui", user_input, result["response"], result.get("query_type", ""))
         return result["response"]
 
+    def _chat_events(self, mode: str, chunk, turn: dict):
+        """
+        UI events of one graph.stream item (stream_mode=["messages", "updates"]).
+        Args:
+            mode: "messages" (LLM token chunks) or "updates" (node outputs)
+            chunk: The streamed item
+            turn: Collects response and query_type of the turn
+        """
+        if mode == "messages":
+            message, metadata = chunk
+            node = metadata.get("langgraph_node")
+            # Tokens of the answer only; router / rewrite calls are not shown. Complete messages
+            # are the nodes' state updates, already streamed as chunks.
+            if node in RESPONSE_NODES and isinstance(message, AIMessageChunk) and message.content:
+                yield {"type": "token", "node": node, "content": message.content}
+            return
+        for node, update in chunk.items():
+            update = update or {}
+            if "query_type" in update:
+                turn["query_type"] = update["query_type"]
+            if "response" in update:
+                turn["response"] = update["response"]
+                if node == "answer_from_cache":
+                    # Cached answers arrive whole, not token by token
+                    yield {"type": "token", "node": node, "content": update["response"]}
+            yield {"type": "node", "node": node, "query_type": turn["query_type"]}
+
+    def stream_chat(self, user_input: str, thread_id: str):
+        """
+        run_chat as a generator of UI events:
+        - {"type": "node", "node": ..., "query_type": ...} when a graph step finishes
+        - {"type": "token", "node": ..., "content": ...} for each answer token, as the LLM emits it
+        - {"type": "done", "response": ..., "query_type": ...} at the end
+        """
+        config = {"configurable": {"user_id": "user_ui", "thread_id": thread_id}}
+        turn = {"response": "", "query_type": ""}
+
+        for mode, chunk in self.graph.stream(self._initial_state(user_input), config, stream_mode=["messages", "updates"]):
+            yield from self._chat_events(mode, chunk, turn)
+
+        self._queue_memory_analysis("user_ui", user_input, turn["response"], turn["query_type"])
+        yield {"type": "done", **turn}
+
+    async def astream_chat(self, user_input: str, thread_id: str):
+        """Async version of stream_chat (same events)."""
+        config = {"configurable": {"user_id": "user_ui", "thread_id": thread_id}}
+        turn = {"response": "", "query_type": ""}
+
+        async for mode, chunk in self.graph.astream(self._initial_state(user_input), config, stream_mode=["messages", "updates"]):
+            for event in self._chat_events(mode, chunk, turn):
+                yield event
+
+        self._queue_memory_analysis("user_ui", user_input, turn["response"], turn["query_type"])
+        yield {"type": "done", **turn}
+
 
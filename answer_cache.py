@@ -0,0 +1,214 @@
+"""
+Semantic cache of data answers for repeated trade questions.
+
+SemanticAnswerCache keys an answer by the embedding of the rewritten query, so
+"top supplier" and "who is the top supplier?" can share one answer, and stamps
+every entry with the version of the data the answer was computed from: by
+default the report files (mtime + size), or a version callable such as the
+version the agent's search stack was built from. The version is captured at
+lookup time, so an answer computed while the data changed is not stored under
+the new version. A lookup returns a cached answer when:
+- the data version is unchanged (any change clears the cache),
+- the entry is younger than the TTL,
+- the cosine similarity reaches the threshold,
+- both queries contain the same numbers ("more than 20" never answers "more than 30").
+Identical queries (folded, punctuation removed) are answered without an embedding call. The
+cache is an LRU bounded by max_entries.
+
+Configuration (environment):
+    TRADE_ANSWER_CACHE_THRESHOLD  minimum cosine similarity (default 0.95)
+    TRADE_ANSWER_CACHE_TTL        seconds an answer stays valid (default 3600)
+    TRADE_ANSWER_CACHE_SIZE       answers kept (default 256, 0 disables the cache)
+"""
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from query_rules import fold_text
+
+ANSWER_CACHE_THRESHOLD = float(os.environ.get('TRADE_ANSWER_CACHE_THRESHOLD', 0.95))
+ANSWER_CACHE_TTL = float(os.environ.get('TRADE_ANSWER_CACHE_TTL', 3600))
+ANSWER_CACHE_SIZE = int(os.environ.get('TRADE_ANSWER_CACHE_SIZE', 256))
+
+_NUMBER = re.compile(r'\d+(?:[.,]\d+)*')
+
+
+def _cache_key(query: str) -> str:
+    """Folded query without punctuation ("Top supplier?" == "top supplier")."""
+    return ' '.join(re.sub(r'[^\w.,]+|[.,](?!\d)', ' ', fold_text(query)).split())
+
+
+def data_version(paths) -> tuple:
+    """Stamp of the files an answer was computed from: (path, mtime_ns, size), None for missing files."""
+    stamp = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            stamp.append((path, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            stamp.append((path, None, None))
+    return tuple(stamp)
+
+
+class SemanticAnswerCache:
+    """Answers by query embedding, with TTL / LRU eviction and data-version invalidation."""
+
+    def __init__(self, embeddings, version_files=(), version=None, threshold: float = ANSWER_CACHE_THRESHOLD,
+                 ttl: float = ANSWER_CACHE_TTL, max_entries: int = ANSWER_CACHE_SIZE):
+        """
+        Args:
+            embeddings: LangChain Embeddings used for the query vectors
+            version_files: Files whose change invalidates every answer (the report JSON files)
+            version: Callable returning the version of the data answers are computed from;
+                     overrides version_files (default: data_version(version_files))
+            threshold: Minimum cosine similarity of a hit
+            ttl: Seconds an answer stays valid
+            max_entries: Answers kept (least recently used are evicted); 0 disables the cache
+        """
+        self.embeddings = embeddings
+        self.version_files = tuple(version_files)
+        self.version = version or (lambda: data_version(self.version_files))
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # cache key -> (vector, numbers, query_type, response, created)
+        self._pending = OrderedDict()   # cache key -> (vector or None, data version) of a lookup, for store()
+        self._version = self.version()
+        self._lock = threading.Lock()
+        self._stats = {'exact': 0, 'semantic': 0, 'miss': 0, 'stored': 0, 'invalidated': 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @property
+    def stats(self) -> dict:
+        """Exact and semantic hits, misses, stored answers and data-version invalidations."""
+        with self._lock:
+            return dict(self._stats)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._pending.clear()
+
+    def _check_version(self):
+        """Drop every answer if the data version changed (caller holds the lock)."""
+        version = self.version()
+        if version != self._version:
+            if self._entries:
+                self._stats['invalidated'] += 1
+                print(f"🧹 Answer cache cleared: report data changed ({len(self._entries)} answers)")
+            self._entries.clear()
+            self._version = version
+
+    def _expire(self, now: float):
+        for key in [key for key, entry in self._entries.items() if now - entry[4] > self.ttl]:
+            del self._entries[key]
+
+    def _remember_lookup(self, key: str, vector, version):
+        """Keep the vector and data version of a lookup for the store() of its answer (caller holds the lock)."""
+        self._pending[key] = (vector, version)
+        self._pending.move_to_end(key)
+        while len(self._pending) > 64:
+            self._pending.popitem(last=False)
+
+    def _vector(self, query: str) -> np.ndarray:
+        vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, query: str):
+        """
+        Cached answer of a query.
+        Args:
+            query: Rewritten (self-contained) user query
+        Returns:
+            (response, query_type, similarity) or None
+        """
+        if not self.enabled:
+            return None
+        key = _cache_key(query)
+        now = time.time()
+        with self._lock:
+            self._check_version()
+            version = self._version
+            self._expire(now)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._stats['exact'] += 1
+                _, _, query_type, response, _ = self._entries[key]
+                return response, query_type, 1.0
+            if not self._entries:
+                self._stats['miss'] += 1
+                self._remember_lookup(key, None, version)
+                return None
+
+        try:
+            vector = self._vector(query)
+        except Exception as e:
+            print(f"⚠️  Answer cache lookup failed: {e}")
+            with self._lock:
+                self._remember_lookup(key, None, version)
+            return None
+
+        numbers = _NUMBER.findall(key)
+        with self._lock:
+            self._remember_lookup(key, vector, version)
+            best_key, best_score = None, self.threshold
+            for entry_key, (entry_vector, entry_numbers, _, _, _) in self._entries.items():
+                if entry_numbers != numbers:
+                    continue
+                score = float(np.dot(vector, entry_vector))
+                if score >= best_score:
+                    best_key, best_score = entry_key, score
+            if best_key is None:
+                self._stats['miss'] += 1
+                return None
+            self._entries.move_to_end(best_key)
+            self._stats['semantic'] += 1
+            _, _, query_type, response, _ = self._entries[best_key]
+            return response, query_type, best_score
+
+    def store(self, query: str, query_type: str, response: str):
+        """
+        Cache the answer of a data query, under the data version seen by its lookup();
+        the answer is dropped if the data changed since then.
+        Args:
+            query: Rewritten query the answer was generated for
+            query_type: Route of the query ("label", "supplier", "both")
+            response: Generated answer
+        """
+        if not self.enabled or not response:
+            return
+        key = _cache_key(query)
+        with self._lock:
+            if key in self._pending:
+                vector, version = self._pending.pop(key)
+            else:
+                self._check_version()
+                vector, version = None, self._version
+        if vector is None:
+            try:
+                vector = self._vector(query)
+            except Exception as e:
+                print(f"⚠️  Answer cache store failed: {e}")
+                return
+        with self._lock:
+            self._check_version()
+            if version != self._version:
+                print("⚠️  Answer not cached: the data changed while it was generated")
+                return
+            self._entries[key] = (vector, _NUMBER.findall(key), query_type, response, time.time())
+            self._entries.move_to_end(key)
+            self._stats['stored'] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
@@ -0,0 +1,136 @@
+"""
+Filtered search latency of the supplier index as the number of suppliers grows.
+
+For each size, synthetic supplier reports are synced into a fresh collection with
+report_index.sync_report_collection (batched upserts, HNSW config, payload indexes)
+and then queried with:
+- a vector search filtered on location + total_transactions (Qdrant),
+- the same filter on the report table (report_query.ReportTable, the path the
+  retriever uses for structured queries),
+- an unfiltered vector search.
+
+Run against a Qdrant server to measure payload indexes and HNSW:
+    QDRANT_URL=http://localhost:6333 python bench_supplier_index.py 1000 10000 100000
+Without QDRANT_URL an in-memory local client is used, which always scans.
+Vectors come from a deterministic hash embedding, so no model or API key is needed.
+"""
+
+import hashlib
+import os
+import sys
+import time
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.structured_query import Comparison, Comparator, Operation, Operator
+from qdrant_client import QdrantClient, models
+
+from agent_logic import create_supplier_summary, normalize_supplier_metadata, supplier_metadata_fields
+from report_index import sync_report_collection
+from report_query import ReportTable
+
+SIZES = [1000, 10000, 100000]
+QUERIES = 50
+DIMENSIONS = 384
+COLLECTION = 'bench_supplier_reports'
+LOCATIONS = ['Vietnam', 'China', 'India', 'Bangladesh', 'Korea', 'Indonesia', 'Thailand', 'Turkey']
+
+
+class HashEmbeddings(Embeddings):
+    """Deterministic unit vectors seeded by the text hash (benchmark only)."""
+
+    model = f'bench-hash-{DIMENSIONS}'
+
+    def _vector(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+        vector = np.random.default_rng(seed).standard_normal(DIMENSIONS).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts):
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+def make_documents(n, seed=0):
+    rng = np.random.default_rng(seed)
+    documents = []
+    for i in range(n):
+        txn = int(rng.integers(1, 200))
+        weight, qty, amount = rng.lognormal(10, 1.5), rng.lognormal(9, 1.5), rng.lognormal(13, 1.5)
+        report = {
+            "Supplier": f"Supplier {i:06d} Textiles Co Ltd",
+            "location": LOCATIONS[int(rng.integers(len(LOCATIONS)))],
+            "total_transactions": txn,
+            "weight_sum": weight, "weight_mean": weight / txn,
+            "qty_sum": qty, "qty_mean": qty / txn,
+            "amount_sum": amount, "amount_mean": amount / txn,
+        }
+        metadata = {"supplier": report["Supplier"], "location": report["location"]}
+        metadata.update({k: v for k, v in report.items() if k not in ("Supplier", "location")})
+        metadata["source"] = "trade_report_by_supplier"
+        documents.append(Document(page_content=create_supplier_summary(report), metadata=normalize_supplier_metadata(metadata)))
+    return documents
+
+
+def timed(fn, repeat):
+    """Median latency of fn() in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return float(np.median(samples))
+
+
+def run_benchmark(sizes=SIZES):
+    url = os.environ.get('QDRANT_URL')
+    client = QdrantClient(url=url, api_key=os.environ.get('QDRANT_API_KEY')) if url else QdrantClient(location=":memory:")
+    print(f"Qdrant: {url or 'local in-memory (no payload indexes / HNSW)'}")
+    embeddings = HashEmbeddings()
+    indexed_fields = {field.name: field.type for field in supplier_metadata_fields}
+
+    qdrant_filter = models.Filter(must=[
+        models.FieldCondition(key="metadata.location", match=models.MatchValue(value="Vietnam")),
+        models.FieldCondition(key="metadata.total_transactions", range=models.Range(gt=150)),
+    ])
+    table_filter = Operation(operator=Operator.AND, arguments=[
+        Comparison(comparator=Comparator.EQ, attribute="location", value="Vietnam"),
+        Comparison(comparator=Comparator.GT, attribute="total_transactions", value=150),
+    ])
+
+    rows = []
+    for n in sizes:
+        if client.collection_exists(COLLECTION):
+            client.delete_collection(COLLECTION)
+        documents = make_documents(n)
+
+        start = time.perf_counter()
+        store = sync_report_collection(client, COLLECTION, documents, [d.metadata["supplier"] for d in documents],
+                                       embeddings, indexed_fields=indexed_fields)
+        sync_seconds = time.perf_counter() - start
+
+        table = ReportTable(documents)
+        table.select(table_filter)  # builds the folded string columns once
+        rows.append({
+            'suppliers': n,
+            'sync_s': sync_seconds,
+            'qdrant_filtered_ms': timed(lambda: store.similarity_search("Vietnam fabric supplier", k=5, filter=qdrant_filter), QUERIES),
+            'table_filter_ms': timed(lambda: table.select(table_filter), QUERIES),
+            'qdrant_unfiltered_ms': timed(lambda: store.similarity_search("Vietnam fabric supplier", k=5), QUERIES),
+            'matches': len(table.select(table_filter)),
+        })
+        print(rows[-1])
+
+    client.delete_collection(COLLECTION)
+    print(f"\n{'suppliers':>10} {'sync s':>8} {'qdrant filtered ms':>19} {'table filter ms':>16} {'qdrant unfiltered ms':>21} {'matches':>8}")
+    for row in rows:
+        print(f"{row['suppliers']:>10} {row['sync_s']:>8.1f} {row['qdrant_filtered_ms']:>19.2f} "
+              f"{row['table_filter_ms']:>16.2f} {row['qdrant_unfiltered_ms']:>21.2f} {row['matches']:>8}")
+    return rows
+
+
+if __name__ == "__main__":
+    run_benchmark([int(arg) for arg in sys.argv[1:]] or SIZES)
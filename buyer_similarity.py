@@ -0,0 +1,176 @@
+"""
+Nearest-neighbour similarity search over buyer summaries.
+
+Each buyer row of CompanyMatcher.summary_df is encoded as a weighted feature vector:
+- log USD and log volume, scaled to [0, 1] by their range over the buyer base
+- the four business label flags
+- Scale as a position between the smallest and the biggest segment
+- strongest business and location, one-hot
+
+Euclidean distance between vectors gives a graded similarity instead of the 0/1
+credit of the rule-based score. Top-k search uses sklearn's BallTree when it is
+installed (sub-linear queries) and otherwise an exact blocked matrix search.
+sklearn is only imported when a BallTree index is built, so importing this
+module stays cheap.
+"""
+
+from importlib.util import find_spec
+
+import numpy as np
+import pandas as pd
+
+HAS_SKLEARN = find_spec('sklearn') is not None
+
+FLAG_COLUMNS = ['is_fabric', 'is_filament', 'is_fiber', 'is_clothing']
+
+# Every block spans at most 1 before weighting (USD and volume are range-scaled and
+# clipped, flags / scale / one-hots are 0-1), so with these weights a full mismatch
+# on a block adds at most about 1 to the squared distance, mirroring the 1 point per
+# component of the rule-based score; the flags block adds 0.25 per differing flag.
+FEATURE_WEIGHTS = {
+    'usd': 1.0,
+    'volume': 1.0,
+    'flags': 0.5,
+    'scale': 1.0,
+    'strongest': 1.0 / np.sqrt(2),
+    'location': 1.0 / np.sqrt(2),
+}
+
+
+def _normalize_key(value) -> str:
+    return str(value).strip().lower()
+
+
+def _blocked_knn(queries: np.ndarray, data: np.ndarray, k: int, block_size: int = 4096):
+    """Exact k-nearest neighbours by scanning data in blocks; ties go to the lower index."""
+    m = len(queries)
+    k = min(k, len(data))
+    best_d = np.full((m, 0), np.inf)
+    best_i = np.zeros((m, 0), dtype=np.int64)
+    q_sq = (queries ** 2).sum(axis=1)[:, None]
+
+    for start in range(0, len(data), block_size):
+        block = data[start:start + block_size]
+        d2 = q_sq + (block ** 2).sum(axis=1)[None, :] - 2.0 * queries @ block.T
+        np.maximum(d2, 0.0, out=d2)
+        idx = np.broadcast_to(np.arange(start, start + len(block)), d2.shape)
+
+        cand_d = np.concatenate([best_d, d2], axis=1)
+        cand_i = np.concatenate([best_i, idx], axis=1)
+        order = np.lexsort((cand_i, cand_d), axis=1)[:, :k]
+        best_d = np.take_along_axis(cand_d, order, axis=1)
+        best_i = np.take_along_axis(cand_i, order, axis=1)
+
+    return np.sqrt(best_d), best_i
+
+
+class BuyerVectorIndex:
+    """Feature-vector index over buyer summary rows with top-k similarity search."""
+
+    def __init__(self, summary_df: pd.DataFrame, scale_labels, weights: dict = None,
+                 backend: str = 'auto', block_size: int = 4096):
+        """
+        Args:
+            summary_df: CompanyMatcher.summary_df
+            scale_labels: Scale names, smallest first
+            weights: Overrides for FEATURE_WEIGHTS
+            backend: 'balltree', 'blocked', or 'auto' (BallTree if sklearn is installed)
+            block_size: Rows per block for the blocked search
+        """
+        self.summary_df = summary_df.reset_index(drop=True)
+        self.weights = {**FEATURE_WEIGHTS, **(weights or {})}
+        self.block_size = block_size
+
+        self.scale_position = {
+            _normalize_key(name): i / max(len(scale_labels) - 1, 1) for i, name in enumerate(scale_labels)
+        }
+        self.strongest_values = sorted({_normalize_key(v) for v in self.summary_df['strongest_in_USD']})
+        self.location_values = sorted({_normalize_key(v) for v in self.summary_df['Location']})
+
+        self._usd_range = self._log_range(self.summary_df['total_in_USD'])
+        self._vol_range = self._log_range(self.summary_df['total_in_Volume'])
+
+        self.vectors = self.encode(self.summary_df)
+
+        if backend == 'auto':
+            backend = 'balltree' if HAS_SKLEARN else 'blocked'
+        if backend == 'balltree' and not HAS_SKLEARN:
+            raise ImportError("backend='balltree' requires scikit-learn")
+        self.backend = backend
+        self._tree = None
+        if backend == 'balltree' and len(self.vectors):
+            from sklearn.neighbors import BallTree
+            self._tree = BallTree(self.vectors)
+
+    @staticmethod
+    def _log_values(values) -> np.ndarray:
+        return np.log1p(pd.Series(values).clip(lower=0).astype(float).values)
+
+    @classmethod
+    def _log_range(cls, values):
+        """(min, span) of log1p(values) over the buyer base."""
+        logs = cls._log_values(values)
+        if not len(logs):
+            return 0.0, 1.0
+        return logs.min(), (logs.max() - logs.min()) or 1.0
+
+    @classmethod
+    def _scaled(cls, values, value_range) -> np.ndarray:
+        """log1p(values) mapped to [0, 1] over the buyer range; profiles outside it are clipped."""
+        low, span = value_range
+        return np.clip((cls._log_values(values) - low) / span, 0.0, 1.0)
+
+    def encode(self, profiles) -> np.ndarray:
+        """
+        Encode buyer rows or prospect profiles (dicts or a DataFrame with the
+        summary_df columns) into feature vectors.
+        """
+        if isinstance(profiles, dict):
+            profiles = [profiles]
+        frame = pd.DataFrame(profiles).reset_index(drop=True)
+        w = self.weights
+        n = len(frame)
+
+        usd = self._scaled(frame['total_in_USD'], self._usd_range)
+        vol = self._scaled(frame['total_in_Volume'], self._vol_range)
+        flags = frame[FLAG_COLUMNS].astype(float).values
+        scale = frame['Scale'].map(lambda s: self.scale_position.get(_normalize_key(s), 0.0)).values
+
+        strongest = np.zeros((n, len(self.strongest_values)))
+        strongest_pos = {v: i for i, v in enumerate(self.strongest_values)}
+        location = np.zeros((n, len(self.location_values)))
+        location_pos = {v: i for i, v in enumerate(self.location_values)}
+        for row, (s, loc) in enumerate(zip(frame['strongest_in_USD'], frame['Location'])):
+            # Unseen values stay all-zero, i.e. equally distant from every known value
+            if _normalize_key(s) in strongest_pos:
+                strongest[row, strongest_pos[_normalize_key(s)]] = 1.0
+            if _normalize_key(loc) in location_pos:
+                location[row, location_pos[_normalize_key(loc)]] = 1.0
+
+        return np.hstack([
+            w['usd'] * usd[:, None],
+            w['volume'] * vol[:, None],
+            w['flags'] * flags,
+            w['scale'] * scale.astype(float)[:, None],
+            w['strongest'] * strongest,
+            w['location'] * location,
+        ])
+
+    def query(self, profiles, k: int = 3):
+        """
+        Top-k most similar buyers for each profile.
+        Returns (distances, indices), each of shape (n_profiles, k), nearest first.
+        Indices refer to rows of self.summary_df.
+        """
+        vectors = self.encode(profiles)
+        k = min(k, len(self.vectors))
+        if k == 0:
+            return np.zeros((len(vectors), 0)), np.zeros((len(vectors), 0), dtype=np.int64)
+        if self._tree is not None:
+            return self._tree.query(vectors, k=k)
+        return _blocked_knn(vectors, self.vectors, k, self.block_size)
+
+    @staticmethod
+    def similarity(distances: np.ndarray) -> np.ndarray:
+        """Map distances to a graded similarity in (0, 1], 1 meaning identical features."""
+        return 1.0 / (1.0 + distances)
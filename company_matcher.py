@@ -0,0 +1,537 @@
+"""
+Recommendation route: buyer summaries, prospect matching and company charts.
+
+Importing this module does no file, network or LLM work; the LLM client used for
+location correction is only imported when a match is requested, and the chart
+stack (matplotlib / seaborn) and scikit-learn only when a chart or a vector
+match is requested.
+"""
+
+import json
+import re
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from scale_segmentation import optimal_segments, assign_segments
+from buyer_similarity import BuyerVectorIndex
+from trade_cube import TradeCube, DIMENSIONS as CUBE_DIMENSIONS
+from trade_windows import MonthlyPrefixIndex
+from trade_data import load_trade_frame, compact_frame, concat_compact, TRADE_DATE_COLUMNS
+
+BUSINESS_LABELS = ['fabric', 'filament', 'fiber', 'clothing']
+
+# Scale names per number of segments, smallest first
+DEFAULT_SCALE_LABELS = {
+    1: ['Small'],
+    2: ['Small', 'Big'],
+    3: ['Small', 'Medium', 'Big'],
+    4: ['Micro', 'Small', 'Medium', 'Big'],
+}
+
+
+class CompanyMatcher:
+    def __init__(self, excel_path: str, scale_k: int = 2, scale_labels: List[str] = None,
+                 chart_cache_size: int = 128):
+        """
+        Args:
+            excel_path: Transaction workbook
+            scale_k: Number of Scale segments on total_in_Volume (default 2 = Small/Big)
+            scale_labels: Names of the segments, smallest first. Defaults to DEFAULT_SCALE_LABELS[scale_k].
+            chart_cache_size: Max rendered charts kept in memory (see plot_* fmt argument)
+        """
+        if scale_labels is None:
+            scale_labels = DEFAULT_SCALE_LABELS.get(scale_k, [f'Tier {i + 1}' for i in range(scale_k)])
+        if len(scale_labels) != scale_k:
+            raise ValueError(f"scale_labels must have {scale_k} entries, got {len(scale_labels)}")
+        self.scale_k = scale_k
+        self.scale_labels = list(scale_labels)
+
+        self.df = self._prepare_transactions(load_trade_frame(excel_path))
+        self.data_version = 0
+        self.cube = TradeCube.from_frame(self.df)
+        self.scale_breaks = None
+        self.summary_df = self._prepare_summary_data()
+        self._vector_index = None
+        self._vector_index_version = None
+        self._monthly_index = None
+        self._monthly_index_version = None
+        self._windows = OrderedDict()
+        self.chart_cache_size = chart_cache_size
+        self._chart_cache = None
+
+    @property
+    def chart_cache(self):
+        """trade_charts.ChartCache, created (and matplotlib imported) on first use."""
+        if self._chart_cache is None:
+            from trade_charts import ChartCache
+            self._chart_cache = ChartCache(max_entries=self.chart_cache_size)
+        return self._chart_cache
+
+    @staticmethod
+    def _prepare_transactions(df: pd.DataFrame) -> pd.DataFrame:
+        # Ensure correct types
+        if 'trade date' in df.columns:
+            df['trade date'] = pd.to_datetime(df['trade date'])
+            df['month'] = df['trade date'].dt.to_period('M').astype(str).astype('category')
+        elif 'Trade date' in df.columns:
+            df['trade date'] = pd.to_datetime(df['Trade date'])
+            df['month'] = df['trade date'].dt.to_period('M').astype(str).astype('category')
+        return df
+
+    def _summarize_buyers(self, buyers=None) -> pd.DataFrame:
+        """Build summary rows (without Scale) from the trade cube for the given buyers, or for all buyers."""
+        totals = self.cube.buyer_totals()
+        if buyers is not None:
+            totals = totals.loc[sorted(buyers)]
+        summary_df = totals.reset_index()
+
+        labels = self.cube.aggregate(['Buyer', 'label'], buyers=buyers).reset_index()
+        labels['label_key'] = labels['label'].str.lower()
+
+        # Binary Indicators
+        present = labels.groupby(['Buyer', 'label_key'])['count'].sum().unstack(fill_value=0)
+        for label_type in BUSINESS_LABELS:
+            flags = present[label_type] > 0 if label_type in present.columns else pd.Series(dtype=bool)
+            summary_df[f'is_{label_type}'] = summary_df['Buyer'].map(flags).fillna(False).astype(int)
+
+        # Strongest Biz (cube aggregates are sorted by label, so ties resolve like groupby().idxmax())
+        relevant = labels[labels['label_key'].isin(BUSINESS_LABELS)]
+        if relevant.empty:
+            summary_df['strongest_in_USD'] = 'None'
+        else:
+            strongest = relevant.loc[relevant.groupby('Buyer')['amount'].idxmax()].set_index('Buyer')['label']
+            summary_df['strongest_in_USD'] = summary_df['Buyer'].map(strongest).fillna('None')
+
+        return summary_df
+
+    def _fit_scale_breaks(self, volumes: pd.Series):
+        """Optimal scale_k-segment split of total volume (exact 1-D natural breaks)."""
+        _, breaks = optimal_segments(volumes.values, self.scale_k)
+        return breaks
+
+    def _apply_scale(self, summary_df: pd.DataFrame, rows=None, breaks=None):
+        rows = summary_df.index if rows is None else rows
+        breaks = self.scale_breaks if breaks is None else breaks
+        segments = assign_segments(summary_df.loc[rows, 'total_in_Volume'].values, breaks)
+        summary_df.loc[rows, 'Cluster'] = segments
+        summary_df.loc[rows, 'Scale'] = [self.scale_labels[s] for s in segments]
+
+    def _prepare_summary_data(self):
+        # Group by Buyer
+        summary_df = self._summarize_buyers()
+
+        # Scale Logic (Big vs Small) via exact 1-D segmentation of total volume
+        self.scale_breaks = self._fit_scale_breaks(summary_df['total_in_Volume'])
+        summary_df['Cluster'] = 0
+        summary_df['Scale'] = self.scale_labels[0]
+        self._apply_scale(summary_df)
+
+        return summary_df
+
+    def append_transactions(self, df_new: pd.DataFrame):
+        """
+        Ingest newly arrived transactions without reloading the workbook.
+        The new rows are aggregated into a small cube and merged into the trade cube;
+        summary rows are rebuilt for the affected buyers only, and Scale labels of
+        the other buyers are recomputed only when the segment breaks move.
+        Returns the updated summary_df.
+        """
+        if df_new is None or df_new.empty:
+            return self.summary_df
+
+        df_new = self._prepare_transactions(compact_frame(df_new, date_columns=TRADE_DATE_COLUMNS))
+        self.df = concat_compact([self.df, df_new])
+
+        new_cube = TradeCube.from_frame(df_new)
+        self.cube = self.cube.merge(new_cube)
+
+        # Re-summarize only the buyers that received new rows
+        touched = pd.Index(new_cube.buyers)
+        updated = self._summarize_buyers(touched).set_index('Buyer')
+        summary_df = self.summary_df.set_index('Buyer')
+        summary_df = pd.concat([summary_df.drop(index=touched, errors='ignore'), updated]).sort_index()
+        summary_df = summary_df.reset_index()
+
+        # Scale labels of untouched buyers only change if the segment breaks moved
+        old_breaks = self.scale_breaks
+        self.scale_breaks = self._fit_scale_breaks(summary_df['total_in_Volume'])
+        if np.array_equal(old_breaks, self.scale_breaks):
+            self._apply_scale(summary_df, rows=summary_df.index[summary_df['Buyer'].isin(touched)])
+        else:
+            self._apply_scale(summary_df)
+        summary_df['Cluster'] = summary_df['Cluster'].astype(int)
+
+        self.summary_df = summary_df
+        self.data_version += 1
+        if self._chart_cache is not None:
+            self._chart_cache.invalidate(self.data_version)
+        return self.summary_df
+
+    # --- Time-windowed summaries ---
+
+    WINDOW_CACHE_SIZE = 16
+
+    def _get_window(self, date_range) -> dict:
+        """
+        Cached {'summary': DataFrame, 'vector_index': BuyerVectorIndex or None} for the
+        month window of date_range. Monthly prefix sums are rebuilt lazily when the data version changes.
+        """
+        if self._monthly_index is None or self._monthly_index_version != self.data_version:
+            self._monthly_index = MonthlyPrefixIndex(self.cube, BUSINESS_LABELS)
+            self._monthly_index_version = self.data_version
+            self._windows.clear()
+
+        bounds = self._monthly_index.month_bounds(date_range)
+        if bounds in self._windows:
+            self._windows.move_to_end(bounds)
+            return self._windows[bounds]
+
+        summary_df = self._monthly_index.summarize(*bounds)
+        # Scale is relative to the buyers active in the window, so breaks are fitted per window
+        summary_df['Cluster'] = 0
+        summary_df['Scale'] = self.scale_labels[0]
+        self._apply_scale(summary_df, breaks=self._fit_scale_breaks(summary_df['total_in_Volume']))
+        summary_df['Cluster'] = summary_df['Cluster'].astype(int)
+
+        window = {'summary': summary_df, 'vector_index': None}
+        self._windows[bounds] = window
+        while len(self._windows) > self.WINDOW_CACHE_SIZE:
+            self._windows.popitem(last=False)
+        return window
+
+    def window_summary(self, date_range=None) -> pd.DataFrame:
+        """
+        Buyer summary (same columns as summary_df) restricted to a date window.
+        Totals, label flags and strongest business come from monthly prefix sums, so
+        any window costs O(1) per buyer; Scale is re-segmented on the window's volumes.
+        Location stays the buyer's overall location.
+        Args:
+            date_range: (start, end) dates or 'YYYY-MM' strings, inclusive and month-aligned,
+                        either side None for open-ended; an int N for the last N months
+                        of data; None for the whole dataset (summary_df)
+        """
+        if date_range is None:
+            return self.summary_df
+        return self._get_window(date_range)['summary']
+
+    @staticmethod
+    def _correct_location(location: str) -> str:
+        """LLM spelling correction of a location to a standard country name (original kept on failure)."""
+        # This follows lines 610-618 of analyze_trade_data.ipynb
+        try:
+            from langchain_openai import ChatOpenAI
+            llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0)
+            correction_prompt = f"Correct the spelling of this location to a standard country name: '{location}'. Return ONLY the name."
+            corrected_location = llm.invoke(correction_prompt).content.strip()
+            print(f"📍 Location interpreted as: {corrected_location} (Original: {location})")
+            return corrected_location
+        except Exception as e:
+            print(f"⚠️  Warning: Could not verify location spelling ({e}). Using original.")
+            return location
+
+    def _get_vector_index(self, date_range=None) -> BuyerVectorIndex:
+        """Buyer feature-vector index (of the date window, if given), rebuilt lazily when the data version changes."""
+        if date_range is not None:
+            window = self._get_window(date_range)
+            if window['vector_index'] is None:
+                window['vector_index'] = BuyerVectorIndex(window['summary'], self.scale_labels)
+            return window['vector_index']
+        if self._vector_index is None or self._vector_index_version != self.data_version:
+            self._vector_index = BuyerVectorIndex(self.summary_df, self.scale_labels)
+            self._vector_index_version = self.data_version
+        return self._vector_index
+
+    def find_matches(self, user_data: dict, mode: str = 'rules', top_k: int = 3, date_range=None):
+        """
+        Find top matching companies for a prospect profile.
+        Includes LLM-based location correction as per analyze_trade_data.ipynb.
+        Args:
+            user_data: Profile with Location, Scale, strongest_in_USD, is_* flags, total_in_USD, total_in_Volume
+            mode: 'rules' - 6-component scoring system (binary credit per component)
+                  'vector' - nearest neighbours on normalized feature vectors (graded similarity)
+            top_k: Number of matches to return
+            date_range: Match against buyer activity in this window only (see window_summary);
+                        user_data totals should cover a window of the same length
+        """
+        summary_df = self.window_summary(date_range).copy()
+        
+        # === 1. ROBUST LOCATION MATCHING (LLM CORRECTION) ===
+        user_data['Location'] = self._correct_location(user_data['Location'])
+
+        if mode == 'vector':
+            return self._find_vector_matches(user_data, top_k, date_range)
+        if mode != 'rules':
+            raise ValueError(f"Unknown matching mode: {mode}")
+        
+        components = self._rule_scores(pd.DataFrame([user_data]), summary_df)
+        total_score = sum(components.values())[0]
+        order = np.argsort(-total_score, kind='stable')[:top_k]
+
+        scores = []
+        for i in order:
+            row = summary_df.iloc[i]
+            breakdown = {name: float(score[0, i]) for name, score in components.items()}
+            scores.append({
+                'Buyer': row['Buyer'],
+                'Total Score': total_score[i],
+                'Location': row['Location'],
+                'Scale': row['Scale'],
+                'Strongest': row['strongest_in_USD'],
+                'Breakdown': "Loc: {Loc}, Scale: {Scale}, Strong: {Strong}, Act: {Act:.2f}, USD: {USD}, Vol: {Vol}".format(**breakdown)
+            })
+
+        return pd.DataFrame(scores, index=summary_df.index[order])
+
+    @staticmethod
+    def _equal_matrix(left, right) -> np.ndarray:
+        """left[i] == right[j] for every pair, compared through shared integer codes."""
+        codes, _ = pd.factorize(np.concatenate([np.asarray(left, dtype=object), np.asarray(right, dtype=object)]))
+        return codes[:len(left), None] == codes[None, len(left):]
+
+    def _rule_scores(self, profiles: pd.DataFrame, summary_df: pd.DataFrame = None) -> dict:
+        """
+        6-component scoring system of profiles (rows) against every buyer in summary_df (columns).
+        Returns {component: (n_profiles, n_buyers) array}; the Total Score is their sum (max 6.0).
+        """
+        summary_df = self.summary_df if summary_df is None else summary_df
+        lower = lambda col: col.astype(str).str.lower().values
+
+        # 1. Location Score (1 point)
+        score_loc = self._equal_matrix(lower(profiles['Location']), lower(summary_df['Location']))
+
+        # 2. Scale Score (1 point)
+        score_scale = self._equal_matrix(profiles['Scale'].values, summary_df['Scale'].values)
+
+        # 3. Strongest Business Score (1 point)
+        score_strongest = self._equal_matrix(lower(profiles['strongest_in_USD']), lower(summary_df['strongest_in_USD']))
+
+        # 4. Business Activities Score (Max 1 point)
+        matches = np.zeros((len(profiles), len(summary_df)))
+        for flag in [f'is_{label}' for label in BUSINESS_LABELS]:
+            matches += profiles[flag].values[:, None] == summary_df[flag].values[None, :]
+        score_activity = matches / 4.0
+
+        # 5. Total USD Score (1 point, approx +/- 10%)
+        user_usd = profiles['total_in_USD'].values.astype(float)[:, None]
+        row_usd = summary_df['total_in_USD'].values.astype(float)[None, :]
+        score_usd = (user_usd * 0.9 <= row_usd) & (row_usd <= user_usd * 1.1)
+
+        # 6. Total Volume Score (1 point, approx +/- 10%)
+        user_vol = profiles['total_in_Volume'].values.astype(float)[:, None]
+        row_vol = summary_df['total_in_Volume'].values.astype(float)[None, :]
+        score_vol = (user_vol * 0.9 <= row_vol) & (row_vol <= user_vol * 1.1)
+
+        return {
+            'Loc': score_loc.astype(float),
+            'Scale': score_scale.astype(float),
+            'Strong': score_strongest.astype(float),
+            'Act': score_activity,
+            'USD': score_usd.astype(float),
+            'Vol': score_vol.astype(float),
+        }
+
+    def _correct_locations(self, locations) -> dict:
+        """
+        LLM spelling correction for many locations in a single call.
+        Returns {original: corrected}; originals are kept for anything the LLM does not return.
+        """
+        unique = sorted({str(loc) for loc in locations if pd.notna(loc)})
+        mapping = {loc: loc for loc in unique}
+        if not unique:
+            return mapping
+        try:
+            from langchain_openai import ChatOpenAI
+            llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0)
+            correction_prompt = (
+                "Correct the spelling of each of these locations to a standard country name.\n"
+                f"Locations: {json.dumps(unique, ensure_ascii=False)}\n"
+                "Return ONLY a JSON object mapping each original location to its corrected name."
+            )
+            content = llm.invoke(correction_prompt).content.strip()
+            content = re.sub(r'^```(?:json)?|```$', '', content).strip()
+            corrected = json.loads(content)
+            for loc in unique:
+                if isinstance(corrected.get(loc), str) and corrected[loc].strip():
+                    mapping[loc] = corrected[loc].strip()
+            print(f"📍 Interpreted {len(unique)} locations in one call")
+        except Exception as e:
+            print(f"⚠️  Warning: Could not verify location spelling ({e}). Using originals.")
+        return mapping
+
+    def find_matches_batch(self, profiles_df: pd.DataFrame, k: int = 3, mode: str = 'rules', chunk_size: int = 256,
+                           date_range=None):
+        """
+        Score many prospect profiles at once.
+        Locations are corrected with one LLM call for the whole sheet, and the
+        profiles x buyers score matrix is computed chunk_size profiles at a time
+        to bound memory.
+        Args:
+            profiles_df: One profile per row, same fields as find_matches user_data
+            k: Matches per profile
+            mode: 'rules' (6-component score) or 'vector' (feature-vector similarity)
+            chunk_size: Profiles scored per chunk
+            date_range: Match against buyer activity in this window only (see window_summary)
+        Returns:
+            Tidy DataFrame with one row per (profile, match): Profile (index label of
+            profiles_df), Rank, Buyer, the score columns, Location, Scale, Strongest
+        """
+        if mode not in ('rules', 'vector'):
+            raise ValueError(f"Unknown matching mode: {mode}")
+
+        profiles = profiles_df.copy()
+        corrections = self._correct_locations(profiles['Location'])
+        profiles['Location'] = profiles['Location'].map(lambda loc: corrections.get(str(loc), loc) if pd.notna(loc) else loc)
+
+        summary_df = self.window_summary(date_range)
+        k = min(k, len(summary_df))
+        frames = []
+        for start in range(0, len(profiles), chunk_size):
+            chunk = profiles.iloc[start:start + chunk_size]
+
+            if mode == 'vector':
+                index = self._get_vector_index(date_range)
+                distances, order = index.query(chunk, k=k)
+                scores = {'Similarity': index.similarity(distances), 'Distance': distances}
+            else:
+                components = self._rule_scores(chunk, summary_df)
+                total_score = sum(components.values())
+                order = np.argsort(-total_score, axis=1, kind='stable')[:, :k]
+                scores = {'Total Score': np.take_along_axis(total_score, order, axis=1)}
+                for name, score in components.items():
+                    scores[f'{name} Score'] = np.take_along_axis(score, order, axis=1)
+
+            matched = summary_df.iloc[order.ravel()]
+            frame = pd.DataFrame({
+                'Profile': np.repeat(chunk.index.values, order.shape[1]),
+                'Rank': np.tile(np.arange(1, order.shape[1] + 1), len(chunk)),
+                'Buyer': matched['Buyer'].values,
+            })
+            for name, score in scores.items():
+                frame[name] = score.ravel()
+            frame['Location'] = matched['Location'].values
+            frame['Scale'] = matched['Scale'].values
+            frame['Strongest'] = matched['strongest_in_USD'].values
+            frames.append(frame)
+
+        if not frames:
+            return pd.DataFrame(columns=['Profile', 'Rank', 'Buyer', 'Location', 'Scale', 'Strongest'])
+        return pd.concat(frames, ignore_index=True)
+
+    def _find_vector_matches(self, user_data: dict, top_k: int = 3, date_range=None):
+        """Top-k buyers by feature-vector similarity (location already corrected)."""
+        index = self._get_vector_index(date_range)
+        distances, indices = index.query(user_data, k=top_k)
+        matched = index.summary_df.iloc[indices[0]]
+        return pd.DataFrame({
+            'Buyer': matched['Buyer'].values,
+            'Similarity': index.similarity(distances[0]),
+            'Distance': distances[0],
+            'Location': matched['Location'].values,
+            'Scale': matched['Scale'].values,
+            'Strongest': matched['strongest_in_USD'].values,
+        })
+
+    # --- Plotting Functions for a Matched Company ---
+
+    def _render_cached(self, chart, company, option, fmt, build):
+        """Rendered bytes of a chart, served from chart_cache when the data has not changed."""
+        from trade_charts import figure_to_bytes
+
+        def render():
+            fig = build()
+            return None if fig is None else figure_to_bytes(fig, fmt)
+        return self.chart_cache.get_or_render((chart, company, option, fmt), self.data_version, render)
+
+    def plot_performance(self, company, fmt=None):
+        """
+        Monthly amount and quantity for a company.
+        Returns a Figure, or PNG/SVG bytes (cached) when fmt is 'png' or 'svg'.
+        """
+        if fmt is not None:
+            return self._render_cached('performance', company, None, fmt, lambda: self.plot_performance(company))
+        from trade_charts import build_performance_figure
+        return build_performance_figure(self.cube, company)
+
+    def _company_rows(self, company, category):
+        """Raw rows of a company, only needed for pie categories that are not cube dimensions."""
+        if category in CUBE_DIMENSIONS:
+            return None
+        return self.df[self.df['Buyer'] == company]
+
+    def plot_pie_distribution(self, company, category='Product', fmt=None):
+        """
+        Plot pie charts showing distribution by category (Product or label).
+        Args:
+            company: Company name to analyze
+            category: Grouping category - 'Product' or 'label' (interactive parameter)
+            fmt: None for a Figure, or 'png'/'svg' for rendered bytes (cached)
+        """
+        if fmt is not None:
+            return self._render_cached('pie', company, category, fmt, lambda: self.plot_pie_distribution(company, category))
+        from trade_charts import build_pie_figure
+        return build_pie_figure(self.cube, company, category, rows=self._company_rows(company, category))
+
+    def plot_top_suppliers(self, company, type_filter='General', fmt=None):
+        """
+        Plot top 3 suppliers by Amount and Volume, with optional type filtering.
+        Args:
+            company: Company name to analyze
+            type_filter: Filter by label type - 'General', 'Fabric', 'Filament', 'Fiber', or 'Clothing' (interactive parameter)
+            fmt: None for a Figure, or 'png'/'svg' for rendered bytes (cached)
+        """
+        if fmt is not None:
+            return self._render_cached('suppliers', company, type_filter, fmt, lambda: self.plot_top_suppliers(company, type_filter))
+        from trade_charts import build_suppliers_figure
+        return build_suppliers_figure(self.cube, company, type_filter)
+
+    def render_charts_batch(self, companies, charts=None, fmt='png', max_workers=None):
+        """
+        Render the charts of several companies in parallel worker processes.
+        Each worker receives only its company's slice of the trade cube and returns
+        encoded images; results also go into chart_cache, and cached charts are not
+        rendered again.
+        Args:
+            companies: Company names (e.g. the Buyer column of find_matches)
+            charts: List of (chart, option) jobs; chart is 'performance', 'pie' or 'suppliers',
+                    option is the pie category / supplier type_filter. Defaults to DEFAULT_CHART_JOBS.
+            fmt: 'png' or 'svg'
+            max_workers: Process pool size (None = CPU count)
+        Returns:
+            {company: {(chart, option): bytes or None}}
+        """
+        from trade_charts import render_company_charts, init_render_worker, DEFAULT_CHART_JOBS
+
+        jobs = [tuple(job) for job in (charts or DEFAULT_CHART_JOBS)]
+        results = {company: {} for company in companies}
+        pending = {}
+        for company in results:
+            for chart, option in jobs:
+                found, image = self.chart_cache.get((chart, company, option, fmt), self.data_version)
+                if found:
+                    results[company][(chart, option)] = image
+                else:
+                    pending.setdefault(company, []).append((chart, option))
+
+        def payload(company, company_jobs):
+            raw_categories = {option for chart, option in company_jobs if chart == 'pie' and option not in CUBE_DIMENSIONS}
+            rows = self.df[self.df['Buyer'] == company] if raw_categories else None
+            return self.cube.subset([company]), company, company_jobs, fmt, rows
+
+        if len(pending) <= 1 or max_workers == 1:
+            rendered = {company: render_company_charts(*payload(company, company_jobs))
+                        for company, company_jobs in pending.items()}
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers, initializer=init_render_worker) as pool:
+                futures = {company: pool.submit(render_company_charts, *payload(company, company_jobs))
+                           for company, company_jobs in pending.items()}
+                rendered = {company: future.result() for company, future in futures.items()}
+
+        for company, images in rendered.items():
+            for (chart, option), image in images.items():
+                self.chart_cache.put((chart, company, option, fmt), self.data_version, image)
+                results[company][(chart, option)] = image
+        return results
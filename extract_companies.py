@@ -1,5 +1,6 @@
 import pandas as pd
 import os
+from trade_data import load_frame
 
 # Define file paths
 input_file = 'vietnam_buyers_hs5301_cleaned_imputed.xlsx'
@@ -8,7 +9,7 @@ output_file = 'unique_company_locations.xlsx'
 def extract_companies():
     print(f"Loading {input_file}...")
     try:
-        df = pd.read_excel(input_file)
+        df = load_frame(input_file, columns=['buyer', 'buyer_country', 'seller', 'seller_country'])
     except FileNotFoundError:
         print(f"Error: File {input_file} not found.")
         return
@@ -1,12 +1,13 @@
 import pandas as pd
 import random
 from faker import Faker
+from trade_data import load_frame
 
 # Initialize Faker for generating realistic company data
 fake = Faker()
 
 # Read the trade data
-df = pd.read_excel('trade_data_expanded.xlsx')
+df = load_frame('trade_data_expanded.xlsx', columns=['Supplier', 'Supplier Location'])
 
 # Extract unique suppliers with their locations and countries
 suppliers_data = df[['Supplier', 'Supplier Location']].drop_duplicates()
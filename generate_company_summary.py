@@ -1,14 +1,16 @@
 import pandas as pd
 import numpy as np
+from trade_data import load_frame
 
 INPUT_FILE = 'company_analytics_report_2024.xlsx'
 OUTPUT_SHEET = 'Company Summary'
 DATA_SHEET = 'Daily Transactions'
+DATA_COLUMNS = ['Buyer', 'Category', 'Total_Price', 'Total_Amount', 'Country_Buyer']
 
 def generate_company_summary():
     print(f"Loading {INPUT_FILE} - Sheet: {DATA_SHEET}...")
     try:
-        df = pd.read_excel(INPUT_FILE, sheet_name=DATA_SHEET)
+        df = load_frame(INPUT_FILE, sheet_name=DATA_SHEET, columns=DATA_COLUMNS)
     except Exception as e:
         print(f"Error loading file: {e}")
         return
@@ -21,7 +23,7 @@ def generate_company_summary():
 
     # 1. Base Aggregation: Total Revenue and Total Amount per Company
     # Group by Buyer
-    company_stats = df.groupby('Buyer').agg({
+    company_stats = df.groupby('Buyer', observed=True).agg({
         'Total_Price': 'sum',
         'Total_Amount': 'sum',
         'Country_Buyer': 'first' # Take the first country as location
@@ -59,7 +61,7 @@ def generate_company_summary():
 
     # 4. Best Category Logic
     # Calculate revenue per category per buyer
-    cat_revenues = df.groupby(['Buyer', 'Category']).agg({
+    cat_revenues = df.groupby(['Buyer', 'Category'], observed=True).agg({
         'Total_Price': 'sum',
         'Total_Amount': 'sum'
     }).reset_index()
@@ -71,7 +73,7 @@ def generate_company_summary():
     )
     
     # Take the top one for each buyer
-    best_cats = cat_revenues.groupby('Buyer').first().reset_index()
+    best_cats = cat_revenues.groupby('Buyer', observed=True).first().reset_index()
     best_cats = best_cats[['Buyer', 'Category']].rename(columns={'Category': 'best_category'})
 
     # 5. Merge Process
@@ -2,6 +2,7 @@ import pandas as pd
 import numpy as np
 import random
 from datetime import date, timedelta
+from trade_data import load_frame
 
 INPUT_FILE = 'company_analytics_report_2024.xlsx'
 SHEET_NAME = 'Daily Transactions'
@@ -9,17 +10,14 @@ SHEET_NAME = 'Daily Transactions'
 def generate_data():
     print(f"Loading {INPUT_FILE}...")
     try:
-        xl = pd.ExcelFile(INPUT_FILE)
+        # Extract Companies from Executive Summary
+        df_exec = load_frame(INPUT_FILE, sheet_name='Executive Summary', columns=['Supplier'])
+        companies = df_exec['Supplier'].unique().tolist()
+        print(f"Found {len(companies)} companies.")
     except FileNotFoundError:
         print("Error: File not found.")
         return
-
-    # Extract Companies from Executive Summary
-    if 'Executive Summary' in xl.sheet_names:
-        df_exec = xl.parse('Executive Summary')
-        companies = df_exec['Supplier'].unique().tolist()
-        print(f"Found {len(companies)} companies.")
-    else:
+    except ValueError:
         print("Executive Summary not found. Using defaults.")
         companies = ["Atlantic Fibers", "Sunrise Synthetics"]
 
@@ -0,0 +1,96 @@
+"""
+Background queue for work that must not delay a chat answer (memory extraction).
+
+BackgroundWorker runs a handler on daemon threads fed by a bounded queue.
+submit() waits at most submit_timeout for a free slot and drops the job when the
+queue stays full (back-pressure: a slow LLM never blocks the chat turn or grows
+memory without bound). Jobs are tagged with a key (the user id) and wait(key)
+blocks until that key has nothing pending, so a question that reads memories can
+still see the facts from the previous turn; chat turns wait at most
+READ_WAIT_TIMEOUT and otherwise go on with what is already saved.
+"""
+
+import queue
+import threading
+from collections import defaultdict
+
+MEMORY_QUEUE_SIZE = 64
+SUBMIT_TIMEOUT = 0.1
+WAIT_TIMEOUT = 10.0
+# Bound for a chat turn waiting on the previous turn's job: past it, the turn reads what is already saved
+READ_WAIT_TIMEOUT = 0.5
+
+
+class BackgroundWorker:
+    """Bounded job queue processed by daemon threads, with per-key pending counts."""
+
+    def __init__(self, handler, maxsize: int = MEMORY_QUEUE_SIZE, workers: int = 1,
+                 submit_timeout: float = SUBMIT_TIMEOUT, name: str = "background"):
+        """
+        Args:
+            handler: Called as handler(*args) for every submitted job
+            maxsize: Jobs waiting at most; further submits are dropped after submit_timeout
+            workers: Worker threads (1 keeps the jobs of a key in order)
+            submit_timeout: Seconds submit() waits for a free slot
+            name: Thread name prefix
+        """
+        self.handler = handler
+        self.submit_timeout = submit_timeout
+        self.queue = queue.Queue(maxsize=maxsize)
+        self._pending = defaultdict(int)
+        self._condition = threading.Condition()
+        self._stats = {'submitted': 0, 'done': 0, 'failed': 0, 'dropped': 0}
+        for i in range(workers):
+            threading.Thread(target=self._run, name=f"{name}-worker-{i}", daemon=True).start()
+
+    def submit(self, key, *args) -> bool:
+        """Queue handler(*args) under key; False if the queue was full and the job was dropped."""
+        with self._condition:
+            self._pending[key] += 1
+        try:
+            self.queue.put((key, args), timeout=self.submit_timeout)
+        except queue.Full:
+            self._finish(key, 'dropped')
+            print(f"⚠️  Background queue full ({self.queue.maxsize} jobs), dropped a job for {key!r}")
+            return False
+        with self._condition:
+            self._stats['submitted'] += 1
+        return True
+
+    def _finish(self, key, outcome: str):
+        with self._condition:
+            self._stats[outcome] += 1
+            self._pending[key] -= 1
+            if self._pending[key] <= 0:
+                del self._pending[key]
+            self._condition.notify_all()
+
+    def _run(self):
+        while True:
+            key, args = self.queue.get()
+            outcome = 'done'
+            try:
+                self.handler(*args)
+            except Exception as e:
+                outcome = 'failed'
+                print(f"⚠️  Background job for {key!r} failed: {e}")
+            finally:
+                self._finish(key, outcome)
+                self.queue.task_done()
+
+    def wait(self, key=None, timeout: float = WAIT_TIMEOUT) -> bool:
+        """
+        Block until the jobs of key (or all jobs) are processed.
+        Returns:
+            False if the timeout expired first
+        """
+        with self._condition:
+            if key is None:
+                return self._condition.wait_for(lambda: not self._pending, timeout)
+            return self._condition.wait_for(lambda: key not in self._pending, timeout)
+
+    @property
+    def stats(self) -> dict:
+        """Jobs submitted, done, failed and dropped, and the current queue length."""
+        with self._condition:
+            return {**self._stats, 'queued': self.queue.qsize()}
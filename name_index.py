@@ -0,0 +1,187 @@
+"""
+In-process company name index for the search route.
+
+Names are folded (lower case, no diacritics, punctuation to spaces) and stripped
+of legal forms at either end ("công ty tnhh dệt may suliman" -> "det may suliman",
+"Liniere de Bosc Nouvel S.A." -> "liniere de bosc nouvel"). The index keeps:
+- an exact dict from the core name to its entries,
+- a sorted key list for prefix lookups ("northern thread" -> "northern thread industries"),
+- a trigram inverted index for fuzzy matches (typos, missing words).
+
+lookup() resolves a name; find_in_text() finds the known names inside a free-form
+question by checking its word n-grams, longest first.
+"""
+
+import bisect
+import re
+from collections import defaultdict
+from typing import List, NamedTuple
+
+from query_rules import fold_text
+
+# Legal forms (folded, punctuation already turned into spaces), stripped from the start / end of names
+LEGAL_FORMS = [
+    'cong ty', 'cong ty tnhh', 'cong ty co phan', 'cong ty cp', 'tnhh', 'tnhh mtv', 'mot thanh vien', 'co phan', 'cp', 'jsc',
+    'co', 'co ltd', 'company', 'company limited', 'limited', 'ltd', 'corp', 'corporation', 'inc', 'incorporated',
+    'llc', 'plc', 'pte', 'pte ltd', 'pvt', 'pvt ltd', 'private limited', 'group', 'holdings',
+    's a', 'sa', 's a s', 'sas', 's a r l', 'sarl', 's r l', 'srl', 's p a', 'spa', 'b v', 'bv', 'n v', 'nv',
+    'gmbh', 'ag', 'kg', 'oy', 'ab', 'as', 'ets', 'sl', 'se',
+]
+_LEGAL_TOKENS = sorted({tuple(form.split()) for form in LEGAL_FORMS}, key=len, reverse=True)
+
+EXACT_SCORE = 1.0
+PREFIX_SCORE = 0.9
+FUZZY_MIN_SCORE = 0.75
+
+
+class NameMatch(NamedTuple):
+    name: str
+    kind: str
+    score: float
+    payload: object
+
+
+def _tokens(name: str) -> List[str]:
+    return re.sub(r'[^\w]+', ' ', fold_text(name).replace('&', ' and ')).split()
+
+
+def _strip_legal(tokens: List[str]) -> List[str]:
+    """Drop legal forms at the start and end, keeping at least one token."""
+    changed = True
+    while changed and len(tokens) > 1:
+        changed = False
+        for form in _LEGAL_TOKENS:
+            n = len(form)
+            if len(tokens) > n and tuple(tokens[:n]) == form:
+                tokens, changed = tokens[n:], True
+                break
+            if len(tokens) > n and tuple(tokens[-n:]) == form:
+                tokens, changed = tokens[:-n], True
+                break
+    return tokens
+
+
+def normalize_name(name: str) -> str:
+    """Core company name used as index key (folded, punctuation-free, legal forms removed)."""
+    return ' '.join(_strip_legal(_tokens(name)))
+
+
+def _trigrams(key: str) -> set:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    """Exact / prefix / trigram lookup of company names."""
+
+    def __init__(self):
+        self._exact = defaultdict(list)      # key -> [(name, kind, payload)]
+        self._keys = []                      # sorted keys, for prefix search
+        self._trigrams = defaultdict(set)    # trigram -> keys
+        self._key_trigrams = {}
+        self._token_keys = defaultdict(int)  # word -> number of keys containing it
+
+    def __len__(self):
+        return sum(len(entries) for entries in self._exact.values())
+
+    def add(self, name: str, kind: str, payload=None):
+        """
+        Args:
+            name: Company name as it appears in the data
+            kind: 'supplier', 'buyer' or 'company'
+            payload: Returned with matches (e.g. the supplier report Document)
+        """
+        key = normalize_name(name)
+        if not key:
+            return
+        if key not in self._exact:
+            bisect.insort(self._keys, key)
+            grams = _trigrams(key)
+            self._key_trigrams[key] = grams
+            for gram in grams:
+                self._trigrams[gram].add(key)
+            for token in set(key.split()):
+                self._token_keys[token] += 1
+        if all(existing[0] != name or existing[1] != kind for existing in self._exact[key]):
+            self._exact[key].append((name, kind, payload))
+
+    def _matches(self, key: str, score: float, kind: str = None) -> List[NameMatch]:
+        return [NameMatch(name, k, score, payload) for name, k, payload in self._exact[key] if kind is None or k == kind]
+
+    def _prefixed(self, key: str) -> List[str]:
+        """Keys starting with key at a word boundary."""
+        start = bisect.bisect_left(self._keys, key)
+        found = []
+        for candidate in self._keys[start:]:
+            if not candidate.startswith(key):
+                break
+            if len(candidate) == len(key) or candidate[len(key)] == ' ':
+                found.append(candidate)
+        return found
+
+    def lookup(self, name: str, kind: str = None, limit: int = 5, min_score: float = FUZZY_MIN_SCORE) -> List[NameMatch]:
+        """
+        Best matches of a name: exact core name, then word-prefix, then trigram similarity (Dice).
+        Args:
+            name: Name to resolve
+            kind: Only entries of this kind
+            limit: Maximum number of matches
+            min_score: Minimum trigram similarity of fuzzy matches
+        """
+        key = normalize_name(name)
+        if not key:
+            return []
+        matches = self._matches(key, EXACT_SCORE, kind) if key in self._exact else []
+        if not matches:
+            for candidate in self._prefixed(key):
+                matches.extend(self._matches(candidate, PREFIX_SCORE, kind))
+        if not matches:
+            grams = _trigrams(key)
+            shared = defaultdict(int)
+            for gram in grams:
+                for candidate in self._trigrams.get(gram, ()):
+                    shared[candidate] += 1
+            for candidate, count in shared.items():
+                score = 2 * count / (len(grams) + len(self._key_trigrams[candidate]))
+                if score >= min_score:
+                    matches.extend(self._matches(candidate, round(score, 3), kind))
+        matches.sort(key=lambda m: -m.score)
+        return matches[:limit]
+
+    def find_in_text(self, text: str, kind: str = None, min_score: float = PREFIX_SCORE, max_words: int = 8) -> List[NameMatch]:
+        """
+        Known names mentioned in a question, longest word n-grams first; overlapping spans are skipped.
+        Prefix and fuzzy hits need at least two words starting with a word of some name, and a
+        one-word name only matches if no other name contains that word, so a country or product
+        word alone never matches.
+        Args:
+            text: User question
+            kind: Only entries of this kind
+            min_score: Minimum match score
+            max_words: Longest n-gram tried
+        """
+        words = _tokens(text)
+        taken = [False] * len(words)
+        found = []
+        # Exact names everywhere first, so "A and B" does not become a fuzzy "a and"
+        for exact in (True, False):
+            for n in range(min(max_words, len(words)), 0, -1):
+                for start in range(len(words) - n + 1):
+                    if any(taken[start:start + n]):
+                        continue
+                    key = ' '.join(_strip_legal(words[start:start + n]))
+                    if exact:
+                        known = key in self._exact and (' ' in key or self._token_keys[key] == 1)
+                        hits = self._matches(key, EXACT_SCORE, kind) if known else []
+                    elif n >= 2 and len(key.split()) >= 2 and words[start] in self._token_keys:
+                        span = ' '.join(words[start:start + n])
+                        hits = [m for m in self.lookup(span, kind=kind, min_score=min_score) if m.score >= min_score]
+                    else:
+                        hits = []
+                    if hits:
+                        found.extend(hits)
+                        taken[start:start + n] = [True] * n
+        unique = {}
+        for match in found:
+            unique.setdefault((fold_text(match.name), match.kind), match)
+        return list(unique.values())
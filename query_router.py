@@ -0,0 +1,206 @@
+"""
+Local routing of search-agent questions to label, supplier or general chat.
+
+QueryRouter decides from keyword tables (English and Vietnamese, folded like
+query_rules), the product labels of the report, and the company name index:
+- a known supplier / buyer name, or supplier words only -> supplier
+- product label / category words only -> label
+- a greeting or personal statement without any data words -> general
+Everything else (supplier and label words together, personal statements about
+trade data, bare metric questions) is ambiguous and goes to the LLM.
+
+Every decision is counted per path. Rule decisions can be shadow-checked
+against the LLM on a sample (shadow_rate), and for LLM decisions the rules'
+best guess is compared with the LLM's answer, so the stats show how often
+each path agrees with the other.
+"""
+
+import random
+import re
+import threading
+import time
+import unicodedata
+
+from query_rules import fold_text, _pattern, METRIC_PATTERNS, AVERAGE_PATTERN
+
+LABEL_PATTERN = _pattern([
+    'product', 'products', 'product category', 'category', 'categories', 'product type', 'label', 'labels',
+    'fabric', 'fabrics', 'cloth', 'woven', 'clothing', 'clothes', 'apparel', 'garment', 'garments',
+    'fiber', 'fibers', 'fibre', 'fibres', 'flax', 'filament', 'filaments', 'textile product', 'textile products',
+    'sản phẩm', 'loại sản phẩm', 'nhóm hàng', 'mặt hàng', 'quần áo', 'may mặc', 'hàng may mặc',
+    'sợi tổng hợp', 'sợi lanh',
+])
+# Short Vietnamese label words collide with other words once folded (nhãn/nhận, vải/vài, sợi/soi),
+# so they are matched on the text with its diacritics
+LABEL_ACCENTED_PATTERN = re.compile(r'(?<!\w)(?:nhãn|vải|sợi)(?!\w)')
+SUPPLIER_PATTERN = _pattern([
+    'supplier', 'suppliers', 'vendor', 'vendors', 'manufacturer', 'manufacturers', 'exporter', 'exporters',
+    'seller', 'sellers', 'company', 'companies', 'firm', 'firms', 'mill', 'mills', 'factory', 'factories',
+    'who sells', 'who supplies',
+    'nhà cung cấp', 'nhà cung ứng', 'công ty', 'doanh nghiệp', 'nhà sản xuất', 'nhà máy', 'nhà xuất khẩu',
+])
+GREETING_PATTERN = _pattern([
+    'hi', 'hello', 'hey', 'good morning', 'good afternoon', 'good evening', 'thanks', 'thank you', 'bye', 'goodbye',
+    'xin chào', 'chào', 'chào bạn', 'cảm ơn', 'cám ơn', 'tạm biệt',
+])
+PERSONAL_PATTERN = _pattern([
+    'my name', 'i am', "i'm", 'i work', 'i live', 'i like', 'i love', 'i prefer', 'call me', 'who am i',
+    'about me', 'remember', 'do you know me', 'how are you', 'who are you', 'what can you do',
+    'tôi là', 'tên tôi', 'tên của tôi', 'tôi tên', 'tôi làm', 'tôi sống', 'tôi thích', 'bạn có nhớ', 'bạn là ai',
+    'tôi là ai', 'bạn khỏe không',
+])
+# Trade data words without a label or supplier: "total revenue?" needs the LLM
+DATA_PATTERN = _pattern([
+    'data', 'report', 'trade', 'import', 'imports', 'export', 'exports', 'market', 'country', 'countries',
+    'dữ liệu', 'báo cáo', 'thương mại', 'nhập khẩu', 'xuất khẩu', 'thị trường', 'quốc gia',
+], extra=r'\d')
+
+SHADOW_RATE = 0.0
+STATS_LOG_EVERY = 50
+
+
+def _has(pattern, text: str) -> bool:
+    return pattern.search(text) is not None
+
+
+def _accented(text: str) -> str:
+    """Lower-case text with diacritics kept (NFC), for LABEL_ACCENTED_PATTERN."""
+    return unicodedata.normalize('NFC', str(text).lower())
+
+
+def mentions_personal_info(query: str) -> bool:
+    """True if a query talks about the user (name, job, preferences), i.e. may hold something to remember."""
+    return _has(PERSONAL_PATTERN, fold_text(query))
+
+
+class QueryRouter:
+    """Rules-first router with LLM fallback and per-path agreement stats."""
+
+    def __init__(self, labels=(), name_index=None, shadow_rate: float = SHADOW_RATE):
+        """
+        Args:
+            labels: Product labels of the label report (e.g. "Fabric", "Clothing")
+            name_index: name_index.NameIndex of supplier / buyer names, or None
+            shadow_rate: Share of rule decisions also sent to the LLM in the background to measure agreement
+        """
+        folded = [fold_text(label) for label in labels if isinstance(label, str) and label.strip()]
+        self.label_pattern = _pattern(folded) if folded else None
+        self.name_index = name_index
+        self.shadow_rate = shadow_rate
+        self._lock = threading.Lock()
+        self._stats = {
+            'rules': 0, 'rules_ms': 0.0, 'shadow': 0, 'shadow_agree': 0,
+            'llm': 0, 'llm_ms': 0.0, 'llm_guess': 0, 'llm_guess_agree': 0,
+        }
+        self.disagreements = []
+
+    @classmethod
+    def from_retrievers(cls, label_retriever, supplier_retriever, **kwargs) -> "QueryRouter":
+        """Router using the label table and supplier name index of the search stack retrievers, where present."""
+        table = getattr(getattr(label_retriever, 'base_retriever', None), 'table', None)
+        labels = table.frame['label'].dropna().tolist() if table is not None and 'label' in table.frame.columns else ()
+        return cls(labels=labels, name_index=getattr(supplier_retriever, 'name_index', None), **kwargs)
+
+    def classify(self, query: str, allow_both: bool = False):
+        """
+        Route of a query from the rules.
+        Args:
+            query: Rewritten user query
+            allow_both: "both" is a valid route (speculative mode)
+        Returns:
+            (route, confident, reason); route is the best guess (None if there is none)
+            and confident says whether it can be used without the LLM
+        """
+        text = fold_text(query)
+        if self.name_index is not None:
+            named = self.name_index.find_in_text(query)
+            if named:
+                return 'supplier', True, f"name {named[0].name!r}"
+
+        supplier = _has(SUPPLIER_PATTERN, text)
+        label = (
+            _has(LABEL_PATTERN, text)
+            or _has(LABEL_ACCENTED_PATTERN, _accented(query))
+            or (self.label_pattern is not None and _has(self.label_pattern, text))
+        )
+        personal = _has(PERSONAL_PATTERN, text)
+        data = supplier or label or _has(DATA_PATTERN, text) or _has(AVERAGE_PATTERN, text) or any(
+            _has(pattern, text) for _, pattern in METRIC_PATTERNS
+        )
+
+        if personal and data:
+            return ('label' if label and not supplier else 'supplier' if supplier and not label else None), False, "personal + data words"
+        if supplier and label:
+            return ('both', True, "label + supplier words") if allow_both else ('supplier', False, "label + supplier words")
+        if supplier:
+            return 'supplier', True, "supplier words"
+        if label:
+            return 'label', True, "label words"
+        if personal or _has(GREETING_PATTERN, text):
+            return 'general', not data, "greeting / personal"
+        if data:
+            return None, False, "data words without label or supplier"
+        return 'general', False, "no data words"
+
+    def route(self, query: str, llm_route, allow_both: bool = False):
+        """
+        Route a query: rules when confident, else llm_route(query).
+        Args:
+            query: Rewritten user query
+            llm_route: Callable query -> route name (the LLM router)
+            allow_both: "both" is a valid route (speculative mode)
+        Returns:
+            (route, source, reason) with source "rules" or "llm"
+        """
+        start = time.perf_counter()
+        guess, confident, reason = self.classify(query, allow_both)
+        if confident:
+            self._record('rules', start)
+            if self.shadow_rate and random.random() < self.shadow_rate:
+                threading.Thread(target=self._shadow, args=(query, guess, llm_route), daemon=True).start()
+            return guess, 'rules', reason
+
+        route = llm_route(query)
+        self._record('llm', start)
+        if guess is not None:
+            self._compare('llm_guess', query, guess, route)
+        return route, 'llm', reason
+
+    def _shadow(self, query: str, decided: str, llm_route):
+        try:
+            self._compare('shadow', query, decided, llm_route(query))
+        except Exception as e:
+            print(f"⚠️  Router shadow check failed: {e}")
+
+    def _compare(self, kind: str, query: str, rules_route: str, llm_route: str):
+        with self._lock:
+            self._stats[kind] += 1
+            if rules_route == llm_route:
+                self._stats[f'{kind}_agree'] += 1
+            else:
+                self.disagreements = (self.disagreements + [(query, rules_route, llm_route)])[-100:]
+
+    def _record(self, path: str, start: float):
+        with self._lock:
+            self._stats[path] += 1
+            self._stats[f'{path}_ms'] += (time.perf_counter() - start) * 1000
+            total = self._stats['rules'] + self._stats['llm']
+        if total % STATS_LOG_EVERY == 0:
+            print(f"📊 Router: {self.format_stats()}")
+
+    @property
+    def stats(self) -> dict:
+        """Decisions, total latency and LLM agreement per path."""
+        with self._lock:
+            return dict(self._stats)
+
+    def format_stats(self) -> str:
+        s = self.stats
+        parts = []
+        for path, checks in (('rules', 'shadow'), ('llm', 'llm_guess')):
+            if s[path]:
+                part = f"{path} {s[path]} ({s[f'{path}_ms'] / s[path]:.1f} ms avg"
+                if s[checks]:
+                    part += f", {s[f'{checks}_agree'] / s[checks]:.0%} agree over {s[checks]}"
+                parts.append(part + ")")
+        return ', '.join(parts) or 'no decisions yet'
@@ -0,0 +1,198 @@
+"""
+Rule-based superlative detection for the report retrievers.
+
+classify_superlative() decides top-1 versus all results, and the metric and
+direction to sort by, from keyword, regex and metric-synonym tables (English and
+Vietnamese, with or without diacritics). It returns None when the rules are not
+sure: a superlative word next to a counting or filtering signal, "top N",
+mixed directions or metrics, or no metric word at all ("most recent data",
+"most of our business", "percent of the revenue of the top supplier"). SuperlativeClassifierMixin asks the retriever's LLM
+only in those cases and memoizes every answer by normalized query.
+"""
+
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+
+def fold_text(text: str) -> str:
+    """Lower-case, strip diacritics (đ -> d) and collapse whitespace, for matching EN/VI text."""
+    text = unicodedata.normalize('NFD', str(text).lower().replace('đ', 'd'))
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return ' '.join(text.split())
+
+
+def _pattern(phrases, extra: str = None) -> re.Pattern:
+    """One regex matching any of the phrases (folded) as whole words, longest first, or the extra regex."""
+    folded = sorted({fold_text(p) for p in phrases}, key=len, reverse=True)
+    pattern = r'(?<!\w)(?:' + '|'.join(re.escape(p).replace(r'\ ', r'\s+') for p in folded) + r')(?!\w)'
+    return re.compile(pattern if extra is None else f'{pattern}|{extra}')
+
+
+# Bounds that contain superlative words but filter instead ("at least 20", "ít nhất 20 giao dịch")
+BOUND_PATTERN = re.compile(
+    r'(?<!\w)(?:at\s+least|at\s+most|no\s+less\s+than|no\s+more\s+than)(?!\w)'
+    r'|(?<!\w)(?:it|nhieu|toi\s+thieu|toi\s+da)\s+nhat\s+(?=\d)'
+)
+
+# "top 5", "5 best" -> several results, left to the LLM; "top 1" stays a superlative
+TOP_N_PATTERN = re.compile(r'(?<!\w)(?:top|first|last|bottom)\s+(\d+)(?!\w)|(?<!\w)(\d+)\s+(?:best|worst|largest|biggest|smallest|highest|lowest)(?!\w)')
+
+DESC_PATTERN = _pattern([
+    'most', 'highest', 'top', 'best', 'largest', 'biggest', 'greatest', 'leading', 'leads', 'lead',
+    'maximum', 'max', 'number one', 'no 1', 'strongest', 'heaviest',
+    'nhiều nhất', 'cao nhất', 'lớn nhất', 'tốt nhất', 'mạnh nhất', 'nặng nhất',
+    'hàng đầu', 'đứng đầu', 'dẫn đầu', 'số một',
+], extra=r'(?<!\w)nhieu\s+(?:\w+\s+){1,3}nhat(?!\w)')  # "nhiều giao dịch nhất"
+ASC_PATTERN = _pattern([
+    'least', 'lowest', 'bottom', 'worst', 'smallest', 'fewest', 'minimum', 'min', 'weakest', 'lightest',
+    'ít nhất', 'thấp nhất', 'nhỏ nhất', 'kém nhất', 'tệ nhất', 'yếu nhất', 'nhẹ nhất', 'cuối bảng',
+], extra=r'(?<!\w)it\s+(?:\w+\s+){1,3}nhat(?!\w)')  # "ít giao dịch nhất"
+
+# Counting and filtering signals: the user wants every match, not the single best
+ALL_RESULTS_PATTERN = _pattern([
+    'how many', 'list', 'all', 'every',
+    'more than', 'less than', 'fewer than', 'greater than', 'over', 'under', 'above', 'below', 'between',
+    'bao nhiêu', 'liệt kê', 'tất cả', 'danh sách', 'hơn', 'trên', 'dưới',
+])
+COMPARISON_PATTERN = re.compile(r'[<>]=?|≥|≤')
+
+# Superlative words that do not ask to rank reports ("most recent", "most of", "share of the top supplier")
+NON_RANKING_PATTERN = _pattern([
+    'most recent', 'most of', 'most likely', 'percent', 'percentage', 'share', 'proportion', 'ratio',
+    'phần trăm', 'tỷ lệ', 'tỉ lệ', 'tỷ trọng', 'tỉ trọng',
+])
+
+# Averages: "per transaction", "trung bình" switch a total metric to its avg_ variant
+AVERAGE_PATTERN = _pattern([
+    'average', 'avg', 'mean', 'per transaction', 'per shipment', 'per order', 'per deal',
+    'trung bình', 'mỗi giao dịch', 'một giao dịch', 'mỗi lô hàng', 'mỗi đơn hàng',
+])
+
+# Checked in this order; a matched phrase is consumed so "số lượng giao dịch" is not also a quantity
+METRIC_PATTERNS = [
+    ('total_transactions', _pattern([
+        'transactions', 'transaction', 'shipments', 'shipment', 'orders', 'order', 'deals', 'deal', 'trades',
+        'số lượng giao dịch', 'số giao dịch', 'giao dịch', 'lô hàng', 'đơn hàng', 'chuyến hàng',
+    ])),
+    ('total_amount', _pattern([
+        'revenue', 'money', 'amount', 'value', 'sales', 'sale', 'earns', 'earn', 'earner', 'earning', 'earnings',
+        'income', 'turnover', 'usd', 'dollars', 'dollar', 'profit', 'profitable', 'spend', 'spending', 'valuable',
+        'doanh thu', 'doanh số', 'giá trị', 'tiền', 'kim ngạch', 'lợi nhuận',
+    ])),
+    ('total_weight', _pattern([
+        'weight', 'weighs', 'heavy', 'heaviest', 'light', 'lightest', 'kg', 'kilograms', 'tons', 'tonnage',
+        'trọng lượng', 'khối lượng', 'nặng', 'nhẹ', 'cân nặng',
+    ])),
+    ('total_quantity', _pattern([
+        'quantity', 'qty', 'units', 'unit', 'pieces', 'volume',
+        'số lượng', 'sản lượng',
+    ])),
+]
+AVERAGE_METRICS = {
+    'total_amount': 'avg_amount',
+    'total_weight': 'avg_weight',
+    'total_quantity': 'avg_quantity',
+}
+
+NOT_SUPERLATIVE = {'is_superlative': False}
+
+
+def classify_superlative(query: str):
+    """
+    Superlative intent of a query from the rule tables.
+    Args:
+        query: User query (English or Vietnamese)
+    Returns:
+        {'is_superlative': bool, 'metric': ..., 'direction': ...} when confident, else None
+    """
+    text = fold_text(query)
+
+    bounded = BOUND_PATTERN.search(text) is not None
+    text = BOUND_PATTERN.sub(' ', text)
+
+    top_n = TOP_N_PATTERN.search(text)
+    if top_n and int(top_n.group(1) or top_n.group(2)) > 1:
+        return None
+
+    desc = DESC_PATTERN.search(text) is not None
+    asc = ASC_PATTERN.search(text) is not None
+    if not desc and not asc:
+        return dict(NOT_SUPERLATIVE)
+    if desc and asc:
+        return None
+    if bounded or ALL_RESULTS_PATTERN.search(text) or COMPARISON_PATTERN.search(text):
+        return None
+    if NON_RANKING_PATTERN.search(text):
+        return None
+
+    average = AVERAGE_PATTERN.search(text) is not None
+    text = AVERAGE_PATTERN.sub(' ', text)
+
+    metrics = []
+    for metric, pattern in METRIC_PATTERNS:
+        if pattern.search(text):
+            metrics.append(metric)
+            text = pattern.sub(' ', text)
+    if len(metrics) != 1:
+        # No metric word: "most" / "top" may not rank anything, the constructor decides
+        return None
+    metric = metrics[0]
+    if average:
+        metric = AVERAGE_METRICS.get(metric, metric)
+
+    return {'is_superlative': True, 'metric': metric, 'direction': 'desc' if desc else 'asc'}
+
+
+class SuperlativeClassifierMixin:
+    """
+    _is_superlative_query() for the report retrievers: rules first, then the LLM's answer
+    for uncertain queries (passed in, or from the class's _classify_with_llm()),
+    memoized by normalized query.
+    _classify_with_llm() returns the classification dict, or None if the call failed.
+    """
+
+    SUPERLATIVE_MEMO_SIZE = 1024
+
+    def _superlative_memo(self):
+        memo = self.__dict__.get('_superlative_cache')
+        if memo is None:
+            memo = self.__dict__.setdefault('_superlative_cache', (OrderedDict(), threading.Lock(), {'rules': 0, 'llm': 0, 'memo': 0}))
+        return memo
+
+    @property
+    def superlative_stats(self) -> dict:
+        """How queries were classified: by the rules, by the LLM, or from the memo."""
+        return dict(self._superlative_memo()[2])
+
+    def _is_superlative_query(self, query: str, llm_result: dict = None) -> dict:
+        """
+        Args:
+            query: User query
+            llm_result: Classification the LLM already returned for this query (e.g. from the
+                        combined query constructor call); used instead of a separate LLM call
+        """
+        memo, lock, stats = self._superlative_memo()
+        key = fold_text(query)
+        with lock:
+            if key in memo:
+                memo.move_to_end(key)
+                stats['memo'] += 1
+                return dict(memo[key])
+
+        result = classify_superlative(query)
+        if result is not None:
+            stats['rules'] += 1
+        else:
+            stats['llm'] += 1
+            result = llm_result if llm_result is not None else self._classify_with_llm(query)
+            if result is None:
+                # Not memoized, so the next identical query retries the LLM
+                return dict(NOT_SUPERLATIVE)
+
+        with lock:
+            memo[key] = result
+            while len(memo) > self.SUPERLATIVE_MEMO_SIZE:
+                memo.popitem(last=False)
+        return dict(result)
@@ -0,0 +1,195 @@
+"""
+Persistent Qdrant collections for the trade report documents.
+
+Collections live in Qdrant's local path mode under .cache/qdrant (TRADE_QDRANT_PATH),
+or on a server when QDRANT_URL is set. Each report document gets a stable point ID
+(uuid5 of collection + report key) and a content hash in its payload, so a sync
+against the current report JSON only embeds and upserts new or changed reports and
+deletes the ones that disappeared. An unchanged report set opens the existing
+index without any embedding call.
+
+For large report sets (100k+ suppliers) changed documents are embedded and
+upserted batch by batch, collections get tuned HNSW parameters, and the
+filterable metadata fields get payload indexes so filtered searches use them
+instead of scanning. Payload indexes and HNSW only take effect on a Qdrant
+server (QDRANT_URL); the local path mode always does an exact scan.
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import uuid
+
+from langchain_qdrant import QdrantVectorStore
+from qdrant_client import QdrantClient, models
+from qdrant_client.local.qdrant_local import QdrantLocal
+
+QDRANT_PATH = os.environ.get(
+    'TRADE_QDRANT_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'qdrant'),
+)
+QDRANT_URL = os.environ.get('QDRANT_URL')
+
+# uuid5 namespace of the report point IDs
+REPORT_ID_NAMESPACE = uuid.UUID('5b0e8f53-6f0e-4c4e-9d55-3c6f3f7a2a91')
+HASH_PAYLOAD_KEY = 'content_hash'
+UPSERT_BATCH_SIZE = int(os.environ.get('TRADE_QDRANT_BATCH_SIZE', 512))
+
+# m=32 / ef_construct=200 for better recall at 100k+ points; payload_m adds graph links
+# inside payload-index partitions so filtered searches stay on the HNSW graph
+HNSW_CONFIG = models.HnswConfigDiff(m=32, ef_construct=200, payload_m=16)
+# Uploads above this many points build the HNSW graph once at the end instead of per batch
+BULK_LOAD_THRESHOLD = 20000
+INDEXING_THRESHOLD = 20000
+
+# AttributeInfo types -> payload index types
+PAYLOAD_SCHEMAS = {
+    'string': models.PayloadSchemaType.KEYWORD,
+    'integer': models.PayloadSchemaType.INTEGER,
+    'float': models.PayloadSchemaType.FLOAT,
+}
+
+
+def open_qdrant_client() -> QdrantClient:
+    """
+    Qdrant client for the report collections: QDRANT_URL if set, else local path mode.
+    Local storage can only be opened by one process at a time; if it is locked by
+    another process, an in-memory client is returned (collections are rebuilt there).
+    """
+    if QDRANT_URL:
+        return QdrantClient(url=QDRANT_URL, api_key=os.environ.get('QDRANT_API_KEY'))
+    try:
+        os.makedirs(QDRANT_PATH, exist_ok=True)
+        client = QdrantClient(path=QDRANT_PATH)
+    except (RuntimeError, BlockingIOError) as e:
+        print(f"⚠️  Qdrant storage {QDRANT_PATH} unavailable ({e}). Using an in-memory index.")
+        return QdrantClient(location=":memory:")
+    # Flush and release the storage lock before interpreter teardown
+    atexit.register(client.close)
+    return client
+
+
+def point_id(collection_name: str, key: str) -> str:
+    """Stable point ID of a report within a collection."""
+    return str(uuid.uuid5(REPORT_ID_NAMESPACE, f"{collection_name}:{key}"))
+
+
+def content_hash(document, model: str) -> str:
+    """Hash of what a point stores: embedding model, text and metadata."""
+    payload = json.dumps([model, document.page_content, document.metadata], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _existing_hashes(client: QdrantClient, collection_name: str) -> dict:
+    hashes, offset = {}, None
+    while True:
+        points, offset = client.scroll(
+            collection_name, limit=1024, offset=offset,
+            with_payload=[HASH_PAYLOAD_KEY], with_vectors=False,
+        )
+        for point in points:
+            hashes[str(point.id)] = (point.payload or {}).get(HASH_PAYLOAD_KEY)
+        if offset is None:
+            return hashes
+
+
+def is_local(client: QdrantClient) -> bool:
+    """True for local path / :memory: mode, where payload indexes and HNSW settings have no effect."""
+    return isinstance(getattr(client, '_client', None), QdrantLocal)
+
+
+def ensure_payload_indexes(client: QdrantClient, collection_name: str, indexed_fields: dict):
+    """
+    Create the missing payload indexes of a collection (no-op in local mode).
+    Args:
+        indexed_fields: metadata field -> AttributeInfo type ('string' / 'integer' / 'float')
+    """
+    if not indexed_fields or is_local(client):
+        return
+    existing = client.get_collection(collection_name).payload_schema or {}
+    for field, field_type in indexed_fields.items():
+        key = f"metadata.{field}"
+        if key not in existing and field_type in PAYLOAD_SCHEMAS:
+            client.create_payload_index(collection_name, key, field_schema=PAYLOAD_SCHEMAS[field_type])
+
+
+def _vector_size(client: QdrantClient, collection_name: str):
+    vectors = client.get_collection(collection_name).config.params.vectors
+    return vectors.size if isinstance(vectors, models.VectorParams) else None
+
+
+def sync_report_collection(client: QdrantClient, collection_name: str, documents, keys, embeddings,
+                           model: str = None, indexed_fields: dict = None) -> QdrantVectorStore:
+    """
+    Bring a collection in line with the given report documents and return its vector store.
+    Args:
+        client: From open_qdrant_client()
+        collection_name: Qdrant collection
+        documents: LangChain Documents, one per report
+        keys: Report key per document (label / supplier name), used for the stable point ID
+        embeddings: Embeddings used for new or changed documents
+        model: Embedding model name mixed into the content hash (a model change re-embeds everything)
+        indexed_fields: Filterable metadata fields to payload-index, name -> 'string' / 'integer' / 'float'
+    """
+    model = model or getattr(embeddings, 'model', '')
+
+    # Stable IDs; repeated keys are disambiguated by their occurrence
+    seen = {}
+    desired = {}
+    for document, key in zip(documents, keys):
+        seen[key] = seen.get(key, 0) + 1
+        pid = point_id(collection_name, key if seen[key] == 1 else f"{key}#{seen[key]}")
+        desired[pid] = (document, content_hash(document, model))
+
+    existing = _existing_hashes(client, collection_name) if client.collection_exists(collection_name) else {}
+    changed = [pid for pid, (_, digest) in desired.items() if existing.get(pid) != digest]
+    removed = [pid for pid in existing if pid not in desired]
+
+    bulk = len(changed) > BULK_LOAD_THRESHOLD and not is_local(client)
+    for start in range(0, len(changed), UPSERT_BATCH_SIZE):
+        # Embed and upsert batch by batch, so a large report set never holds all vectors at once
+        batch = changed[start:start + UPSERT_BATCH_SIZE]
+        vectors = embeddings.embed_documents([desired[pid][0].page_content for pid in batch])
+        if start == 0:
+            size = len(vectors[0])
+            if client.collection_exists(collection_name) and _vector_size(client, collection_name) != size:
+                # Embedding dimension changed: start the collection over
+                client.delete_collection(collection_name)
+                return sync_report_collection(client, collection_name, documents, keys, embeddings, model, indexed_fields)
+            if not client.collection_exists(collection_name):
+                client.create_collection(
+                    collection_name,
+                    vectors_config=models.VectorParams(size=size, distance=models.Distance.COSINE),
+                    hnsw_config=HNSW_CONFIG,
+                    optimizers_config=models.OptimizersConfigDiff(indexing_threshold=INDEXING_THRESHOLD),
+                )
+            ensure_payload_indexes(client, collection_name, indexed_fields)
+            if bulk:
+                client.update_collection(collection_name, optimizer_config=models.OptimizersConfigDiff(indexing_threshold=0))
+        client.upsert(collection_name, wait=not bulk, points=[
+            models.PointStruct(
+                id=pid,
+                vector=vector,
+                payload={
+                    'page_content': desired[pid][0].page_content,
+                    'metadata': desired[pid][0].metadata,
+                    HASH_PAYLOAD_KEY: desired[pid][1],
+                },
+            )
+            for pid, vector in zip(batch, vectors)
+        ])
+        done = min(start + UPSERT_BATCH_SIZE, len(changed))
+        if len(changed) > UPSERT_BATCH_SIZE and (done == len(changed) or (start // UPSERT_BATCH_SIZE) % 20 == 19):
+            print(f"   → {done}/{len(changed)} points upserted")
+    if bulk:
+        # Build the HNSW graph once over the whole upload
+        client.update_collection(collection_name, optimizer_config=models.OptimizersConfigDiff(indexing_threshold=INDEXING_THRESHOLD))
+    if not changed and client.collection_exists(collection_name):
+        ensure_payload_indexes(client, collection_name, indexed_fields)
+    for start in range(0, len(removed), UPSERT_BATCH_SIZE):
+        client.delete(collection_name, points_selector=models.PointIdsList(points=removed[start:start + UPSERT_BATCH_SIZE]))
+
+    print(f"🗄️  {collection_name}: {len(changed)} upserted, {len(removed)} deleted, "
+          f"{len(desired) - len(changed)} unchanged")
+    return QdrantVectorStore(client=client, collection_name=collection_name, embedding=embeddings)
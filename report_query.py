@@ -0,0 +1,256 @@
+"""
+Exact structured queries over the label and supplier reports.
+
+The reports are small tables, so a filter such as gt("total_transactions", 20)
+is evaluated directly on a pandas frame of the document metadata instead of a
+k-limited vector search: results are complete and exact, in milliseconds.
+String comparisons are case- and diacritic-insensitive ("fabric" matches
+"Fabric"). Vector search is only used for queries the constructor could not turn
+into a filter; a filter the table cannot evaluate is translated for Qdrant
+instead of being dropped.
+
+The query constructor prompt (SUPERLATIVE_SCHEMA_PROMPT) also asks for the
+superlative metric and direction, and ReportQueryParser returns them on the
+ReportQuery, so one LLM call yields the search query, the filter and the
+top-1 intent together.
+"""
+
+import operator
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from langchain.chains.query_constructor.base import StructuredQueryOutputParser
+from langchain.chains.query_constructor.prompt import DEFAULT_SCHEMA_PROMPT
+from langchain_community.query_constructors.qdrant import QdrantTranslator
+from langchain_core.output_parsers.json import parse_and_check_json_markdown
+from langchain_core.prompts import PromptTemplate
+from langchain_core.structured_query import Comparison, Comparator, Operation, Operator, StructuredQuery
+
+from query_rules import fold_text
+
+# Attribute names the query constructor uses that are stored under another key
+FIELD_ALIASES = {'country': 'location', 'name': 'supplier', 'category': 'label'}
+
+# Query constructor schema with the superlative fields next to query and filter
+_FILTER_LINE = '    "filter": string \\ logical condition statement for filtering documents\n'
+SUPERLATIVE_SCHEMA_PROMPT = PromptTemplate.from_template(
+    DEFAULT_SCHEMA_PROMPT.template.replace(
+        _FILTER_LINE,
+        _FILTER_LINE
+        + '    "superlative": string \\ metric to rank by when the user asks for THE single top or bottom result, else null\n'
+        + '    "direction": string \\ "desc" for most / highest / top / best, "asc" for least / lowest / bottom / worst, else null\n',
+    )
+    + '\nCounting, listing and threshold questions ("how many", "list", "more than 20") are not superlative: '
+    + 'return null for "superlative" and "direction".'
+)
+
+NUMERIC_COMPARATORS = {
+    Comparator.GT: operator.gt,
+    Comparator.GTE: operator.ge,
+    Comparator.LT: operator.lt,
+    Comparator.LTE: operator.le,
+}
+
+
+class ReportQuery(StructuredQuery):
+    """StructuredQuery with the superlative intent from the same constructor call."""
+
+    superlative: Optional[str] = None
+    """Metric to rank by for a top-1 answer, None if the query is not a superlative."""
+    direction: Optional[str] = None
+    """'desc' or 'asc'."""
+
+
+class ReportQueryParser(StructuredQueryOutputParser):
+    """StructuredQueryOutputParser that also reads the superlative and direction keys."""
+
+    def parse(self, text: str) -> ReportQuery:
+        structured_query = super().parse(text)
+        try:
+            parsed = parse_and_check_json_markdown(text, ["query", "filter"])
+        except Exception:
+            parsed = {}
+        superlative = parsed.get("superlative")
+        direction = str(parsed.get("direction") or "desc").lower()
+        return ReportQuery(
+            query=structured_query.query,
+            filter=structured_query.filter,
+            limit=structured_query.limit,
+            superlative=superlative if isinstance(superlative, str) and superlative.lower() not in ("", "null", "none") else None,
+            direction=direction if direction in ("asc", "desc") else "desc",
+        )
+
+
+def with_superlative(examples) -> list:
+    """Query constructor examples with null superlative / direction where not given."""
+    completed = []
+    for user_query, output in examples:
+        output = dict(output)
+        output.setdefault("superlative", None)
+        output.setdefault("direction", None)
+        completed.append((user_query, output))
+    return completed
+
+
+class ReportTable:
+    """Report documents with their metadata as a DataFrame, for exact filtering and sorting."""
+
+    def __init__(self, documents):
+        """
+        Args:
+            documents: LangChain Documents (summary text + report metadata), one per report
+        """
+        self.documents = list(documents)
+        self.frame = pd.DataFrame([doc.metadata for doc in self.documents])
+        self._folded = {}
+
+    def __len__(self):
+        return len(self.documents)
+
+    def column(self, attribute: str) -> str:
+        """Metadata column of a filter attribute (aliases resolved); KeyError if unknown."""
+        name = attribute if attribute in self.frame.columns else FIELD_ALIASES.get(attribute, attribute)
+        if name not in self.frame.columns:
+            raise KeyError(attribute)
+        return name
+
+    def _folded_column(self, name: str) -> pd.Series:
+        if name not in self._folded:
+            self._folded[name] = self.frame[name].map(lambda v: fold_text(v) if pd.notna(v) else '')
+        return self._folded[name]
+
+    def mask(self, directive) -> np.ndarray:
+        """Boolean row mask of a StructuredQuery filter (Comparison / Operation tree)."""
+        if isinstance(directive, Operation):
+            masks = [self.mask(arg) for arg in directive.arguments]
+            if directive.operator == Operator.AND:
+                return np.logical_and.reduce(masks)
+            if directive.operator == Operator.OR:
+                return np.logical_or.reduce(masks)
+            return ~np.logical_or.reduce(masks)
+        if not isinstance(directive, Comparison):
+            raise ValueError(f"Unsupported filter: {directive!r}")
+
+        name = self.column(directive.attribute)
+        comparator, value = directive.comparator, directive.value
+        values = value if isinstance(value, (list, tuple)) else [value]
+        series = self.frame[name]
+        numeric = pd.api.types.is_numeric_dtype(series)
+
+        if comparator in NUMERIC_COMPARATORS:
+            if numeric:
+                return NUMERIC_COMPARATORS[comparator](series, float(value)).values
+            return NUMERIC_COMPARATORS[comparator](self._folded_column(name), fold_text(value)).values
+        if comparator in (Comparator.EQ, Comparator.NE, Comparator.IN, Comparator.NIN):
+            if numeric:
+                matched = series.isin([float(v) for v in values]).values
+            else:
+                matched = self._folded_column(name).isin([fold_text(v) for v in values]).values
+            return ~matched if comparator in (Comparator.NE, Comparator.NIN) else matched
+        if comparator in (Comparator.LIKE, Comparator.CONTAIN):
+            folded = self._folded_column(name)
+            return np.logical_or.reduce([folded.str.contains(fold_text(v), regex=False).values for v in values])
+        raise ValueError(f"Unsupported comparator: {comparator}")
+
+    def select(self, directive=None, sort_by: str = None, descending: bool = True, limit: int = None) -> list:
+        """
+        Documents matching a filter, in report order unless sorted.
+        Args:
+            directive: StructuredQuery filter, or None for every report
+            sort_by: Optional metadata column to sort by
+            descending: Sort direction
+            limit: Optional maximum number of documents
+        """
+        rows = np.arange(len(self.documents))
+        if directive is not None and len(rows):
+            rows = rows[self.mask(directive)]
+        if sort_by is not None and len(rows):
+            keys = pd.to_numeric(self.frame[self.column(sort_by)].iloc[rows], errors='coerce').fillna(0).values
+            order = np.argsort(-keys if descending else keys, kind='stable')
+            rows = rows[order]
+        if limit is not None:
+            rows = rows[:limit]
+        return [self.documents[i] for i in rows]
+
+
+class StructuredReportRetriever:
+    """
+    Retriever over a ReportTable: the query constructor turns the question into a
+    StructuredQuery; filtered queries run exactly on the table, the rest go to vector search.
+    """
+
+    def __init__(self, query_constructor, table: ReportTable, vectorstore, k: int = 5, verbose: bool = False,
+                 translator=None):
+        """
+        Args:
+            query_constructor: Runnable {"query": str} -> StructuredQuery (prompt | llm | parser)
+            table: ReportTable of the same documents as the vector store
+            vectorstore: Vector store for queries without a usable filter
+            k: Number of vector search results
+            verbose: Print the constructed query
+            translator: Structured query translator of the vector store, for filters the table
+                        cannot evaluate (default: QdrantTranslator on the "metadata" payload key)
+        """
+        self.query_constructor = query_constructor
+        self.table = table
+        self.vectorstore = vectorstore
+        self.k = k
+        self.verbose = verbose
+        self.translator = translator or QdrantTranslator(metadata_key="metadata")
+
+    def construct(self, query: str) -> StructuredQuery:
+        structured_query = self.query_constructor.invoke({"query": query})
+        if self.verbose:
+            print(f"🔍 Generated query: {structured_query.query!r}, filter: {structured_query.filter}")
+        return structured_query
+
+    def superlative(self, structured_query: StructuredQuery):
+        """
+        Superlative intent carried by a ReportQuery, in the retrievers' dict format.
+        None if the constructor does not produce it (plain StructuredQuery).
+        """
+        if not isinstance(structured_query, ReportQuery):
+            return None
+        if structured_query.superlative is None:
+            return {'is_superlative': False}
+        try:
+            metric = self.table.column(structured_query.superlative)
+        except KeyError:
+            return None
+        return {'is_superlative': True, 'metric': metric, 'direction': structured_query.direction}
+
+    def run(self, structured_query: StructuredQuery, exhaustive: bool = False) -> list:
+        """
+        Execute a StructuredQuery.
+        Args:
+            structured_query: Output of the query constructor
+            exhaustive: Return every report when there is no filter (e.g. to rank all of them)
+                        instead of the k nearest
+        """
+        if structured_query.filter is not None:
+            try:
+                return self.table.select(structured_query.filter, limit=structured_query.limit)
+            except (KeyError, ValueError, TypeError) as e:
+                print(f"⚠️  Filter not executable on the report table ({e}), using a filtered vector search")
+                return self.filtered_search(structured_query)
+        elif exhaustive or not structured_query.query.strip():
+            return self.table.select(limit=structured_query.limit)
+        return self.vectorstore.similarity_search(structured_query.query, k=structured_query.limit or self.k)
+
+    def filtered_search(self, structured_query: StructuredQuery) -> list:
+        """
+        Vector search with the filter translated for the vector store; no results if that fails too,
+        so the constraint is never silently dropped.
+        """
+        try:
+            query, kwargs = self.translator.visit_structured_query(structured_query)
+            return self.vectorstore.similarity_search(
+                query or structured_query.query, k=structured_query.limit or self.k, **kwargs
+            )
+        except Exception as e:
+            print(f"⚠️  Filtered vector search failed ({e}); returning no results for filter {structured_query.filter}")
+            return []
+
+    def invoke(self, query: str, exhaustive: bool = False) -> list:
+        return self.run(self.construct(query), exhaustive=exhaustive)
@@ -0,0 +1,126 @@
+"""
+Exact 1-D segmentation for the buyer Scale label.
+
+Splits a single numeric column into k contiguous segments with the minimum total
+within-segment sum of squares (the Jenks / Fisher natural breaks objective).
+This is the exact optimum of 1-D k-means, so no random init or restarts are needed.
+
+The DP over sorted unique values uses prefix sums for O(1) segment costs and the
+divide-and-conquer optimisation (the optimal split point is monotone), evaluated
+one recursion level at a time with numpy. Total cost is O(n log n) for the sort
+plus O(k * n log n) for the DP.
+"""
+
+import numpy as np
+
+
+def _segment_costs(S0, S1, S2, j, i):
+    """Weighted SSE of unique values j..i-1, from prefix sums."""
+    w = S0[i] - S0[j]
+    s = S1[i] - S1[j]
+    return np.maximum((S2[i] - S2[j]) - s * s / w, 0.0)
+
+
+def _solve_layer(prev, S0, S1, S2, m, n):
+    """
+    One DP layer: cur[i] = min_j prev[j] + cost(j, i) for i in [m, n], j in [m-1, i-1].
+    Returns (cur, arg) where arg[i] is the smallest optimal j.
+    """
+    cur = np.full(n + 1, np.inf)
+    arg = np.zeros(n + 1, dtype=np.int64)
+
+    # Pending (i_lo, i_hi, j_lo, j_hi) ranges, processed one recursion level at a time
+    i_lo = np.array([m], dtype=np.int64)
+    i_hi = np.array([n], dtype=np.int64)
+    j_lo = np.array([m - 1], dtype=np.int64)
+    j_hi = np.array([n - 1], dtype=np.int64)
+
+    while len(i_lo):
+        mid = (i_lo + i_hi) // 2
+        counts = np.minimum(j_hi, mid - 1) - j_lo + 1
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        total = int(counts.sum())
+
+        offsets = np.arange(total) - np.repeat(starts, counts)
+        j = np.repeat(j_lo, counts) + offsets
+        i = np.repeat(mid, counts)
+        vals = prev[j] + _segment_costs(S0, S1, S2, j, i)
+
+        best_val = np.minimum.reduceat(vals, starts)
+        is_best = vals == np.repeat(best_val, counts)
+        first = np.minimum.reduceat(np.where(is_best, np.arange(total), total), starts)
+        best_j = j[first]
+
+        cur[mid] = best_val
+        arg[mid] = best_j
+
+        left = i_lo <= mid - 1
+        right = mid + 1 <= i_hi
+        i_lo, i_hi, j_lo, j_hi = (
+            np.concatenate((i_lo[left], mid[right] + 1)),
+            np.concatenate((mid[left] - 1, i_hi[right])),
+            np.concatenate((j_lo[left], best_j[right])),
+            np.concatenate((best_j[left], j_hi[right])),
+        )
+
+    return cur, arg
+
+
+def optimal_segments(values, k: int = 2):
+    """
+    Optimal k-segment split of 1-D data.
+
+    Args:
+        values: 1-D array-like of numbers (NaN not allowed)
+        k: Number of segments. Reduced to the number of distinct values if larger.
+
+    Returns:
+        Tuple (labels, breaks):
+        - labels: segment index per input value (0 = lowest values), in input order
+        - breaks: ascending thresholds, one fewer than the number of segments;
+          breaks[s] is the smallest value of segment s + 1
+    """
+    x = np.asarray(values, dtype=float).ravel()
+    if k < 1:
+        raise ValueError("k must be at least 1")
+    if len(x) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0)
+    if np.isnan(x).any():
+        raise ValueError("values must not contain NaN")
+
+    # Equal values always share a segment, so work on weighted unique values
+    uniq, inverse, weights = np.unique(x, return_inverse=True, return_counts=True)
+    n = len(uniq)
+    k = min(k, n)
+    if k == 1:
+        return np.zeros(len(x), dtype=np.int64), np.zeros(0)
+
+    # Center before squaring to keep the prefix sums well conditioned
+    centered = uniq - np.average(uniq, weights=weights)
+    S0 = np.concatenate(([0.0], np.cumsum(weights, dtype=float)))
+    S1 = np.concatenate(([0.0], np.cumsum(weights * centered)))
+    S2 = np.concatenate(([0.0], np.cumsum(weights * centered * centered)))
+
+    idx = np.arange(n + 1)
+    layer = np.full(n + 1, np.inf)
+    layer[1:] = _segment_costs(S0, S1, S2, np.zeros(n, dtype=np.int64), idx[1:])
+    args = []
+    for m in range(2, k + 1):
+        layer, arg = _solve_layer(layer, S0, S1, S2, m, n)
+        args.append(arg)
+
+    # Backtrack segment start positions
+    starts = []
+    end = n
+    for arg in reversed(args):
+        end = int(arg[end])
+        starts.append(end)
+    starts.reverse()
+
+    breaks = uniq[starts]
+    return assign_segments(x, breaks), breaks
+
+
+def assign_segments(values, breaks):
+    """Segment index for each value given the breaks returned by optimal_segments."""
+    return np.searchsorted(np.asarray(breaks), np.asarray(values, dtype=float), side='right')
@@ -0,0 +1,227 @@
+"""
+Chart builders and rendering helpers for CompanyMatcher.
+
+The build_* functions draw a company's charts from a TradeCube, so they work the
+same on the full cube in the main process and on a one-company slice in a worker
+process. Figures can be rendered straight to PNG/SVG bytes and kept in a bounded
+LRU cache keyed by (chart, company, option, format) for the current data version,
+so repeat views and dashboard refreshes are served from memory.
+"""
+
+import io
+import threading
+from collections import OrderedDict
+
+import matplotlib
+import matplotlib.pyplot as plt
+import pandas as pd
+import seaborn as sns
+
+# (chart, option) jobs rendered per company by CompanyMatcher.render_charts_batch
+DEFAULT_CHART_JOBS = [('performance', None), ('pie', 'Product'), ('suppliers', 'General')]
+
+SUPPORTED_FORMATS = ('png', 'svg')
+
+
+def figure_to_bytes(fig, fmt: str = 'png', dpi: int = 100) -> bytes:
+    """Render a figure to PNG/SVG bytes and release it."""
+    if fmt not in SUPPORTED_FORMATS:
+        raise ValueError(f"Unsupported chart format: {fmt} (expected one of {SUPPORTED_FORMATS})")
+    buffer = io.BytesIO()
+    try:
+        # Saving to a file format uses the non-interactive Agg/SVG canvas, no display needed
+        fig.savefig(buffer, format=fmt, dpi=dpi, bbox_inches='tight')
+    finally:
+        plt.close(fig)
+    return buffer.getvalue()
+
+
+class ChartCache:
+    """
+    Thread-safe LRU cache of rendered chart bytes.
+    All entries belong to one data version; a lookup with a newer version evicts
+    everything rendered from older data.
+    """
+
+    def __init__(self, max_entries: int = 128):
+        self.max_entries = max_entries
+        self.data_version = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _sync_version(self, data_version):
+        if data_version != self.data_version:
+            self._entries.clear()
+            self.data_version = data_version
+
+    def get(self, key, data_version):
+        """Return (found, value) for key at data_version."""
+        with self._lock:
+            self._sync_version(data_version)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, data_version, value):
+        with self._lock:
+            self._sync_version(data_version)
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_render(self, key, data_version, render):
+        """Cached bytes for key, calling render() on a miss. Empty results (None) are cached too."""
+        found, value = self.get(key, data_version)
+        if found:
+            return value
+        value = render()
+        self.put(key, data_version, value)
+        return value
+
+    def invalidate(self, data_version=None):
+        """Drop every entry (optionally moving the cache to data_version)."""
+        with self._lock:
+            self._entries.clear()
+            if data_version is not None:
+                self.data_version = data_version
+
+
+# --- Figure builders ---
+
+def build_performance_figure(cube, company):
+    """Monthly amount and quantity lines for a company."""
+    if company not in cube.buyer_index: return None
+
+    monthly_data = cube.aggregate('month', buyers=[company])[['amount', 'qty']].reset_index()
+
+    fig, ax1 = plt.subplots(figsize=(10, 5))
+    
+    color = 'tab:blue'
+    ax1.set_xlabel('Month')
+    ax1.set_ylabel('Total Amount (USD)', color=color)
+    sns.lineplot(data=monthly_data, x='month', y='amount', marker='o', color=color, ax=ax1, label='Amount')
+    ax1.tick_params(axis='y', labelcolor=color)
+    ax1.grid(True)
+
+    ax2 = ax1.twinx()
+    color = 'tab:orange'
+    ax2.set_ylabel('Quantity (Units)', color=color)
+    sns.lineplot(data=monthly_data, x='month', y='qty', marker='s', color=color, ax=ax2, label='Quantity')
+    ax2.tick_params(axis='y', labelcolor=color)
+    ax2.grid(False)
+
+    plt.title(f'Performance: {company}')
+    fig.tight_layout()
+    return fig
+
+
+def build_pie_figure(cube, company, category='Product', rows=None):
+    """
+    Amount and volume share pies by category for a company.
+    rows: the company's raw rows, required only when category is not a cube dimension.
+    """
+    if company not in cube.buyer_index: return None
+
+    if rows is None:
+        grouped = cube.aggregate(category, buyers=[company])[['amount', 'qty']]
+    else:
+        grouped = rows.groupby(category, observed=True)[['amount', 'qty']].sum()
+    grouped = grouped.sort_values('amount', ascending=False)
+    
+    top_n = 5
+    if len(grouped) > top_n:
+        top = grouped.head(top_n)
+        others = grouped.iloc[top_n:].sum()
+        others.name = 'Others'
+        # Create a DataFrame for 'Others' to append correctly
+        others_df = pd.DataFrame([others], index=['Others'])
+        plot_data = pd.concat([top, others_df])
+    else:
+        plot_data = grouped
+
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(16, 8))
+    
+    # Pie Chart 1: Amount Distribution
+    ax1.pie(plot_data['amount'], labels=plot_data.index, autopct='%1.1f%%', startangle=140)
+    ax1.set_title(f'Share of Total Amount (USD) by {category}')
+    
+    # Pie Chart 2: Volume Distribution
+    ax2.pie(plot_data['qty'], labels=plot_data.index, autopct='%1.1f%%', startangle=140)
+    ax2.set_title(f'Share of Total Volume (Units) by {category}')
+    
+    plt.suptitle(f'Distribution Analysis for {company}', fontsize=16)
+    plt.tight_layout()
+    return fig
+
+
+def build_suppliers_figure(cube, company, type_filter='General'):
+    """Top 3 suppliers by amount and by volume for a company, optionally for one label."""
+    # Filter by Type (Label), case-insensitive
+    label = None if type_filter == 'General' else type_filter
+
+    # Group by Supplier
+    supplier_stats = cube.aggregate('Supplier', buyers=[company], label=label)[['amount', 'qty']]
+
+    if supplier_stats.empty: 
+        print(f"No data found for {company} with type '{type_filter}'")
+        return None
+    
+    # Get Top 3 by Amount
+    top_amount = supplier_stats.sort_values('amount', ascending=False).head(3)
+    
+    # Get Top 3 by Volume
+    top_volume = supplier_stats.sort_values('qty', ascending=False).head(3)
+    
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(16, 6))
+
+    # Bar Chart 1: Top 3 Suppliers by Amount
+    sns.barplot(x=top_amount['amount'], y=top_amount.index, hue=top_amount.index, palette='viridis', ax=ax1, legend=False)
+    ax1.set_title(f'Top 3 Suppliers by Amount (USD) - {type_filter}')
+    ax1.set_xlabel('Total Amount (USD)')
+    ax1.set_ylabel('Supplier')
+
+    # Bar Chart 2: Top 3 Suppliers by Volume
+    sns.barplot(x=top_volume['qty'], y=top_volume.index, hue=top_volume.index, palette='magma', ax=ax2, legend=False)
+    ax2.set_title(f'Top 3 Suppliers by Volume (Units) - {type_filter}')
+    ax2.set_xlabel('Total Quantity (Units)')
+    ax2.set_ylabel('Supplier')
+    
+    plt.suptitle(f'Supplier Analysis for {company}', fontsize=16)
+    plt.tight_layout()
+    return fig
+
+
+# --- Batch rendering (worker side) ---
+
+def init_render_worker():
+    """Process pool initializer: matplotlib is not thread-safe, so each worker renders headless on its own."""
+    matplotlib.use('Agg', force=True)
+
+
+def render_company_charts(cube, company, jobs, fmt='png', rows=None):
+    """
+    Render (chart, option) jobs for one company to bytes.
+    Runs in a worker process with only that company's cube slice (and raw rows when a
+    pie category is not a cube dimension). Returns {(chart, option): bytes or None}.
+    """
+    images = {}
+    for chart, option in jobs:
+        if chart == 'performance':
+            fig = build_performance_figure(cube, company)
+        elif chart == 'pie':
+            fig = build_pie_figure(cube, company, option or 'Product', rows=rows if rows is not None and option not in cube.dictionaries else None)
+        elif chart == 'suppliers':
+            fig = build_suppliers_figure(cube, company, option or 'General')
+        else:
+            raise ValueError(f"Unknown chart: {chart}")
+        images[(chart, option)] = None if fig is None else figure_to_bytes(fig, fmt)
+    return images
@@ -0,0 +1,175 @@
+"""
+Pre-aggregated trade cube for CompanyMatcher analytics.
+
+Raw transactions are reduced once to cells of
+    Buyer x month x label x Supplier x Product -> amount, qty, count
+held as dictionary-encoded numpy arrays (one int32 code array per dimension plus
+the value dictionaries). Cells are sorted by buyer, so every per-company view is a
+contiguous slice found through buyer_offsets and costs O(cells of that buyer)
+instead of a scan of the full transaction history.
+"""
+
+import numpy as np
+import pandas as pd
+
+DIMENSIONS = ('Buyer', 'month', 'label', 'Supplier', 'Product')
+MEASURES = ('amount', 'qty', 'count')
+
+
+class TradeCube:
+    """Dictionary-encoded (Buyer, month, label, Supplier, Product) aggregate of trade rows."""
+
+    def __init__(self, dictionaries: dict, codes: dict, amount, qty, count, buyer_location, qty_is_integer=True):
+        self.dictionaries = dictionaries
+        self.codes = codes
+        self.amount = amount
+        self.qty = qty
+        self.count = count
+        self.buyer_location = buyer_location
+        self.qty_is_integer = qty_is_integer
+
+        self.buyer_index = {buyer: code for code, buyer in enumerate(dictionaries['Buyer'])}
+        self.buyer_offsets = np.searchsorted(codes['Buyer'], np.arange(len(dictionaries['Buyer']) + 1))
+
+    def __len__(self):
+        return len(self.amount)
+
+    @property
+    def nbytes(self) -> int:
+        arrays = list(self.codes.values()) + [self.amount, self.qty, self.count, self.buyer_offsets]
+        return int(sum(a.nbytes for a in arrays))
+
+    @property
+    def buyers(self) -> np.ndarray:
+        return self.dictionaries['Buyer']
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> 'TradeCube':
+        """Build a cube from transaction rows (columns Buyer, Buyer country, amount, qty, and the dimensions)."""
+        df = df[df['Buyer'].notna()]
+        dictionaries, codes = {}, {}
+        for dim in DIMENSIONS:
+            values = df[dim] if dim in df.columns else pd.Series(np.nan, index=df.index)
+            # Missing values get their own code so the row still counts towards buyer totals
+            dim_codes, uniques = pd.factorize(values.astype(object), use_na_sentinel=False)
+            dictionaries[dim] = np.asarray(uniques, dtype=object)
+            codes[dim] = dim_codes.astype(np.int32)
+
+        location = df.groupby(codes['Buyer'], sort=True)['Buyer country'].first() if len(df) else pd.Series(dtype=object)
+        buyer_location = location.reindex(range(len(dictionaries['Buyer']))).values.astype(object)
+
+        qty_is_integer = pd.api.types.is_integer_dtype(df['qty'])
+        return cls._aggregate(dictionaries, codes, df['amount'].values, df['qty'].values,
+                              np.ones(len(df), dtype=np.int64), buyer_location, qty_is_integer)
+
+    @classmethod
+    def _aggregate(cls, dictionaries, codes, amount, qty, count, buyer_location, qty_is_integer) -> 'TradeCube':
+        """Sum measures over identical code tuples; cells come out sorted by buyer code."""
+        frame = pd.DataFrame({dim: codes[dim] for dim in DIMENSIONS})
+        frame['amount'] = np.asarray(amount, dtype=float)
+        frame['qty'] = np.asarray(qty, dtype=float)
+        frame['count'] = np.asarray(count, dtype=np.int64)
+        cells = frame.groupby(list(DIMENSIONS), sort=True).sum().reset_index()
+        return cls(
+            dictionaries,
+            {dim: cells[dim].values.astype(np.int32) for dim in DIMENSIONS},
+            cells['amount'].values,
+            cells['qty'].values,
+            cells['count'].values.astype(np.int64),
+            buyer_location,
+            qty_is_integer,
+        )
+
+    def merge(self, other: 'TradeCube') -> 'TradeCube':
+        """Cube of both cubes' rows. Existing codes stay stable; new values are appended to the dictionaries."""
+        dictionaries, codes = {}, {}
+        for dim in DIMENSIONS:
+            base = self.dictionaries[dim]
+            lookup = pd.Index(base)
+            extra = pd.Index(other.dictionaries[dim]).difference(lookup, sort=False)
+            dictionaries[dim] = np.concatenate([base, np.asarray(extra, dtype=object)])
+            remap = pd.Index(dictionaries[dim]).get_indexer(other.dictionaries[dim])
+            codes[dim] = np.concatenate([self.codes[dim], remap[other.codes[dim]].astype(np.int32)])
+
+        buyer_location = np.concatenate([self.buyer_location, np.full(len(dictionaries['Buyer']) - len(self.buyer_location), np.nan, dtype=object)])
+        other_codes = pd.Index(dictionaries['Buyer']).get_indexer(other.dictionaries['Buyer'])
+        missing = pd.isna(buyer_location[other_codes])
+        buyer_location[other_codes[missing]] = other.buyer_location[missing]
+
+        return self._aggregate(
+            dictionaries, codes,
+            np.concatenate([self.amount, other.amount]),
+            np.concatenate([self.qty, other.qty]),
+            np.concatenate([self.count, other.count]),
+            buyer_location,
+            self.qty_is_integer and other.qty_is_integer,
+        )
+
+    def subset(self, buyers) -> 'TradeCube':
+        """Compact cube holding only the given buyers' cells (small enough to ship to a worker process)."""
+        cells = self._cells(buyers)
+        dictionaries, codes = {}, {}
+        for dim in DIMENSIONS:
+            used, remapped = np.unique(self.codes[dim][cells], return_inverse=True)
+            dictionaries[dim] = self.dictionaries[dim][used]
+            codes[dim] = remapped.astype(np.int32)
+        buyer_codes = np.unique(self.codes['Buyer'][cells])
+        return TradeCube(
+            dictionaries, codes,
+            self.amount[cells], self.qty[cells], self.count[cells],
+            self.buyer_location[buyer_codes],
+            self.qty_is_integer,
+        )
+
+    def _cells(self, buyers=None, label=None) -> np.ndarray:
+        """Positions of the cells for the given buyers, optionally restricted to one label (case-insensitive)."""
+        if buyers is None:
+            cells = np.arange(len(self))
+        else:
+            buyer_codes = [self.buyer_index[b] for b in buyers if b in self.buyer_index]
+            starts = self.buyer_offsets[buyer_codes]
+            stops = self.buyer_offsets[np.asarray(buyer_codes, dtype=np.int64) + 1]
+            lengths = stops - starts
+            cells = np.repeat(starts, lengths) + (np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths))
+        if label is not None:
+            label_dict = pd.Series(self.dictionaries['label']).astype(str).str.lower().values
+            wanted = np.flatnonzero(label_dict == str(label).lower())
+            cells = cells[np.isin(self.codes['label'][cells], wanted)]
+        return cells
+
+    def aggregate(self, by, buyers=None, label=None) -> pd.DataFrame:
+        """
+        Sum of amount, qty and count grouped by the given dimensions, like
+        df.groupby(by)[['amount', 'qty', 'count']].sum() on the raw rows.
+        Args:
+            by: Dimension name or list of names (see DIMENSIONS)
+            buyers: Restrict to these buyers (None = all)
+            label: Restrict to one label, compared case-insensitively
+        """
+        by = [by] if isinstance(by, str) else list(by)
+        cells = self._cells(buyers, label)
+        keys = pd.DataFrame({dim: self.codes[dim][cells] for dim in by})
+        keys['amount'] = self.amount[cells]
+        keys['qty'] = self.qty[cells]
+        keys['count'] = self.count[cells]
+        grouped = keys.groupby(by, sort=False).sum().reset_index()
+
+        for dim in by:
+            grouped[dim] = self.dictionaries[dim][grouped[dim].values]
+        grouped = grouped.dropna(subset=by).set_index(by).sort_index()
+        if self.qty_is_integer:
+            grouped['qty'] = grouped['qty'].astype('int64')
+        return grouped
+
+    def buyer_totals(self) -> pd.DataFrame:
+        """Per-buyer total_in_USD, total_in_Volume and first known Location, sorted by buyer name."""
+        nonempty = self.buyer_offsets[:-1] < self.buyer_offsets[1:]
+        starts = self.buyer_offsets[:-1][nonempty]
+        totals = pd.DataFrame({
+            'total_in_USD': np.add.reduceat(self.amount, starts) if len(starts) else np.zeros(0),
+            'total_in_Volume': np.add.reduceat(self.qty, starts) if len(starts) else np.zeros(0),
+            'Location': self.buyer_location[nonempty],
+        }, index=pd.Index(self.buyers[nonempty], name='Buyer'))
+        if self.qty_is_integer:
+            totals['total_in_Volume'] = totals['total_in_Volume'].astype('int64')
+        return totals.sort_index()
@@ -0,0 +1,350 @@
+"""
+Shared data access for trade workbooks and CSV exports.
+
+Columnar cache: the first read of a source file/sheet converts it to Parquet under
+.cache/columnar (next to this module, or TRADE_CACHE_DIR). A manifest per source
+records its mtime, size and sha256; an unchanged mtime/size is trusted, otherwise
+the file is re-hashed and the copy is rebuilt only if the content changed. Later
+loads read the Parquet copy with column projection and row-filter pushdown.
+Without pyarrow every load falls back to parsing the source file. Object columns
+that mix numbers and strings are cached as strings.
+
+Frames are loaded in a compact layout:
+- only the requested columns are read
+- repeated strings (Buyer, Supplier, label, Product, countries, ...) become categoricals
+- numeric columns are downcast without changing any value: integers and integral
+  floats become the smallest integer type; other floats stay float64 unless float32
+  is requested and exact (float32 columns would also sum in float32)
+- date columns are parsed once, at load time
+
+Bytes before and after compaction are printed, so the saving is visible per source.
+"""
+
+import hashlib
+import json
+import operator
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401  (Parquet engine)
+    HAS_PYARROW = True
+except ImportError:  # pragma: no cover - optional dependency
+    HAS_PYARROW = False
+
+CACHE_DIR = os.environ.get(
+    'TRADE_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'columnar'),
+)
+
+# Columns CompanyMatcher works with (missing ones are skipped)
+TRADE_COLUMNS = [
+    'Trade date', 'trade date', 'HS code', 'Product', 'label', 'Buyer', 'Buyer country',
+    'Supplier', 'Supplier Location', 'qty', 'amount',
+]
+TRADE_DATE_COLUMNS = ['Trade date', 'trade date']
+
+# A string column is categorized when its distinct values are at most this share of the rows
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+
+def memory_bytes(df: pd.DataFrame) -> int:
+    """Deep memory usage of a frame, including string payloads."""
+    return int(df.memory_usage(deep=True).sum())
+
+
+def _format_bytes(n: int) -> str:
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if n < 1024 or unit == 'GB':
+            return f"{n:,.0f} {unit}" if unit == 'B' else f"{n:,.1f} {unit}"
+        n /= 1024
+
+
+def _downcast_numeric(series: pd.Series, allow_float32: bool = False) -> pd.Series:
+    """Smallest numeric dtype that holds every value exactly."""
+    if pd.api.types.is_bool_dtype(series):
+        return series
+    if pd.api.types.is_integer_dtype(series):
+        return pd.to_numeric(series, downcast='integer')
+
+    values = series.to_numpy(dtype=float)
+    finite = np.isfinite(values)
+    if finite.all() and np.array_equal(values, np.round(values)):
+        as_int = pd.to_numeric(series, downcast='integer')
+        if pd.api.types.is_integer_dtype(as_int):
+            return as_int
+    if not allow_float32:
+        return series
+    as_float32 = values.astype(np.float32)
+    if np.array_equal(as_float32.astype(float), values, equal_nan=True):
+        return pd.Series(as_float32, index=series.index, name=series.name)
+    return series
+
+
+def compact_frame(df: pd.DataFrame, date_columns=None, category_max_unique_ratio: float = CATEGORY_MAX_UNIQUE_RATIO,
+                  categorize: bool = True, allow_float32: bool = False) -> pd.DataFrame:
+    """
+    Compacted copy of a frame (values are unchanged).
+    Args:
+        df: Frame to compact
+        date_columns: Columns parsed to datetime64
+        category_max_unique_ratio: Max distinct/rows ratio for a string column to become categorical
+        categorize: Set False to keep string columns as they are
+        allow_float32: Store floats as float32 when every value is exactly representable
+    """
+    df = df.copy()
+    date_columns = [c for c in (date_columns or []) if c in df.columns]
+    for col in date_columns:
+        df[col] = pd.to_datetime(df[col])
+
+    for col in df.columns:
+        if col in date_columns:
+            continue
+        series = df[col]
+        if pd.api.types.is_numeric_dtype(series):
+            df[col] = _downcast_numeric(series, allow_float32)
+        elif categorize and (pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)):
+            if not isinstance(series.dtype, pd.CategoricalDtype) and len(series) and \
+                    series.nunique(dropna=True) <= category_max_unique_ratio * len(series):
+                df[col] = series.astype('category')
+    return df
+
+
+def concat_compact(frames) -> pd.DataFrame:
+    """
+    pd.concat that keeps the categorical columns of the first frame categorical, even when
+    the other frames have different categories or plain strings (plain concat falls back to object).
+    """
+    frames = [f for f in frames if f is not None]
+    columns = {}
+    for col in frames[0].columns:
+        if not isinstance(frames[0][col].dtype, pd.CategoricalDtype):
+            continue
+        parts = [f[col] if isinstance(f[col].dtype, pd.CategoricalDtype) else f[col].astype('category')
+                 for f in frames if col in f.columns]
+        if len(parts) == len(frames):
+            categories = pd.api.types.union_categoricals([p.array for p in parts]).categories
+            columns[col] = [p.cat.set_categories(categories) for p in parts]
+    if not columns:
+        return pd.concat(frames, ignore_index=True)
+    aligned = []
+    for i, f in enumerate(frames):
+        f = f.copy()
+        for col, parts in columns.items():
+            f[col] = parts[i]
+        aligned.append(f)
+    return pd.concat(aligned, ignore_index=True)
+
+
+# --- Columnar cache ---
+
+def _is_csv(path) -> bool:
+    return str(path).lower().endswith('.csv')
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_json_atomic(path: str, data: dict):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+class _SourceManifest:
+    """Cache state of one source file: validation stamp, sheet names and converted tables."""
+
+    def __init__(self, path: str):
+        self.source = os.path.abspath(path)
+        stem = os.path.splitext(os.path.basename(path))[0]
+        key = hashlib.sha1(self.source.encode('utf-8')).hexdigest()[:12]
+        self.prefix = os.path.join(CACHE_DIR, f"{stem}-{key}")
+        self.path = f"{self.prefix}.json"
+        self.data = {}
+
+    def validate(self):
+        """Load the manifest, dropping converted tables if the source content changed."""
+        stat = os.stat(self.source)
+        stamp = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.data = json.load(f)
+        except (OSError, ValueError):
+            self.data = {}
+
+        if all(self.data.get(k) == v for k, v in stamp.items()):
+            return
+        sha256 = _file_sha256(self.source)
+        if self.data.get('sha256') != sha256:
+            # Content changed (or first use): forget sheet names and converted tables
+            self.data = {'source': self.source, 'sha256': sha256, 'tables': {}}
+        self.data.update(stamp)
+        self.save()
+
+    def save(self):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        _write_json_atomic(self.path, self.data)
+
+    def table_file(self, sheet_key: str) -> str:
+        key = hashlib.sha1(sheet_key.encode('utf-8')).hexdigest()[:8]
+        return f"{self.prefix}-{key}.parquet"
+
+
+def _table_key(path, sheet_name) -> str:
+    return '' if _is_csv(path) else str(sheet_name)
+
+
+def _arrow_safe(df: pd.DataFrame):
+    """
+    Copy of df that Parquet can store: object columns mixing numbers and strings
+    (e.g. ids that are sometimes numeric) are stored as strings. Returns (frame, converted columns).
+    """
+    mixed = [c for c in df.columns
+             if df[c].dtype == object and pd.api.types.infer_dtype(df[c], skipna=True) in ('mixed', 'mixed-integer')]
+    if not mixed:
+        return df, []
+    df = df.copy()
+    for col in mixed:
+        df[col] = df[col].map(lambda v: v if pd.isna(v) else str(v)).astype(object)
+    return df, mixed
+
+
+def _read_source(path: str, sheet_name=0, usecols=None) -> pd.DataFrame:
+    if _is_csv(path):
+        return pd.read_csv(path, usecols=usecols)
+    return pd.read_excel(path, sheet_name=sheet_name, usecols=usecols)
+
+
+_FILTER_OPS = {
+    '=': operator.eq, '==': operator.eq, '!=': operator.ne,
+    '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+}
+
+
+def _apply_filters(df: pd.DataFrame, filters) -> pd.DataFrame:
+    """Apply (column, op, value) filters in pandas, with the same semantics as the Parquet pushdown."""
+    mask = np.ones(len(df), dtype=bool)
+    for column, op, value in filters:
+        if op == 'in':
+            match = df[column].isin(value)
+        elif op == 'not in':
+            match = ~df[column].isin(value)
+        elif op in _FILTER_OPS:
+            match = _FILTER_OPS[op](df[column], value)
+        else:
+            raise ValueError(f"Unsupported filter operator: {op}")
+        mask &= np.asarray(match.fillna(False), dtype=bool)
+    return df[mask].reset_index(drop=True)
+
+
+def sheet_names(path: str, use_cache: bool = True) -> list:
+    """Sheet names of a workbook (cached with the columnar copy). CSV files have none."""
+    if _is_csv(path):
+        return []
+    if not (use_cache and HAS_PYARROW):
+        return pd.ExcelFile(path).sheet_names
+    manifest = _SourceManifest(path)
+    manifest.validate()
+    if 'sheets' not in manifest.data:
+        manifest.data['sheets'] = pd.ExcelFile(path).sheet_names
+        manifest.save()
+    return list(manifest.data['sheets'])
+
+
+def read_source(path: str, sheet_name=0, columns=None, filters=None, use_cache: bool = True) -> pd.DataFrame:
+    """
+    Raw frame of one xlsx sheet or csv file, served from the columnar cache when possible.
+    Args:
+        path: .xlsx/.xls or .csv file
+        sheet_name: Sheet to read (Excel only)
+        columns: Columns to keep (None = all); names missing from the file are ignored
+        filters: Row filters as a list of (column, op, value), all of which must hold;
+                 op is one of =, ==, !=, <, <=, >, >=, in, not in
+        use_cache: Set False to parse the source file directly
+    """
+    if not (use_cache and HAS_PYARROW):
+        usecols = None if columns is None else (lambda c, wanted=set(columns): c in wanted)
+        df = _read_source(path, sheet_name, usecols)
+        return _apply_filters(df, filters) if filters else df
+
+    manifest = _SourceManifest(path)
+    manifest.validate()
+    sheet_key = _table_key(path, sheet_name)
+    table = manifest.data['tables'].get(sheet_key)
+    if table is None or not os.path.exists(manifest.table_file(sheet_key)):
+        df, mixed = _arrow_safe(_read_source(path, sheet_name))
+        if mixed:
+            print(f"ℹ️  {path} [{sheet_key}]: mixed-type columns {mixed} are cached as strings")
+        target = manifest.table_file(sheet_key)
+        tmp = f"{target}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            df.to_parquet(tmp, engine='pyarrow', index=False)
+            os.replace(tmp, target)
+        except Exception as e:
+            # Serve this load from the parsed frame
+            print(f"⚠️  Warning: Could not cache {path} [{sheet_key}] as Parquet ({e}).")
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            if columns is not None:
+                df = df[[c for c in df.columns if c in set(columns)]]
+            return _apply_filters(df, filters) if filters else df
+        manifest.data['tables'][sheet_key] = {'file': os.path.basename(target), 'columns': [str(c) for c in df.columns]}
+        manifest.save()
+        table = manifest.data['tables'][sheet_key]
+
+    projected = None if columns is None else [c for c in table['columns'] if c in set(columns)]
+    return pd.read_parquet(manifest.table_file(sheet_key), engine='pyarrow', columns=projected,
+                           filters=filters or None)
+
+
+def clear_cache(path: str = None):
+    """Remove the columnar copies of one source file, or the whole cache."""
+    if not os.path.isdir(CACHE_DIR):
+        return
+    prefix = None if path is None else os.path.basename(_SourceManifest(path).prefix)
+    for name in os.listdir(CACHE_DIR):
+        if prefix is None or name.startswith(prefix):
+            os.remove(os.path.join(CACHE_DIR, name))
+
+
+# --- Compact loading ---
+
+def load_frame(path: str, sheet_name=0, columns=None, date_columns=None, categorize: bool = True,
+               filters=None, use_cache: bool = True, verbose: bool = True) -> pd.DataFrame:
+    """
+    Load one xlsx sheet or csv file in the compact layout.
+    Args:
+        path: .xlsx/.xls or .csv file
+        sheet_name: Sheet to read (Excel only)
+        columns: Columns to keep (None = all); names missing from the file are ignored
+        date_columns: Columns parsed to datetime64 once, here
+        categorize: Turn repeated strings into categoricals
+        filters: Row filters pushed down to the columnar copy (see read_source)
+        use_cache: Serve the load from the columnar cache
+        verbose: Print bytes before/after compaction
+    """
+    df = read_source(path, sheet_name=sheet_name, columns=columns, filters=filters, use_cache=use_cache)
+
+    before = memory_bytes(df)
+    df = compact_frame(df, date_columns=date_columns, categorize=categorize)
+    if verbose:
+        after = memory_bytes(df)
+        saved = 100 * (1 - after / before) if before else 0.0
+        print(f"📦 {path}: {len(df):,} rows, {_format_bytes(before)} -> {_format_bytes(after)} ({saved:.0f}% smaller)")
+    return df
+
+
+def load_trade_frame(path: str, sheet_name=0, columns=TRADE_COLUMNS, filters=None, use_cache: bool = True,
+                     verbose: bool = True) -> pd.DataFrame:
+    """Transaction workbook for CompanyMatcher: projected to TRADE_COLUMNS, compacted, trade date parsed."""
+    return load_frame(path, sheet_name=sheet_name, columns=columns, date_columns=TRADE_DATE_COLUMNS,
+                      filters=filters, use_cache=use_cache, verbose=verbose)
@@ -0,0 +1,266 @@
+"""
+Embedding backends and the disk-backed embedding cache for the search route.
+
+make_embeddings() builds the embeddings of one index: OpenAI (default) or a local
+CPU sentence-transformers model (optionally its ONNX export) that runs fully
+offline, with a per-index output dimension. Texts are split into batches that
+run on a thread pool (BatchedEmbeddings), and everything is wrapped in
+CachedEmbeddings.
+
+CachedEmbeddings wraps any LangChain Embeddings and keeps every vector in a SQLite
+file keyed by (model, sha256 of the text). A call embeds only the texts not seen
+before, so a restart or a re-index of the report documents only pays for new or
+changed summaries. Query vectors are cached under their own namespace, since some
+models embed queries and documents differently.
+
+Configuration (environment):
+    TRADE_EMBEDDING_BACKEND     openai | local (default openai)
+    TRADE_EMBEDDING_MODEL       model name, or a local model directory for the local backend
+    TRADE_EMBEDDING_ONNX        1 to run the local model through ONNX Runtime
+    TRADE_EMBEDDING_BATCH_SIZE  texts per batch (default 64)
+    TRADE_EMBEDDING_WORKERS     batches embedded in parallel (default 4)
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:
+    from sentence_transformers import SentenceTransformer
+    HAS_SENTENCE_TRANSFORMERS = True
+except ImportError:  # pragma: no cover - optional dependency
+    HAS_SENTENCE_TRANSFORMERS = False
+
+EMBEDDING_CACHE_PATH = os.environ.get(
+    'TRADE_EMBEDDING_CACHE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'embeddings.sqlite'),
+)
+
+EMBEDDING_BACKEND = os.environ.get('TRADE_EMBEDDING_BACKEND', 'openai')
+DEFAULT_MODELS = {
+    'openai': 'text-embedding-3-small',
+    # Multilingual (Vietnamese + English), 384 dimensions, small enough for CPU
+    'local': 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2',
+}
+# Native output size of the OpenAI models, so the memory index needs no probe call
+OPENAI_MODEL_DIMENSIONS = {
+    'text-embedding-3-small': 1536,
+    'text-embedding-3-large': 3072,
+    'text-embedding-ada-002': 1536,
+}
+EMBEDDING_MODEL = os.environ.get('TRADE_EMBEDDING_MODEL')
+EMBEDDING_ONNX = os.environ.get('TRADE_EMBEDDING_ONNX', '0') == '1'
+EMBEDDING_BATCH_SIZE = int(os.environ.get('TRADE_EMBEDDING_BATCH_SIZE', 64))
+EMBEDDING_WORKERS = int(os.environ.get('TRADE_EMBEDDING_WORKERS', 4))
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that serves repeated texts from a SQLite cache."""
+
+    def __init__(self, embeddings: Embeddings, model: str = None, path: str = EMBEDDING_CACHE_PATH):
+        """
+        Args:
+            embeddings: Underlying embeddings used for cache misses
+            model: Cache namespace; defaults to the underlying model name
+            path: SQLite file (created on first use)
+        """
+        self.embeddings = embeddings
+        self.model = model or getattr(embeddings, 'model', None) or type(embeddings).__name__
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " model TEXT NOT NULL, text_hash TEXT NOT NULL, dim INTEGER NOT NULL, vector BLOB NOT NULL,"
+                " PRIMARY KEY (model, text_hash))"
+            )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings WHERE model = ?", (self.model,)).fetchone()[0]
+
+    def _lookup(self, hashes: List[str], model: str = None) -> dict:
+        model = model or self.model
+        found = {}
+        with self._lock:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(hashes), 500):
+                chunk = hashes[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(chunk))})",
+                    (model, *chunk),
+                ).fetchall()
+                for text_hash, blob in rows:
+                    found[text_hash] = np.frombuffer(blob, dtype='<f4').tolist()
+        return found
+
+    def _store(self, items, model: str = None):
+        model = model or self.model
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, dim, vector) VALUES (?, ?, ?, ?)",
+                [(model, text_hash, len(vector), np.asarray(vector, dtype='<f4').tobytes()) for text_hash, vector in items],
+            )
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [_text_hash(text) for text in texts]
+        vectors = self._lookup(sorted(set(hashes)))
+
+        # One batch for the texts not cached yet (each distinct text once)
+        missing = {}
+        for text, text_hash in zip(texts, hashes):
+            if text_hash not in vectors:
+                missing.setdefault(text_hash, text)
+        cached = sum(1 for h in hashes if h not in missing)
+        self.hits += cached
+        self.misses += len(missing)
+        if missing:
+            print(f"🔤 Embedding {len(missing)} new texts ({cached} cached)")
+            embedded = self.embeddings.embed_documents(list(missing.values()))
+            self._store(zip(missing.keys(), embedded))
+            # Serve fresh vectors through the same float32 round trip as cached ones
+            for text_hash, vector in zip(missing.keys(), embedded):
+                vectors[text_hash] = np.asarray(vector, dtype='<f4').tolist()
+
+        return [vectors[text_hash] for text_hash in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        text_hash = _text_hash(text)
+        namespace = f"{self.model}:query"
+        cached = self._lookup([text_hash], namespace)
+        if text_hash in cached:
+            self.hits += 1
+            return cached[text_hash]
+        self.misses += 1
+        vector = self.embeddings.embed_query(text)
+        self._store([(text_hash, vector)], namespace)
+        return np.asarray(vector, dtype='<f4').tolist()
+
+
+class LocalEmbeddings(Embeddings):
+    """Offline CPU embeddings from a sentence-transformers model (or its ONNX export)."""
+
+    def __init__(self, model: str = DEFAULT_MODELS['local'], dimensions: int = None, onnx: bool = False,
+                 device: str = 'cpu'):
+        """
+        Args:
+            model: Hugging Face model name or local model directory
+            dimensions: Keep only the first N dimensions (Matryoshka-style truncation); None = full size
+            onnx: Run through ONNX Runtime instead of PyTorch
+            device: Torch device
+        """
+        if not HAS_SENTENCE_TRANSFORMERS:
+            raise ImportError("The local embedding backend needs sentence-transformers "
+                              "(pip install sentence-transformers, plus onnxruntime for onnx=True)")
+        kwargs = {'device': device, 'truncate_dim': dimensions}
+        if onnx:
+            kwargs['backend'] = 'onnx'
+        self._model = SentenceTransformer(model, **kwargs)
+        self.model = model
+        # get_sentence_embedding_dimension was renamed in sentence-transformers 6
+        get_dimension = getattr(self._model, 'get_embedding_dimension', None) or self._model.get_sentence_embedding_dimension
+        self.dimensions = dimensions or get_dimension()
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        vectors = self._model.encode(list(texts), batch_size=len(texts) or 1, normalize_embeddings=True,
+                                     convert_to_numpy=True, show_progress_bar=False)
+        return vectors.astype(np.float32).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._encode(texts) if texts else []
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0]
+
+
+class BatchedEmbeddings(Embeddings):
+    """Split embed_documents calls into fixed-size batches and embed them on a thread pool."""
+
+    def __init__(self, embeddings: Embeddings, batch_size: int = EMBEDDING_BATCH_SIZE,
+                 max_workers: int = EMBEDDING_WORKERS):
+        """
+        Args:
+            embeddings: Backend embeddings
+            batch_size: Texts per backend call
+            max_workers: Batches embedded concurrently (1 = sequential)
+        """
+        self.embeddings = embeddings
+        self.model = getattr(embeddings, 'model', None)
+        self.dimensions = getattr(embeddings, 'dimensions', None)
+        self.batch_size = max(1, int(batch_size))
+        self.max_workers = max(1, int(max_workers))
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='embed') if self.max_workers > 1 else None
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        batches = [texts[start:start + self.batch_size] for start in range(0, len(texts), self.batch_size)]
+        if self._pool is None or len(batches) < 2:
+            results = [self.embeddings.embed_documents(batch) for batch in batches]
+        else:
+            results = list(self._pool.map(self.embeddings.embed_documents, batches))
+        return [vector for batch in results for vector in batch]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+
+def make_embeddings(backend: str = None, model: str = None, dimensions: int = None,
+                    batch_size: int = None, max_workers: int = None, cache: bool = True) -> Embeddings:
+    """
+    Embeddings for one index; arguments left as None come from the TRADE_EMBEDDING_* settings.
+    Args:
+        backend: 'openai' or 'local'
+        model: Model name (local backend: also a local directory)
+        dimensions: Output dimension of this index (OpenAI text-embedding-3 and Matryoshka local models)
+        batch_size: Texts per backend call
+        max_workers: Batches embedded concurrently
+        cache: Wrap in CachedEmbeddings
+    """
+    backend = backend or EMBEDDING_BACKEND
+    model = model or EMBEDDING_MODEL or DEFAULT_MODELS.get(backend)
+    batch_size = batch_size or EMBEDDING_BATCH_SIZE
+    max_workers = max_workers or EMBEDDING_WORKERS
+
+    if backend == 'openai':
+        from langchain_openai import OpenAIEmbeddings
+        base = OpenAIEmbeddings(model=model, dimensions=dimensions, chunk_size=batch_size)
+        base_dimensions = dimensions or OPENAI_MODEL_DIMENSIONS.get(model)
+    elif backend == 'local':
+        base = LocalEmbeddings(model, dimensions=dimensions, onnx=EMBEDDING_ONNX)
+        base_dimensions = base.dimensions
+    else:
+        raise ValueError(f"Unknown embedding backend {backend!r} (expected 'openai' or 'local')")
+
+    embeddings = BatchedEmbeddings(base, batch_size=batch_size, max_workers=max_workers)
+    embeddings.dimensions = base_dimensions
+    if not cache:
+        return embeddings
+    # Vectors of different backends / sizes must not share a cache namespace
+    namespace = (model if backend == 'openai' else f"{backend}:{model}") + (f"@{dimensions}" if dimensions else "")
+    cached = CachedEmbeddings(embeddings, model=namespace)
+    cached.dimensions = base_dimensions
+    return cached
+
+
+def embedding_dimensions(embeddings: Embeddings) -> int:
+    """Vector size of an embeddings object (declared, or measured on a probe text for unknown models)."""
+    dimensions = getattr(embeddings, 'dimensions', None)
+    if dimensions:
+        return int(dimensions)
+    return len(embeddings.embed_query("dimension probe"))
@@ -0,0 +1,135 @@
+"""
+Per-buyer monthly prefix sums for time-windowed CompanyMatcher summaries.
+
+The trade cube is folded once into dense Buyer x month arrays (amount, qty, row
+count, and amount/count per business label), each stored as a running total along
+the month axis. The totals of any month window [s, e) are then prefix[:, e] -
+prefix[:, s], so a window summary costs O(1) per buyer instead of re-filtering
+and re-grouping the raw transactions.
+
+Windows are month-aligned: a date range covers every month it touches.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def _prefix(dense: np.ndarray) -> np.ndarray:
+    """Running totals along the last (month) axis, with a leading zero column."""
+    pad = [(0, 0)] * (dense.ndim - 1) + [(1, 0)]
+    return np.pad(np.cumsum(dense, axis=-1), pad)
+
+
+class MonthlyPrefixIndex:
+    """Buyer x month running totals of a TradeCube, for O(1)-per-buyer window sums."""
+
+    def __init__(self, cube, business_labels):
+        """
+        Args:
+            cube: TradeCube
+            business_labels: Lower-case label names used for the is_* flags and strongest_in_USD
+        """
+        self.business_labels = list(business_labels)
+        self.buyers = cube.buyers
+        self.buyer_location = cube.buyer_location
+        self.qty_is_integer = cube.qty_is_integer
+
+        # Month positions in chronological order ('YYYY-MM' strings sort by date)
+        month_dict = cube.dictionaries['month']
+        known = np.flatnonzero(pd.notna(month_dict))
+        order = known[np.argsort(month_dict[known].astype(str), kind='stable')]
+        self.months = month_dict[order].astype(str)
+        month_pos = np.full(len(month_dict), -1, dtype=np.int64)
+        month_pos[order] = np.arange(len(order))
+
+        # Label values counted as a business, sorted like cube.aggregate(['Buyer', 'label'])
+        label_dict = cube.dictionaries['label']
+        label_keys = pd.Series(label_dict).astype(str).str.lower().values
+        relevant = [code for code in np.flatnonzero(pd.notna(label_dict)) if label_keys[code] in self.business_labels]
+        relevant.sort(key=lambda code: label_dict[code])
+        self.label_values = np.asarray([label_dict[code] for code in relevant], dtype=object)
+        self.label_keys = label_keys[relevant]
+        label_pos = np.full(len(label_dict), -1, dtype=np.int64)
+        label_pos[relevant] = np.arange(len(relevant))
+
+        n_buyers, n_months, n_labels = len(self.buyers), len(self.months), len(relevant)
+
+        # Rows without a month belong to no window
+        cell_month = month_pos[cube.codes['month']]
+        dated = cell_month >= 0
+        flat = cube.codes['Buyer'][dated].astype(np.int64) * n_months + cell_month[dated]
+        size = n_buyers * n_months
+
+        def dense(weights, index=flat, length=size, shape=(n_buyers, n_months)):
+            return np.bincount(index, weights=weights, minlength=length).reshape(shape)
+
+        self.amount = _prefix(dense(cube.amount[dated]))
+        self.qty = _prefix(dense(cube.qty[dated]))
+        self.count = _prefix(dense(cube.count[dated].astype(float)))
+
+        cell_label = label_pos[cube.codes['label'][dated]]
+        labelled = cell_label >= 0
+        label_flat = cell_label[labelled] * size + flat[labelled]
+        label_shape = (n_labels, n_buyers, n_months)
+        self.label_amount = _prefix(dense(cube.amount[dated][labelled], label_flat, n_labels * size, label_shape))
+        self.label_count = _prefix(dense(cube.count[dated][labelled].astype(float), label_flat, n_labels * size, label_shape))
+
+    def month_bounds(self, date_range):
+        """
+        Prefix positions (s, e) of a date range.
+        Args:
+            date_range: (start, end) with dates or 'YYYY-MM' strings, either side None for open-ended,
+                        or an int N for the last N calendar months up to the latest month in the data
+        """
+        if isinstance(date_range, (int, np.integer)):
+            if date_range < 1:
+                raise ValueError("date_range in months must be at least 1")
+            if len(self.months) == 0:
+                return 0, 0
+            end = pd.Period(self.months[-1], freq='M')
+            start, end = str(end - (int(date_range) - 1)), str(end)
+        else:
+            start, end = date_range
+            start = None if start is None else str(pd.Period(pd.Timestamp(start), freq='M'))
+            end = None if end is None else str(pd.Period(pd.Timestamp(end), freq='M'))
+
+        s = 0 if start is None else int(np.searchsorted(self.months, start, side='left'))
+        e = len(self.months) if end is None else int(np.searchsorted(self.months, end, side='right'))
+        return s, max(s, e)
+
+    def summarize(self, s: int, e: int) -> pd.DataFrame:
+        """
+        Buyer summary rows (without Scale) for months s..e-1 (see month_bounds), in the
+        column layout of CompanyMatcher.summary_df. Buyers with no rows in the window are left out.
+        """
+        count = self.count[:, e] - self.count[:, s]
+        active = count > 0
+
+        summary_df = pd.DataFrame({
+            'Buyer': self.buyers[active],
+            'total_in_USD': (self.amount[:, e] - self.amount[:, s])[active],
+            'total_in_Volume': (self.qty[:, e] - self.qty[:, s])[active],
+            'Location': self.buyer_location[active],
+        })
+        if self.qty_is_integer:
+            summary_df['total_in_Volume'] = np.rint(summary_df['total_in_Volume']).astype('int64')
+
+        label_amount = (self.label_amount[:, :, e] - self.label_amount[:, :, s])[:, active]
+        label_present = (self.label_count[:, :, e] - self.label_count[:, :, s])[:, active] > 0
+
+        # Binary Indicators
+        for label_type in self.business_labels:
+            rows = self.label_keys == label_type
+            summary_df[f'is_{label_type}'] = label_present[rows].any(axis=0).astype(int)
+
+        # Strongest Biz: first label (in sorted order) with the highest amount among those present
+        if len(self.label_values):
+            masked = np.where(label_present, label_amount, -np.inf)
+            best = np.argmax(masked, axis=0)
+            strongest = self.label_values[best].astype(object)
+            strongest[~label_present.any(axis=0)] = 'None'
+            summary_df['strongest_in_USD'] = strongest
+        else:
+            summary_df['strongest_in_USD'] = 'None'
+
+        return summary_df.sort_values('Buyer', ignore_index=True)
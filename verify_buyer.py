@@ -1,7 +1,8 @@
 import pandas as pd
+from trade_data import read_source
 
 try:
-    df = pd.read_csv('steven_data_5301.csv')
+    df = read_source('steven_data_5301.csv')
     print("Columns:", df.columns.tolist())
     
     if 'buyer' in df.columns:
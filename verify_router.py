@@ -0,0 +1,26 @@
+from query_router import QueryRouter
+
+# (query, expected route, expected confident) for the rules alone
+CASES = [
+    ("Show me fabric data", 'label', True),
+    ("Doanh thu của vải là bao nhiêu?", 'label', True),
+    ("Sợi nào có nhiều giao dịch nhất?", 'label', True),
+    ("Who is the top supplier?", 'supplier', True),
+    ("Xin chào", 'general', True),
+    # Folded Vietnamese collisions (nhận/nhãn, vài/vải, soi/sợi): general chat, left to the LLM
+    ("Bạn có nhận ra tôi không?", 'general', False),
+    ("Cho tôi vài gợi ý về cách học tiếng Anh", 'general', False),
+    ("Bạn có thể soi lỗi giúp tôi?", 'general', False),
+]
+
+router = QueryRouter(labels=['Clothing', 'Fabric', 'Fiber', 'Filament'])
+failed = 0
+for query, route, confident in CASES:
+    got_route, got_confident, reason = router.classify(query)
+    ok = got_route == route and got_confident == confident
+    failed += not ok
+    print(f"{'OK  ' if ok else 'FAIL'} {query!r} -> {got_route} (confident={got_confident}, {reason})")
+
+print(f"\n{len(CASES) - failed}/{len(CASES)} cases passed")
+if failed:
+    raise SystemExit(1)
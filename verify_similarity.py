@@ -0,0 +1,42 @@
+import pandas as pd
+
+from buyer_similarity import BuyerVectorIndex, FLAG_COLUMNS
+
+SCALE_LABELS = ['Small', 'Big']
+
+
+def buyer(name, usd, volume, location, scale, strongest, flags=(1, 0, 0, 0)):
+    return {'Buyer': name, 'total_in_USD': usd, 'total_in_Volume': volume, 'Location': location,
+            'Scale': scale, 'strongest_in_USD': strongest, **dict(zip(FLAG_COLUMNS, flags))}
+
+
+summary_df = pd.DataFrame([
+    # Same location, scale and strongest label as the prospect, far smaller USD / volume
+    buyer('Profile match', 5_000, 800, 'Vietnam', 'Big', 'Fabric'),
+    # Same USD / volume as the prospect, nothing else in common
+    buyer('USD match', 40_000_000, 9_000_000, 'Turkey', 'Small', 'Fiber', flags=(0, 0, 1, 0)),
+    buyer('Other', 120_000, 30_000, 'India', 'Small', 'Clothing', flags=(0, 0, 0, 1)),
+])
+prospect = buyer('Prospect', 40_000_000, 9_000_000, 'Vietnam', 'Big', 'Fabric')
+
+failed = 0
+for backend in ('blocked', 'balltree'):
+    try:
+        index = BuyerVectorIndex(summary_df, SCALE_LABELS, backend=backend)
+    except ImportError as e:
+        print(f"SKIP {backend}: {e}")
+        continue
+    distances, indices = index.query(prospect, k=3)
+    ranked = index.summary_df['Buyer'].iloc[indices[0]].tolist()
+    similarity = index.similarity(distances[0])
+    ok = ranked[0] == 'Profile match'
+    failed += not ok
+    print(f"{'OK  ' if ok else 'FAIL'} {backend}: " + ', '.join(f"{b} {s:.2f}" for b, s in zip(ranked, similarity)))
+
+    # Every feature block is bounded: even the farthest buyer keeps a usable similarity
+    ok = distances.max() ** 2 <= 6.0 + 1e-9
+    failed += not ok
+    print(f"{'OK  ' if ok else 'FAIL'} {backend}: max squared distance {distances.max() ** 2:.2f} <= 6")
+
+if failed:
+    raise SystemExit(1)
@@ -1,4 +1,5 @@
 import pandas as pd
+from trade_data import read_source, sheet_names
 
 INPUT_FILE = 'company_analytics_report_2024.xlsx'
 SUMMARY_SHEET = 'Company Summary'
@@ -7,13 +8,12 @@ RAW_SHEET = 'Daily Transactions'
 def verify_summary():
     print("Verifying Company Summary Sheet...")
     try:
-        xl = pd.ExcelFile(INPUT_FILE)
-        if SUMMARY_SHEET not in xl.sheet_names:
+        if SUMMARY_SHEET not in sheet_names(INPUT_FILE):
             print(f"FAILED: {SUMMARY_SHEET} not found.")
             return
 
-        df_summary = xl.parse(SUMMARY_SHEET)
-        df_raw = xl.parse(RAW_SHEET)
+        df_summary = read_source(INPUT_FILE, sheet_name=SUMMARY_SHEET)
+        df_raw = read_source(INPUT_FILE, sheet_name=RAW_SHEET, columns=['Supplier', 'Total_Price'])
     except Exception as e:
         print(f"Error loading file: {e}")
         return